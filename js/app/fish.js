@@ -206,6 +206,15 @@ class Fish {
     return false;
   }
 
+  longRunUptime() {
+    // The uptime over a year of weather, precomputed by `rebuild --uptime`.
+    // Unlike uptime(), this doesn't depend on which windows are being tracked.
+    let stats = DATA.UPTIME !== undefined ? DATA.UPTIME[this.id] : undefined;
+    if (stats === undefined) return undefined;
+    let fishEyesEnabled = typeof fishWatcher !== 'undefined' && fishWatcher.fishEyesEnabled;
+    return (fishEyesEnabled && stats.fishEyes !== undefined) ? stats.fishEyes.uptime : stats.uptime;
+  }
+
   uptime() {
     if (this.__uptimeDirty) {
       let crs = this.catchableRanges;
@@ -215,7 +224,9 @@ class Fish {
         this.__uptime = _(crs).reduce(
           (uptime, range) => uptime += dateFns.milliseconds(dateFns.intervalToDuration(range)), 0) / overallTime;
       } else {
-        this.__uptime = 1;
+        // No windows to go by; use the long-run uptime, if the data has it.
+        let longRun = this.alwaysAvailable ? undefined : this.longRunUptime();
+        this.__uptime = longRun !== undefined ? longRun : 1;
       }
       this.__uptimeDirty = false;
     }
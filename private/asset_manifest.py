@@ -0,0 +1,119 @@
+from collections import OrderedDict
+import gzip
+import hashlib
+import json
+import logging
+import os
+
+from js_data import atomic_open
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_SCRIPT_PATH = os.path.abspath(os.path.dirname(__file__))
+REPO_ROOT = os.path.dirname(_SCRIPT_PATH)
+
+MANIFEST_PATH = os.path.join(_SCRIPT_PATH, 'asset_manifest.json')
+MANIFEST_FORMAT = 1
+
+# Length of the digest prefix used in cache busters.
+TOKEN_LENGTH = 12
+
+
+def asset_key(path):
+    """
+    Returns the manifest key for *path*: its path relative to the repository
+    root, using forward slashes (the same form the pages reference it by).
+    """
+    return os.path.relpath(os.path.abspath(path), REPO_ROOT).replace(os.sep, '/')
+
+
+def digest_token(entry):
+    return entry['sha256'][:TOKEN_LENGTH]
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f, object_pairs_hook=OrderedDict)
+        if manifest.get('format') == MANIFEST_FORMAT:
+            return manifest
+        logging.warning('Ignoring asset manifest %s (format %r)', path, manifest.get('format'))
+    return OrderedDict([('format', MANIFEST_FORMAT), ('assets', OrderedDict())])
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    manifest['assets'] = OrderedDict(sorted(manifest['assets'].items()))
+    with atomic_open(path) as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+
+def _compressors():
+    # mtime=0 keeps the gzip output identical for identical input.
+    yield '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield '.br', lambda data: brotli.compress(data, quality=11)
+
+
+def precompress(path, data=None):
+    """
+    Writes the .gz (and .br, if Brotli is installed) variants of *path*.
+    Returns the size of each variant, keyed by its extension.
+    """
+    if data is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+    sizes = OrderedDict()
+    for ext, compress in _compressors():
+        compressed = compress(data)
+        with atomic_open(path + ext, encoding=None, binary=True) as f:
+            f.write(compressed)
+        sizes[ext.lstrip('.')] = len(compressed)
+    return sizes
+
+
+def _variants_exist(path, entry):
+    return all(os.path.exists(path + '.' + ext) for ext in entry.get('variants', {}))
+
+
+def update_assets(paths, manifest_path=MANIFEST_PATH, compress=True):
+    """
+    Refreshes the manifest entries of *paths*.
+
+    Assets whose digest is unchanged (and whose compressed variants are
+    still present) are left alone. Returns the manifest along with the keys of
+    the assets that actually changed.
+    """
+    if brotli is None and compress:
+        logging.warning('Brotli is not installed; skipping .br variants')
+
+    manifest = load_manifest(manifest_path)
+    changed = []
+    for path in paths:
+        key = asset_key(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        sha256 = hashlib.sha256(data).hexdigest()
+
+        entry = manifest['assets'].get(key)
+        if entry is not None and entry['sha256'] == sha256 and \
+                (not compress or _variants_exist(path, entry)):
+            logging.debug('%s is unchanged (%s)', key, digest_token(entry))
+            continue
+
+        entry = OrderedDict([('sha256', sha256), ('bytes', len(data))])
+        if compress:
+            entry['variants'] = precompress(path, data)
+        manifest['assets'][key] = entry
+        changed.append(key)
+        logging.info('%s: %s (%s)', key, digest_token(entry),
+                     ', '.join(['%u bytes' % len(data)] +
+                               ['%s %u bytes' % (ext, size)
+                                for ext, size in entry.get('variants', {}).items()]))
+
+    if len(changed) != 0:
+        save_manifest(manifest, manifest_path)
+    return manifest, changed
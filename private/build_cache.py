@@ -0,0 +1,46 @@
+import hashlib
+import json
+import logging
+import os
+
+# Versions and digests shared by the caches and checkpoints the scripts in
+# this directory keep, so they all agree on when something is out of date.
+
+_SCRIPT_PATH = os.path.abspath(os.path.dirname(__file__))
+
+
+def read_game_version(game_path):
+    try:
+        with open(os.path.join(game_path, 'game', 'ffxivgame.ver'), 'r') as f:
+            return f.read().strip()
+    except OSError:
+        logging.warning('Unable to read the game version from: %s', game_path)
+        return None
+
+
+def script_version(script, helper_modules=()):
+    """
+    Digest of *script* and the *helper_modules* (in this directory) its
+    output depends on. A change to any of them changes the version, which
+    invalidates whatever was cached with the old one.
+    """
+    h = hashlib.sha1()
+    for path in [os.path.abspath(script)] + [os.path.join(_SCRIPT_PATH, '%s.py' % name)
+                                             for name in helper_modules]:
+        with open(path, 'rb') as f:
+            h.update(hashlib.sha1(f.read()).digest())
+    return h.hexdigest()
+
+
+def digest(*parts):
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(json.dumps(part, ensure_ascii=False, default=str).encode('utf-8'))
+    return h.hexdigest()
+
+
+def file_digest(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
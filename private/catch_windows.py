@@ -0,0 +1,233 @@
+"""
+Offline catch windows for every fish.
+
+This mirrors what FishWatcher.updateRangesForFish (js/app/fishwatcher.js)
+and Fish.availableRangeDuring (js/app/fish.js) do one fish at a time. Here,
+weather for a block of periods is forecast for every territory at once.
+Each fish's qualifying periods are then picked out with a mask and cut down
+to its hours.
+
+All times are Eorzea milliseconds, like the tracker's catchableRanges.
+Intuition requirements (predators) are not applied; fish that have them
+are flagged in the output.
+"""
+from collections import OrderedDict, namedtuple
+import logging
+
+import numpy as np
+
+from weather_forecast import PERIOD_MS, WeatherTable, period_of
+
+HOUR_MS = 60 * 60 * 1000
+PERIODS_PER_DAY = 3
+PERIOD_HOURS = 24 // PERIODS_PER_DAY
+
+# About 35 Earth days of periods per forecast block.
+BLOCK_PERIODS = 2160
+
+FishConditions = namedtuple('FishConditions', [
+    'id', 'zone', 'weather_set', 'previous_weather_set', 'start_hour', 'end_hour', 'fish_eyes',
+    'predators'])
+
+
+def fish_conditions(fish, fishing_spots, spearfishing_spots):
+    """Builds FishConditions for a FISH entry from data.js."""
+    spots = spearfishing_spots if fish.get('gig') is not None else fishing_spots
+    spot = spots.get(fish['location']) if fish['location'] is not None else None
+    if spot is None:
+        spot = spots.get(str(fish['location']), {}) if fish['location'] is not None else {}
+    return FishConditions(int(fish['_id']),
+                          spot.get('territory_id') or 0,
+                          list(fish['weatherSet'] or []),
+                          list(fish['previousWeatherSet'] or []),
+                          fish['startHour'],
+                          fish['endHour'],
+                          bool(fish['fishEyes']),
+                          [int(x[0]) for x in fish['predators'] or []])
+
+
+def is_always_up(fish, fish_eyes=False):
+    """Same as FishWatcher._isFishAlwaysUp (ignoring intuition fish)."""
+    if len(fish.weather_set) == 0 and fish.start_hour == 0 and fish.end_hour == 24:
+        return True
+    return fish_eyes and fish.fish_eyes and len(fish.weather_set) == 0
+
+
+def daily_ranges(start_hour, end_hour):
+    """The hours of the day a fish is up, as (start, end) pairs."""
+    if start_hour == 0 and end_hour == 24:
+        return [(0, 24)]
+    if end_hour < start_hour:
+        # Available times wraps around date...
+        return [(0, end_hour), (start_hour, 24)]
+    return [(start_hour, end_hour)]
+
+
+def period_ranges(fish, fish_eyes=False):
+    """
+    For each of the day's periods, the (start, end) offsets (ms) into the
+    period during which the fish is up. With Fish Eyes, a fish that supports
+    it is up for the whole period.
+    """
+    if fish_eyes and fish.fish_eyes:
+        return [[(0, PERIOD_HOURS * HOUR_MS)]] * PERIODS_PER_DAY
+    phases = []
+    for phase in range(PERIODS_PER_DAY):
+        lower, upper = phase * PERIOD_HOURS, (phase + 1) * PERIOD_HOURS
+        ranges = []
+        for start, end in daily_ranges(fish.start_hour, fish.end_hour):
+            start, end = max(start, lower), min(end, upper)
+            if start < end:
+                ranges.append((int(round((start - lower) * HOUR_MS)),
+                               int(round((end - lower) * HOUR_MS))))
+        phases.append(ranges)
+    return phases
+
+
+def qualifying_periods(weather, previous_weather, fish):
+    """
+    Mask of the periods whose weather (and previous period's weather) work
+    for *fish*. *previous_weather* is the weather of the period before each
+    entry of *weather*.
+    """
+    mask = np.ones(weather.shape, dtype=bool)
+    if len(fish.weather_set) != 0:
+        mask &= np.isin(weather, fish.weather_set)
+    if len(fish.previous_weather_set) != 0:
+        mask &= np.isin(previous_weather, fish.previous_weather_set)
+    return mask
+
+
+def _intervals(periods, phases):
+    starts, ends = [], []
+    for phase, ranges in enumerate(phases):
+        phase_periods = periods[periods % PERIODS_PER_DAY == phase]
+        for start, end in ranges:
+            starts.append(phase_periods * PERIOD_MS + start)
+            ends.append(phase_periods * PERIOD_MS + end)
+    if len(starts) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    starts, ends = np.concatenate(starts), np.concatenate(ends)
+    order = np.argsort(starts, kind='stable')
+    return starts[order], ends[order]
+
+
+def _fish_intervals(fish, phases, table, periods, weather):
+    # *periods* (and *weather*'s columns) start one period early, for
+    # previousWeatherSet.
+    row = weather[table.rows[fish.zone]] if fish.zone in table.rows \
+        else np.zeros(len(periods), dtype=np.int32)
+    mask = qualifying_periods(row[1:], row[:-1], fish)
+    return _intervals(periods[1:][mask], phases)
+
+
+def merge_intervals(starts, ends):
+    """Merges intervals that touch (sorted by start, non-overlapping)."""
+    if len(starts) == 0:
+        return starts, ends
+    breaks = np.flatnonzero(starts[1:] != ends[:-1])
+    first = np.concatenate([[0], breaks + 1])
+    last = np.concatenate([breaks, [len(starts) - 1]])
+    return starts[first], ends[last]
+
+
+def never_up(fish, table):
+    """
+    Returns why *fish*'s weather can never happen in its zone, or None.
+    """
+    if len(fish.weather_set) == 0 and len(fish.previous_weather_set) == 0:
+        return None
+    if fish.zone not in table.rows:
+        # weatherForArea is 0 for unknown areas.
+        return 'zone %u has no weather rates' % fish.zone
+    possible = table.possible_weather(fish.zone)
+    for name, weather_set in (('weatherSet', fish.weather_set),
+                              ('previousWeatherSet', fish.previous_weather_set)):
+        if len(weather_set) != 0 and possible.isdisjoint(weather_set):
+            return 'none of its %s can happen in zone %u' % (name, fish.zone)
+    return None
+
+
+def find_windows(fishes, table, start, count=10, fish_eyes=False, max_periods=100000):
+    """
+    Returns an OrderedDict mapping fish id -> list of (start, end) windows
+    (Eorzea ms): the next *count* windows for each fish, starting from the
+    period containing *start*. Windows that already ended are skipped, and
+    the last window is always complete. Fish that are always up get an
+    empty list, as do fish whose weather can never happen in their zone
+    (see `never_up`). Searching stops after *max_periods*.
+    """
+    if not isinstance(table, WeatherTable):
+        table = WeatherTable(table)
+
+    first_period = int(period_of(start))
+    start = int(start)
+    pending = OrderedDict()
+    results = OrderedDict()
+    for fish in fishes:
+        results[fish.id] = []
+        if is_always_up(fish, fish_eyes):
+            continue
+        problem = never_up(fish, table)
+        if problem is not None:
+            # Searching would only run all the way to max_periods.
+            logging.warning('Fish %u is never up: %s', fish.id, problem)
+            continue
+        pending[fish.id] = (fish, period_ranges(fish, fish_eyes), [], [])
+
+    block_start = first_period
+    while pending and block_start - first_period < max_periods:
+        # Forecast one extra period up front for previousWeatherSet.
+        periods = np.arange(block_start - 1, block_start + BLOCK_PERIODS, dtype=np.int64)
+        weather = table.forecast(periods)
+        block_end_ms = (block_start + BLOCK_PERIODS) * PERIOD_MS
+
+        for fish_id in list(pending):
+            fish, phases, starts, ends = pending[fish_id]
+            block_starts, block_ends = _fish_intervals(fish, phases, table, periods, weather)
+            starts.append(block_starts)
+            ends.append(block_ends)
+
+            merged_starts, merged_ends = merge_intervals(np.concatenate(starts), np.concatenate(ends))
+            keep = merged_ends > start
+            merged_starts, merged_ends = merged_starts[keep], merged_ends[keep]
+            # The last window may carry on into the next block.
+            closed = int(np.count_nonzero(merged_ends < block_end_ms))
+            if closed >= count:
+                results[fish_id] = list(zip(merged_starts[:count].tolist(),
+                                            merged_ends[:count].tolist()))
+                del pending[fish_id]
+            else:
+                pending[fish_id] = (fish, phases, [merged_starts], [merged_ends])
+
+        block_start += BLOCK_PERIODS
+
+    # Out of periods to search; return whatever was found.
+    for fish_id, (fish, phases, starts, ends) in pending.items():
+        results[fish_id] = list(zip(np.concatenate(starts)[:count].tolist(),
+                                    np.concatenate(ends)[:count].tolist()))
+    return results
+
+
+def windows_between(fishes, table, start, end, fish_eyes=False):
+    """
+    Returns an OrderedDict mapping fish id -> (starts, ends) arrays of every
+    window overlapping [*start*, *end*), clipped to it.
+
+    Unlike `find_windows`, fish that are always up are included; they have a
+    single window covering the whole span.
+    """
+    if not isinstance(table, WeatherTable):
+        table = WeatherTable(table)
+
+    start, end = int(start), int(end)
+    periods = np.arange(int(period_of(start)) - 1, int(period_of(end - 1)) + 1, dtype=np.int64)
+    weather = table.forecast(periods)
+
+    results = OrderedDict()
+    for fish in fishes:
+        starts, ends = merge_intervals(*_fish_intervals(fish, period_ranges(fish, fish_eyes),
+                                                        table, periods, weather))
+        keep = (ends > start) & (starts < end)
+        results[fish.id] = (np.maximum(starts[keep], start), np.minimum(ends[keep], end))
+    return results
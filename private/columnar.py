@@ -0,0 +1,198 @@
+"""
+Columnar (struct-of-arrays) encoding for tables of uniform records.
+
+Instead of repeating every field name in every record, a table is stored as
+a list of keys plus one column per field:
+
+    {"keys": [...], "fields": ["_id", ...], "columns": {"_id": <column>, ...}}
+
+Each column uses whichever of these encodings is smaller:
+
+    {"v": [...]}                       One value per record.
+    {"d": <default>, "m": <bitmap>, "v": [...]}
+                                       Records whose bit is set take the next
+                                       value from "v"; the rest are <default>.
+    {"d": <bool>, "m": <bitmap>}       Boolean column; set bits are "not d".
+
+Bitmaps are base64 strings, with record N stored in bit (N % 8) of byte N // 8.
+"""
+from collections import OrderedDict
+import base64
+import json
+
+COLUMNAR_FORMAT = 1
+
+
+def _canonical(value):
+    # Compare values by their JSON form, so 0, 0.0 and False (or [] and None)
+    # are never mistaken for one another.
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _size(obj):
+    return len(_canonical(obj).encode('utf-8'))
+
+
+def encode_bitmap(bits):
+    data = bytearray((len(bits) + 7) // 8)
+    for n, bit in enumerate(bits):
+        if bit:
+            data[n >> 3] |= 1 << (n & 7)
+    return base64.b64encode(bytes(data)).decode('ascii')
+
+
+# The eight bits of every possible byte, lowest bit first.
+_BYTE_BITS = [tuple(bool(b & (1 << n)) for n in range(8)) for b in range(256)]
+
+
+def decode_bitmap(text, count):
+    bits = []
+    for b in base64.b64decode(text):
+        bits.extend(_BYTE_BITS[b])
+    return bits[:count]
+
+
+def _encode_column(values):
+    encoded = [_canonical(v) for v in values]
+    candidates = [OrderedDict([('v', values)])]
+
+    counts = {}
+    for n, e in enumerate(encoded):
+        counts.setdefault(e, []).append(n)
+    # Most common value first; ties go to whichever appeared first.
+    default = max(counts, key=lambda e: (len(counts[e]), -counts[e][0]))
+    default_value = values[counts[default][0]]
+    bits = [e != default for e in encoded]
+
+    if all(isinstance(v, bool) for v in values):
+        candidates.append(OrderedDict([('d', default_value), ('m', encode_bitmap(bits))]))
+    else:
+        candidates.append(OrderedDict([('d', default_value),
+                                       ('m', encode_bitmap(bits)),
+                                       ('v', [v for v, bit in zip(values, bits) if bit])]))
+    return min(candidates, key=_size)
+
+
+def _decode_column(column, count):
+    if 'm' not in column:
+        return list(column['v'])
+    default = column['d']
+    bits = decode_bitmap(column['m'], count)
+    if 'v' not in column:
+        return [(not default) if bit else default for bit in bits]
+    values = iter(column['v'])
+    if isinstance(default, (list, dict)):
+        # Copy the default for each record so decoded records don't share it.
+        return [next(values) if bit else type(default)(default) for bit in bits]
+    return [next(values) if bit else default for bit in bits]
+
+
+def encode_table(table):
+    """
+    Encodes an OrderedDict of records (dicts with the same fields, in the same
+    order) into the columnar layout.
+    """
+    keys = list(table.keys())
+    fields = []
+    for record in table.values():
+        fields = list(record.keys())
+        break
+    for key, record in table.items():
+        if list(record.keys()) != fields:
+            raise ValueError('Record %r does not have the same fields as the rest' % (key,))
+
+    columns = OrderedDict(
+        (field, _encode_column([_plain(record[field]) for record in table.values()]))
+        for field in fields)
+    return OrderedDict([('format', COLUMNAR_FORMAT),
+                        ('keys', keys),
+                        ('fields', fields),
+                        ('columns', columns)])
+
+
+def decode_table(encoded):
+    """
+    Reverses `encode_table`, returning an OrderedDict of OrderedDict records.
+    """
+    if encoded.get('format') != COLUMNAR_FORMAT:
+        raise ValueError('Unsupported columnar format: %r' % encoded.get('format'))
+    keys = encoded['keys']
+    fields = encoded['fields']
+    columns = [_decode_column(encoded['columns'][field], len(keys)) for field in fields]
+    return OrderedDict(
+        (key, OrderedDict(zip(fields, values)))
+        for key, values in zip(keys, zip(*columns)))
+
+
+def _plain(value):
+    # Tuples become lists in JSON; do the same up front so decoding is exact.
+    return json.loads(_canonical(value))
+
+
+def benchmark(table, number=5):
+    """
+    Compares the size and parse time of *table* in the record layout
+    against the columnar layout. Raises AssertionError if the columnar
+    layout doesn't round-trip exactly.
+    """
+    import gzip
+    import timeit
+
+    records_text = _canonical(table)
+    encoded = encode_table(table)
+    columnar_text = _canonical(encoded)
+
+    decoded = decode_table(json.loads(columnar_text, object_pairs_hook=OrderedDict))
+    if _canonical(decoded) != records_text:
+        raise AssertionError('Columnar encoding does not round-trip')
+
+    def parse_records():
+        json.loads(records_text, object_pairs_hook=OrderedDict)
+
+    def parse_columnar():
+        decode_table(json.loads(columnar_text, object_pairs_hook=OrderedDict))
+
+    def best(fn):
+        return min(timeit.repeat(fn, number=1, repeat=number))
+
+    results = OrderedDict()
+    for name, text, fn in [('records', records_text, parse_records),
+                           ('columnar', columnar_text, parse_columnar)]:
+        data = text.encode('utf-8')
+        results[name] = OrderedDict([('bytes', len(data)),
+                                     ('gzip', len(gzip.compress(data, 9))),
+                                     ('parse', best(fn))])
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+    import logging
+    import os
+    import sys
+
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+    from js_data import read_js_data
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    parser = argparse.ArgumentParser(description='Benchmark the columnar FISH encoding')
+    parser.add_argument('js_file', nargs='?', type=str,
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                             '..', 'js', 'app', 'data.js'),
+                        help='data.js file to read (default: %(default)s)')
+    parser.add_argument('--table', type=str, default='FISH', help='Table to encode')
+    parser.add_argument('-n', '--number', type=int, default=5, help='Timing repetitions')
+    args = parser.parse_args()
+
+    _, tables = read_js_data(args.js_file)
+    table = tables[args.table]
+    results = benchmark(table, args.number)
+    for name, result in results.items():
+        logging.info('%-8s %9u bytes, %8u gzipped, parsed in %.1fms',
+                     name, result['bytes'], result['gzip'], result['parse'] * 1000)
+    logging.info('Columnar %s is %.1f%% smaller (%.1f%% gzipped), parses %.2fx as fast',
+                 args.table,
+                 100.0 * (1 - results['columnar']['bytes'] / results['records']['bytes']),
+                 100.0 * (1 - results['columnar']['gzip'] / results['records']['gzip']),
+                 results['records']['parse'] / results['columnar']['parse'])
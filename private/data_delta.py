@@ -0,0 +1,171 @@
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+
+from js_data import atomic_open, format_js_tables, parse_js_data, FOLDABLE
+
+DELTA_FORMAT = 1
+
+
+def artifact_hash(data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def delta_file_name(js_file, base_hash):
+    # Clients holding the build with this hash fetch exactly this file.
+    root, _ = os.path.splitext(os.path.basename(js_file))
+    return '%s.delta.%s.json' % (root, base_hash[:12])
+
+
+def _canonical(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _newline(text):
+    return '\r\n' if '\r\n' in text else '\n'
+
+
+def _render(var_name, tables, newline):
+    return format_js_tables(var_name, tables.items(), FOLDABLE).replace('\n', newline)
+
+
+def _diff_table(old, new):
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        if old is not None and _canonical(old) == _canonical(new):
+            return None
+        return OrderedDict([('value', new)])
+
+    added = OrderedDict((k, v) for k, v in new.items() if k not in old)
+    removed = [k for k in old if k not in new]
+    changed = OrderedDict((k, v) for k, v in new.items()
+                          if k in old and _canonical(v) != _canonical(old[k]))
+    if not (added or removed or changed) and list(old) == list(new):
+        return None
+
+    delta = OrderedDict()
+    if added:
+        delta['added'] = added
+    if removed:
+        delta['removed'] = removed
+    if changed:
+        delta['changed'] = changed
+    # Only spell out the key order if applying the delta wouldn't get it
+    # right by itself (kept keys stay put, new ones go at the end).
+    if list(_patch_table(old, delta)) != list(new):
+        delta['order'] = list(new)
+    return delta
+
+
+def _patch_table(old, delta):
+    if 'value' in delta:
+        return delta['value']
+    removed = set(delta.get('removed', []))
+    changed = delta.get('changed', {})
+    table = OrderedDict((k, changed.get(k, v)) for k, v in old.items() if k not in removed)
+    table.update(delta.get('added', {}))
+    if 'order' in delta:
+        table = OrderedDict((k, table[k]) for k in delta['order'])
+    return table
+
+
+def make_delta(old_text, new_text):
+    """
+    Builds a keyed delta that turns the data file *old_text* into
+    *new_text*: the added, removed and changed records of each table.
+
+    Raises ValueError if *new_text* isn't in the layout `apply_delta`
+    reproduces, since such a delta could never be verified.
+    """
+    old_name, old_tables = parse_js_data(old_text)
+    new_name, new_tables = parse_js_data(new_text)
+    newline = _newline(new_text)
+    if _render(new_name, new_tables, newline) != new_text:
+        raise ValueError('NEW is not in the foldable data.js layout')
+
+    tables = OrderedDict()
+    for name, table in new_tables.items():
+        table_delta = _diff_table(old_tables.get(name), table)
+        if table_delta is not None:
+            tables[name] = table_delta
+
+    delta = OrderedDict([('format', DELTA_FORMAT),
+                         ('base', artifact_hash(old_text)),
+                         ('target', artifact_hash(new_text)),
+                         ('var', new_name),
+                         ('newline', newline)])
+    if list(old_tables) != list(new_tables) or old_name != new_name:
+        delta['order'] = list(new_tables)
+    delta['tables'] = tables
+    return delta
+
+
+def apply_delta(old_text, delta):
+    """
+    Applies *delta* to the data file *old_text* and returns the new file.
+
+    Raises ValueError if *old_text* isn't the build the delta was made
+    from, or if the result doesn't hash to the delta's target.
+    """
+    if delta.get('format') != DELTA_FORMAT:
+        raise ValueError('Unsupported delta format: %r' % delta.get('format'))
+    if artifact_hash(old_text) != delta['base']:
+        raise ValueError('Delta base %s does not match %s' % (delta['base'][:12],
+                                                               artifact_hash(old_text)[:12]))
+
+    _, old_tables = parse_js_data(old_text)
+    tables = OrderedDict()
+    for name in delta.get('order', old_tables.keys()):
+        if name in delta['tables']:
+            tables[name] = _patch_table(old_tables.get(name, OrderedDict()), delta['tables'][name])
+        else:
+            tables[name] = old_tables[name]
+
+    new_text = _render(delta['var'], tables, delta['newline'])
+    if artifact_hash(new_text) != delta['target']:
+        raise ValueError('Applying the delta did not reproduce %s' % delta['target'][:12])
+    return new_text
+
+
+def _read_text(path):
+    # newline='' so the hashes are of the bytes on disk.
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+def write_delta(old_text, new_file, out_file=None):
+    """
+    Writes the delta from *old_text* to the current contents of *new_file*,
+    after checking that it applies cleanly. Returns the output path, or None
+    if nothing changed.
+    """
+    new_text = _read_text(new_file)
+    if old_text == new_text:
+        logging.info('%s is unchanged; no delta needed', new_file)
+        return None
+
+    delta = make_delta(old_text, new_text)
+    apply_delta(old_text, delta)
+
+    if out_file is None:
+        out_file = os.path.join(os.path.dirname(os.path.abspath(new_file)),
+                                delta_file_name(new_file, delta['base']))
+    with atomic_open(out_file) as f:
+        json.dump(delta, f, ensure_ascii=False, separators=(',', ':'))
+
+    for name, table_delta in delta['tables'].items():
+        logging.info('%s: %u added, %u removed, %u changed%s', name,
+                     len(table_delta.get('added', {})),
+                     len(table_delta.get('removed', [])),
+                     len(table_delta.get('changed', {})),
+                     ' (replaced)' if 'value' in table_delta else '')
+    logging.info('Wrote %s (%u bytes, %s is %u bytes)', out_file, os.path.getsize(out_file),
+                 os.path.basename(new_file), len(new_text.encode('utf-8')))
+    return out_file
+
+
+def diff_files(old_file, new_file, out_file=None):
+    return write_delta(_read_text(old_file), new_file, out_file)
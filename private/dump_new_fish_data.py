@@ -1,17 +1,27 @@
-from typing import Dict, Any, List, Iterable
-from dataclasses import dataclass, make_dataclass, field
+from typing import Iterable
+from dataclasses import dataclass
+from collections import OrderedDict, namedtuple
+import argparse
+import json
 import logging
 import sys
 import os
+import pickle
 import re
-from itertools import chain, filterfalse, islice, repeat
-from more_itertools import nth, flatten, unique_everseen
+from more_itertools import flatten
 from functools import reduce
 from operator import add, itemgetter
 import timeit
+import tracemalloc
 
 from tqdm import tqdm
 
+from localized_fields import make_static_localized_field, extract_localized_column
+from js_data import write_js_tables, atomic_open, PRETTY
+from build_cache import read_game_version, script_version, digest, file_digest
+from sheet_index import JoinSpec, extract_rows, hash_join
+from name_index import NameIndex, NameMatcher, NameNotFoundError
+
 try:
     _SCRIPT_PATH = os.path.abspath(__path__)
 except:
@@ -27,11 +37,10 @@ sys.path += [os.path.join(_HELPER_LIBS_PATH, 'saintcoinach-py')]
 import pysaintcoinach
 from pysaintcoinach.ex.language import Language
 
-from pysaintcoinach.xiv import as_row_type, XivRow
+from pysaintcoinach.xiv import XivRow
 # from pysaintcoinach.xiv.masterpiece_supply_duty import MasterpieceSupplyDuty
 from pysaintcoinach.xiv.item import Item
 from pysaintcoinach.xiv.fishing_spot import FishingSpot
-from pysaintcoinach.xiv.fish_parameter import FishParameter
 from pysaintcoinach.xiv.gathering_point import GatheringPoint
 from pysaintcoinach.xiv.weather import Weather
 from pysaintcoinach.xiv.placename import PlaceName
@@ -40,18 +49,12 @@ logging.basicConfig(level=logging.INFO, stream=sys.stderr)
 if os.environ.get('SILENCE_PYSAINTCOINACH'):
     logging.getLogger('pysaintcoinach').setLevel(logging.WARNING)
 
-def first(iterable, pred, default=None):
-    """Returns the first item for which pred(item) is true.
-
-    If no true value is found, returns *default*
-
-    """
-    return next(filter(pred, iterable), default)
+_start_time = timeit.default_timer()
 
+DEFAULT_GAME_PATH = r"C:\Program Files (x86)\SquareEnix\FINAL FANTASY XIV - A Realm Reborn"
 
-_start_time = timeit.default_timer()
 
-def _init_saintcoinach():
+def _init_saintcoinach(game_path=DEFAULT_GAME_PATH):
     # Add the Saint Coinach python API to the path.
     sys.path += [os.path.join(_HELPER_LIBS_PATH, 'saintcoinach-py')]
 
@@ -75,8 +78,7 @@ def _init_saintcoinach():
     _string_decoder = text.XivStringDecoder.default()
 
     # Load up the game data
-    xiv = ARealmReversed(r"C:\Program Files (x86)\SquareEnix\FINAL FANTASY XIV - A Realm Reborn",
-                         Language.english)
+    xiv = ARealmReversed(game_path, Language.english)
     # Override the tag decoder for emphasis so it doesn't produce tags in string...
     def omit_tag_decoder(i, t, l):
         text.XivStringDecoder.get_integer(i)
@@ -90,25 +92,70 @@ def _init_saintcoinach():
     return xiv
 
 
-realm = _init_saintcoinach()
+realm = None  # type: 'pysaintcoinach.ARealmReversed'
+LANGUAGES = []
+
+
+# Fish are kept as compact records of plain values, pulled out of the rows
+# when the spots are scanned; holding on to the rows themselves drags their
+# sheets (and every lazily decoded column) along. Plain values also let every
+# Fish be written to a checkpoint and read back (see fish_to_plain).
+
+# Where a fish is caught. *key* is the FishingSpot key, or for spearfishing,
+# the GatheringPointBase key. *name* is the English place name.
+Spot = namedtuple('Spot', 'key territory place_name name hidden')
+
 
-@dataclass
 class Fish(object):
-    item: as_row_type('Item')
-    params: Any = field(default=None)
-    spearfishing: bool = field(default=False)
-    spots: list = field(default_factory=list)
-    quest: list = field(default_factory=list)
-    shop: list = field(default_factory=list)
-    scrip: Any = field(default=None)
-    satisfaction: Any = field(default=None)
-    gc: Any = field(default=None)
-    leve: list = field(default_factory=list)
-    craft: list = field(default_factory=list)
-    reduce: Any = field(default=None)
-    aquarium: Any = field(default=None)
-    ecology: bool = field(default=False)
-    expansion: Any = field(default=None)
+    __slots__ = ('key', 'name', 'rarity', 'reduce', 'legendary', 'big_fish',
+                 'spearfishing', 'spots', 'expansion',
+                 'folklore', 'quest', 'shop', 'scrip', 'satisfaction', 'gc',
+                 'leve', 'craft', 'aquarium', 'ecology')
+
+    def __init__(self, key, name, rarity=0, reduce=False, legendary=False, big_fish=False,
+                 spearfishing=False, spots=None, expansion=None):
+        self.key = key
+        self.name = name
+        self.rarity = rarity
+        self.reduce = reduce
+        # From the Japanese description: "オオヌシ" and "ヌシ".
+        self.legendary = legendary
+        self.big_fish = big_fish
+        self.spearfishing = spearfishing
+        self.spots = spots if spots is not None else []
+        # ExVersion key
+        self.expansion = expansion
+        # The rest is filled in by the scanners.
+        # (GatheringSubCategory key, name)
+        self.folklore = None
+        # (Quest key, name) pairs.
+        self.quest = []
+        self.shop = []
+        # CollectablesShopRefine's LowCollectability
+        self.scrip = None
+        # SatisfactionSupply's Collectability{High}
+        self.satisfaction = None
+        self.gc = None
+        # Leve keys
+        self.leve = []
+        # Recipe keys
+        self.craft = []
+        # {'water': ..., 'size': ...}
+        self.aquarium = None
+        self.ecology = False
+
+    @classmethod
+    def from_item(cls, item: Item, spearfishing=False):
+        description = str(item.source_row['Description', Language.japanese])
+        return cls(item.key, str(item.name),
+                   rarity=item.rarity,
+                   reduce=bool(item.is_aetherial_reducible),
+                   legendary="オオヌシ" in description,
+                   big_fish="ヌシ" in description,
+                   spearfishing=spearfishing)
+
+    def __repr__(self):
+        return 'Fish(%u, %r)' % (self.key, self.name)
 
 
 @dataclass
@@ -118,17 +165,6 @@ class GCSupplyDutyTurnin(object):
     seals: int
 
 
-@dataclass
-class SpearfishingNode(object):
-    gathering_point_base: as_row_type('GatheringPointBase')
-    territory_type: as_row_type('TerritoryType')
-    place_name: as_row_type('PlaceName')
-    hidden: bool = field(default=False)
-
-    @property
-    def key(self): return self.gathering_point_base.key
-
-
 def tracked_iter(_iter, desc, **kwargs):
     return tqdm(_iter,
                 desc,
@@ -138,159 +174,222 @@ def tracked_iter(_iter, desc, **kwargs):
 
 
 # Get a list of catchable fish first.
-catchable_fish = {}  # type: Dict[int, Fish]
-
-for fishing_spot in tracked_iter(realm.game_data.get_sheet(FishingSpot),
-                                 'Scanning fishing spots'):
-    if fishing_spot.place_name.key == 0:
-        continue
-    if fishing_spot.territory_type is None:
-        continue
-
-    logging.info("Checking spot: %s" % fishing_spot.place_name.name)
-
-    for item in fishing_spot.items:
-        if item.key not in catchable_fish:
-            catchable_fish[item.key] = Fish(item,
-                                            reduce=item.is_aetherial_reducible)
-        catchable_fish[item.key].spots.append(fishing_spot)
-        if catchable_fish[item.key].expansion is not None:
-            # Warn if a fish is posted to more than one expansion please.
-            if catchable_fish[item.key].expansion != fishing_spot.territory_type['ExVersion']:
-                # FUSE: Shirogane's territory type is set to 0 (ARR).
-                # So if that's the territory, you can ignore this...
-                if fishing_spot.territory_type.place_name.name != 'Shirogane':
-                    if catchable_fish[item.key].expansion.key > fishing_spot.territory_type['ExVersion'].key:
-                        logging.warning("%s is found in areas belonging to both %s and %s" %
-                                        (item.name,
-                                         catchable_fish[item.key].expansion,
-                                         fishing_spot.territory_type['ExVersion']))
-                        logging.warning("Entry for fishing spot %u (%s) is from an earlier expac." %
-                                        (fishing_spot.key, fishing_spot.place_name.name))
-        else:
-            catchable_fish[item.key].expansion = fishing_spot.territory_type['ExVersion']
-
-# Now, we'll check for spearfishing nodes.
-for gathering_point in tracked_iter(realm.game_data.get_sheet(GatheringPoint),
-                                    'Scanning spearfishing nodes'):
-    if gathering_point.base.type.key != 5:
-        continue
-
-    # Each GatheringPoint represents a single map spawn node. You need to normalize
-    # these with the GatheringPointBase...
-    item: Item
-    for item in gathering_point.base.items:
-        if item.key not in catchable_fish:
-            catchable_fish[item.key] = Fish(item,
-                                            spearfishing=True,
-                                            reduce=item.is_aetherial_reducible)
-        # Add the gathering point to this fish.
-        # The check is necessary because gathering points come in sets. We only want
-        # the base point.
-        gathering_point_base = gathering_point.base
-        if gathering_point_base.key not in map(lambda x: x.gathering_point_base.key,
-                                               catchable_fish[item.key].spots):
-            catchable_fish[item.key].spots.append(
-                SpearfishingNode(gathering_point_base,
-                                 gathering_point.territory_type,
-                                 gathering_point.place_name,
-                                 gathering_point['Count'] == 1))
+catchable_fish = {}  # Item key -> Fish
+
+
+def scan_spots():
+    for fishing_spot in tracked_iter(realm.game_data.get_sheet(FishingSpot),
+                                     'Scanning fishing spots'):
+        if fishing_spot.place_name.key == 0:
+            continue
+        if fishing_spot.territory_type is None:
+            continue
+
+        logging.info("Checking spot: %s" % fishing_spot.place_name.name)
+
+        territory = fishing_spot.territory_type
+        expansion = territory['ExVersion']
+        spot = Spot(fishing_spot.key, territory.key, fishing_spot.place_name.key,
+                    str(fishing_spot.place_name.name), False)
+        for item in fishing_spot.items:
+            if item.key not in catchable_fish:
+                catchable_fish[item.key] = Fish.from_item(item)
+            catchable_fish[item.key].spots.append(spot)
+            if catchable_fish[item.key].expansion is not None:
+                # Warn if a fish is posted to more than one expansion please.
+                if catchable_fish[item.key].expansion != expansion.key:
+                    # FUSE: Shirogane's territory type is set to 0 (ARR).
+                    # So if that's the territory, you can ignore this...
+                    if territory.place_name.name != 'Shirogane':
+                        if catchable_fish[item.key].expansion > expansion.key:
+                            logging.warning("%s is found in areas belonging to both %s and %s" %
+                                            (item.name,
+                                             realm.game_data.get_sheet('ExVersion')[
+                                                 catchable_fish[item.key].expansion],
+                                             expansion))
+                            logging.warning("Entry for fishing spot %u (%s) is from an earlier expac." %
+                                            (fishing_spot.key, fishing_spot.place_name.name))
+            else:
+                catchable_fish[item.key].expansion = expansion.key
+
+    # Now, we'll check for spearfishing nodes.
+    for gathering_point in tracked_iter(realm.game_data.get_sheet(GatheringPoint),
+                                        'Scanning spearfishing nodes'):
+        if gathering_point.base.type.key != 5:
+            continue
+
+        # Each GatheringPoint represents a single map spawn node. You need to normalize
+        # these with the GatheringPointBase...
+        item: Item
+        for item in gathering_point.base.items:
+            if item.key not in catchable_fish:
+                catchable_fish[item.key] = Fish.from_item(item, spearfishing=True)
+            # Add the gathering point to this fish.
+            # The check is necessary because gathering points come in sets. We only want
+            # the base point.
+            gathering_point_base = gathering_point.base
+            if gathering_point_base.key not in map(lambda x: x.key,
+                                                   catchable_fish[item.key].spots):
+                territory = gathering_point.territory_type
+                catchable_fish[item.key].spots.append(
+                    Spot(gathering_point_base.key,
+                         territory.key if territory is not None else None,
+                         gathering_point.place_name.key,
+                         str(gathering_point.place_name.name),
+                         gathering_point['Count'] == 1))
+
 
 #
-# Attempt to run the rest in parallel
+# Run the rest in parallel
 #
+# Each scanner fills in one field of the catchable fish. It comes in two
+# halves: an extractor, which reads the columns it needs out of the DATs
+# (once, in this process), and the scanner itself, which joins the fish
+# against that plain data. The scanners run in separate processes, none of
+# which opens the DATs, and only return plain values keyed by fish, which
+# run_scan_tasks merges back into catchable_fish in SCAN_TASKS order.
+
+ScanTask = namedtuple('ScanTask', 'name func field extract')
 
 SCAN_TASKS = []
 
 
-def scan_task(f):
-    SCAN_TASKS.append(f)
-    return f
+def scan_task(field, extract):
+    def decorator(f):
+        SCAN_TASKS.append(ScanTask(f.__name__, f, field, extract))
+        return f
+    return decorator
 
 
-@scan_task
-def scan_fish_params(orig_stdout, n=None):
-    for fish_params in tracked_iter(realm.game_data.get_sheet(FishParameter),
-                                    'Scanning fish parameters',
-                                    file=orig_stdout, position=n):
-        if fish_params.item is None:
-            continue
-        fish_key = fish_params.item.key
-        if fish_key in catchable_fish:
-            catchable_fish[fish_key].params = fish_params
-    return True
+def _extract(sheet_name, columns, where=None):
+    rows = tracked_iter(realm.game_data.get_sheet(sheet_name), 'Extracting %s' % sheet_name)
+    return extract_rows(rows, columns, where)
 
 
-@scan_task
-def scan_scrip_turnins(orig_stdout, n=None):
-    for fish_key in tracked_iter(catchable_fish,
-                             'Scanning scrip turn-ins',
-                             file=orig_stdout, position=n):
-        if realm.game_data.get_sheet(Item)[fish_key].as_boolean('IsCollectable'):
-            shop_item = next(filter(lambda row: row.get_raw('Item') == fish_key,
-                                    realm.game_data.get_sheet('CollectablesShopItem')), None)
-            if shop_item is not None:
-                catchable_fish[fish_key].scrip = shop_item
-    return True
+# Most scanners are a join of the catchable fish against one sheet's rows
+# (see sheet_index.JoinSpec): a single pass, matching the columns that hold
+# item keys, and keeping only what's needed from each matching row.
 
+def _join(spec, rows, fish_keys, orig_stdout=None, n=None):
+    rows = tracked_iter(rows, 'Scanning %s' % spec.sheet, file=orig_stdout, position=n)
+    return hash_join(rows, spec, fish_keys)
 
-@scan_task
-def scan_gc_supply_duties(orig_stdout, n=None):
-    for duty in tracked_iter(realm.game_data.get_sheet('GCSupplyDuty'),
-                             'Scanning GC supply duties',
-                             file=orig_stdout, position=n):
-        # There are 3 possible items for each duty. FSH is index 10.
-        for i in range(3):
-            item = duty[('Item', i, 10)]
-            if item.key in catchable_fish:
-                reward = realm.game_data.get_sheet('GCSupplyDutyReward')[duty.key]
-                catchable_fish[item.key].gc = GCSupplyDutyTurnin(
-                    duty[('ItemCount', i, 10)],
-                    reward['Experience{Provisioning}'],
-                    reward['Seals{Provisioning}'])
 
-    return True
+def _first_match(matches):
+    return dict((fish_key, values[0]) for fish_key, values in matches.items())
 
 
-@scan_task
-def scan_leves(orig_stdout, n=None):
-    for leve in tracked_iter(realm.game_data.get_sheet('Leve'),
-                             'Scanning leve turn-ins',
-                             file=orig_stdout, position=n):
-        if 'FSH' not in [str(job.abbreviation) for job in leve['ClassJobCategory'].class_jobs]:
-            continue
+def _last_match(matches):
+    return dict((fish_key, values[-1]) for fish_key, values in matches.items())
 
-        # These are a little weird.  They are actually using CraftLeve... Just go with it...
-        leve_fish = leve['DataId'].get_raw(XivRow.build_column_name('Item', 0))
-        if leve_fish in catchable_fish:
-            catchable_fish[leve_fish].leve.append(leve)
 
-    return True
+def _fisher_job_categories():
+    # Checking each category once beats building the job list for every row.
+    return set(category.key for category in realm.game_data.get_sheet('ClassJobCategory')
+               if 'FSH' in [str(job.abbreviation) for job in category.class_jobs])
 
 
-@scan_task
-def scan_recipes(orig_stdout, n=None):
-    for recipe in tracked_iter(realm.game_data.get_sheet('Recipe'),
-                               'Scanning recipes',
-                               file=orig_stdout, position=n):
-        for i in range(8):
-            ingredient = recipe.get_raw(XivRow.build_column_name('Item{Ingredient}', i))
-            if ingredient in catchable_fish:
-                catchable_fish[ingredient].craft.append(recipe)
+def _extract_fish_params(fish_keys):
+    def folklore(row):
+        folklore = row['GatheringSubCategory']
+        return (folklore.key, str(folklore)) if folklore is not None else None
 
-    return True
+    # Only the folklore book is needed from FishParameter.
+    return _extract('FishParameter', {'Item': 'Item', 'folklore': folklore},
+                    where=lambda row: row.get_raw('Item') in fish_keys)
 
 
-@scan_task
-def scan_aquariums(orig_stdout, n=None):
-    for aquarium_fish in tracked_iter(realm.game_data.get_sheet('AquariumFish'),
-                                      'Scanning aquarium fish',
-                                      file=orig_stdout, position=n):
-        fish_key = aquarium_fish.get_raw('Item')
-        if fish_key in catchable_fish:
-            catchable_fish[fish_key].aquarium = aquarium_fish
+@scan_task('folklore', _extract_fish_params)
+def scan_fish_params(fish_keys, rows, orig_stdout=None, n=None):
+    spec = JoinSpec('FishParameter', ['Item'], lambda row, _: row['folklore'])
+    return _last_match(_join(spec, rows, fish_keys, orig_stdout, n))
 
-    return True
+
+def _extract_scrip_turnins(fish_keys):
+    items = realm.game_data.get_sheet(Item)
+    collectables = set(fish_key for fish_key in fish_keys
+                       if items[fish_key].as_boolean('IsCollectable'))
+    return _extract('CollectablesShopItem',
+                    {'Item': 'Item',
+                     'low': lambda row: int(row['CollectablesShopRefine']['LowCollectability'])},
+                    where=lambda row: row.get_raw('Item') in collectables)
+
+
+@scan_task('scrip', _extract_scrip_turnins)
+def scan_scrip_turnins(fish_keys, rows, orig_stdout=None, n=None):
+    spec = JoinSpec('CollectablesShopItem', ['Item'], lambda row, _: row['low'])
+    return _first_match(_join(spec, rows, fish_keys, orig_stdout, n))
+
+
+# There are 3 possible items for each duty. FSH is index 10.
+_GC_ITEM_COLUMNS = [XivRow.build_column_name('Item', i, 10) for i in range(3)]
+_GC_COUNT_COLUMNS = [XivRow.build_column_name('ItemCount', i, 10) for i in range(3)]
+
+
+def _extract_gc_supply_duties(fish_keys):
+    columns = OrderedDict((column, column) for column in _GC_ITEM_COLUMNS + _GC_COUNT_COLUMNS)
+    return {'duties': _extract('GCSupplyDuty', columns,
+                               where=lambda duty: any(duty.get_raw(column) in fish_keys
+                                                      for column in _GC_ITEM_COLUMNS)),
+            'rewards': dict((reward.key, (int(reward['Experience{Provisioning}']),
+                                          int(reward['Seals{Provisioning}'])))
+                            for reward in realm.game_data.get_sheet('GCSupplyDutyReward'))}
+
+
+@scan_task('gc', _extract_gc_supply_duties)
+def scan_gc_supply_duties(fish_keys, data, orig_stdout=None, n=None):
+    rewards = data['rewards']
+
+    def turnin(duty, i):
+        return (int(duty[_GC_COUNT_COLUMNS[i]]),) + rewards[duty.key]
+
+    spec = JoinSpec('GCSupplyDuty', _GC_ITEM_COLUMNS, turnin)
+    return _last_match(_join(spec, data['duties'], fish_keys, orig_stdout, n))
+
+
+def _extract_leves(fish_keys):
+    fisher_categories = _fisher_job_categories()
+    # These are a little weird.  They are actually using CraftLeve... Just go with it...
+    return _extract('Leve',
+                    {'item': lambda leve: leve['DataId'].get_raw(XivRow.build_column_name('Item', 0))},
+                    where=lambda leve: leve.get_raw('ClassJobCategory') in fisher_categories)
+
+
+@scan_task('leve', _extract_leves)
+def scan_leves(fish_keys, rows, orig_stdout=None, n=None):
+    spec = JoinSpec('Leve', lambda leve: [(leve['item'], 0)])
+    return dict(_join(spec, rows, fish_keys, orig_stdout, n))
+
+
+_RECIPE_COLUMNS = [XivRow.build_column_name('Item{Ingredient}', i) for i in range(8)]
+
+
+def _extract_recipes(fish_keys):
+    # Most recipes don't use any fish, so leave them out here already.
+    return _extract('Recipe', OrderedDict((column, column) for column in _RECIPE_COLUMNS),
+                    where=lambda recipe: any(recipe.get_raw(column) in fish_keys
+                                             for column in _RECIPE_COLUMNS))
+
+
+@scan_task('craft', _extract_recipes)
+def scan_recipes(fish_keys, rows, orig_stdout=None, n=None):
+    spec = JoinSpec('Recipe', _RECIPE_COLUMNS)
+    return dict(_join(spec, rows, fish_keys, orig_stdout, n))
+
+
+def _extract_aquariums(fish_keys):
+    return _extract('AquariumFish',
+                    {'Item': 'Item',
+                     'water': lambda row: str(row['AquariumWater']),
+                     'size': lambda row: int(row['Size'])},
+                    where=lambda row: row.get_raw('Item') in fish_keys)
+
+
+@scan_task('aquarium', _extract_aquariums)
+def scan_aquariums(fish_keys, rows, orig_stdout=None, n=None):
+    spec = JoinSpec('AquariumFish', ['Item'],
+                    lambda row, _: {'water': row['water'], 'size': row['size']})
+    return _last_match(_join(spec, rows, fish_keys, orig_stdout, n))
 
 # There's actually only 2 or 3 fish that show up in Shops, and the scanning
 # process itself takes forever compared to the rest of the scanners. These
@@ -312,116 +411,169 @@ def scan_aquariums(orig_stdout, n=None):
 #                 catchable_fish[cost.item.key].shop += [cost]
 
 
-@scan_task
-def scan_satisfaction(orig_stdout, n=None):
-    for supply in tracked_iter(realm.game_data.get_sheet('SatisfactionSupply'),
-                               'Scanning satisfaction supply requests',
-                               file=orig_stdout, position=n):
-        # We only care about Slot #3.
-        if supply['Slot'] != 3:
-            continue
-        item = supply['Item']
-        if item is not None and item.key in catchable_fish:
-            # Overwrite the entry if multiple matches are found.
-            # We ideally want only the last entry anyways...
-            catchable_fish[item.key].satisfaction = supply
+def _extract_satisfaction(fish_keys):
+    # We only care about Slot #3.
+    return _extract('SatisfactionSupply',
+                    {'Item': 'Item', 'high': lambda row: int(row['Collectability{High}'])},
+                    where=lambda row: row['Slot'] == 3 and row.get_raw('Item') in fish_keys)
 
-    return True
+
+@scan_task('satisfaction', _extract_satisfaction)
+def scan_satisfaction(fish_keys, rows, orig_stdout=None, n=None):
+    # If there are multiple matches, we ideally want only the last entry anyways...
+    spec = JoinSpec('SatisfactionSupply', ['Item'], lambda row, _: row['high'])
+    return _last_match(_join(spec, rows, fish_keys, orig_stdout, n))
 
 
-@scan_task
-def scan_quests(orig_stdout, n=None):
-    for quest in tracked_iter(realm.game_data.get_sheet('Quest'),
-                              'Scanning quests',
-                              file=orig_stdout, position=n):
+def _extract_quests(fish_keys):
+    fisher_categories = _fisher_job_categories()
+
+    def quest_items(quest):
         # Quests are a ROYAL PAIN!
         # We're looking for the Script{Instruction} fields named "RITEM#".
         # These will have corresponding Script{Arg} fields with item ids.
-        if 'FSH' not in [str(job.abbreviation) for job in quest[('ClassJobCategory', 0)].class_jobs]:
-            continue
+        return [(quest.get_raw(XivRow.build_column_name('Script{Arg}', i)), i)
+                for i in range(50)
+                if str(quest[('Script{Instruction}', i)]).startswith('RITEM')]
 
-        for i in range(50):
-            if not str(quest[('Script{Instruction}', i)]).startswith('RITEM'):
-                continue
-            item = quest.as_T(Item, 'Script{Arg}', i)
-            if item is not None and item.key in catchable_fish:
-                catchable_fish[item.key].quest += [(quest.key, str(quest))]
+    return _extract('Quest', {'items': quest_items, 'name': str},
+                    where=lambda quest: quest.get_raw(XivRow.build_column_name('ClassJobCategory', 0))
+                    in fisher_categories)
 
-    return True
+
+@scan_task('quest', _extract_quests)
+def scan_quests(fish_keys, rows, orig_stdout=None, n=None):
+    spec = JoinSpec('Quest', lambda quest: quest['items'],
+                    lambda quest, _: (quest.key, quest['name']))
+    return dict(_join(spec, rows, fish_keys, orig_stdout, n))
 
 
-@scan_task
-def scan_spearfishing_ecology(orig_stdout, n=None):
+def _extract_spearfishing_ecology(fish_keys):
+    items = realm.game_data.get_sheet(Item)
+    return {'ecology': _extract('SpearfishingEcology', {'text': lambda row: str(row[1])},
+                                where=lambda row: row.key != 0),
+            'names': [(fish_key, _item_sentence_name(items[fish_key]))
+                      for fish_key in sorted(fish_keys)]}
+
+
+@scan_task('ecology', _extract_spearfishing_ecology)
+def scan_spearfishing_ecology(fish_keys, data, orig_stdout=None, n=None):
     # The SpearfishingEcology sheet tells us which fish is needed to pop
     # the swimming shadows. This fish might not otherwise be important...
-    for ecology in tracked_iter(realm.game_data.get_sheet('SpearfishingEcology'),
-                                'Scanning spearfishing ecology',
+    # The text uses the fish's name as it appears in sentences, so only
+    # exact matches count. Every fish going by that name is flagged.
+    results = {}
+    names = {}
+    for fish_key, name in data['names']:
+        names.setdefault(name, []).append(fish_key)
+
+    for ecology in tracked_iter(data['ecology'], 'Scanning spearfishing ecology',
                                 file=orig_stdout, position=n):
-        if ecology.key == 0:
-            continue
-
-        m = re.search(r'With (.*) caught,', ecology[1])
+        m = re.search(r'With (.*) caught,', ecology['text'])
         if m is not None:
             name = m.group(1)
-            # Search all catchable fish for this name.
-            # NOTE: You must use the singular display name.
-            # If Article, then exclude "the " from the search.
-            for fish in catchable_fish.values():
-                fish_name = str(fish.item.as_string('Singular'))
-                if not fish.item.as_boolean('Article'):
-                    fish_name = "the " + fish_name
-                if fish_name == name:
-                    fish.ecology = True
-
-
-# import concurrent.futures
-#
-# import contextlib
-# import sys
-#
-# class DummyTqdmFile(object):
-#     file = None
-#     def __init__(self, file):
-#         self.file = file
-#
-#     def write(self, x):
-#         if len(x.rstrip()) > 0:
-#             tqdm.write(x, file=self.file)
-#
-#     def flush(self):
-#         return getattr(self.file, "flush", lambda: None)()
-#
-#
-# @contextlib.contextmanager
-# def std_out_err_redirect_tqdm():
-#     orig_out_err = sys.stdout, sys.stderr
-#     try:
-#         sys.stdout, sys.stderr = map(DummyTqdmFile, orig_out_err)
-#         yield orig_out_err[1]
-#     except Exception as exc:
-#         raise exc
-#     finally:
-#         sys.stdout, sys.stderr = orig_out_err
-#
-#
-# with concurrent.futures.ThreadPoolExecutor() as executor:
-#     # with std_out_err_redirect_tqdm() as orig_stdout:
-#     tasks = {executor.submit(task, None, n) for n, task in enumerate(SCAN_TASKS)}
-#     results = concurrent.futures.wait(tasks)
-#
-#     for task in results.done:
-#         result = task.result()
-#         print()
+            if name not in names:
+                suggestions = NameIndex(((other, keys[0]) for other, keys in names.items()),
+                                        tiers=('exact',)).suggest(name)
+                logging.warning('Spearfishing ecology %u needs an unknown fish: %s',
+                                ecology.key, NameNotFoundError(name, suggestions))
+                continue
+            for fish_key in names[name]:
+                results[fish_key] = True
+
+    return results
+
+
+def _init_scan_worker(lock):
+    # Share the bar lock, so the stacked progress bars don't trample each other.
+    tqdm.set_lock(lock)
+
 
+def _run_scan_task(n, fish_keys, data):
+    task = SCAN_TASKS[n]
+    start = timeit.default_timer()
+    results = task.func(fish_keys, data, None, n)
+    return results, timeit.default_timer() - start
 
-for n, task in enumerate(SCAN_TASKS):
-    task(None)
 
+def _run_pickled_scan_task(n, fish_keys, payload):
+    return _run_scan_task(n, fish_keys, pickle.loads(payload))
+
+
+def _item_sentence_name(item):
+    # The singular form, as it's used in sentences.
+    # If not Article, that's the form with "the " in front.
+    singular = str(item.as_string('Singular'))
+    if not item.as_boolean('Article'):
+        return 'the ' + singular
+    return singular
+
+
+def _merge_scan_results(task, results):
+    for fish_key, value in results.items():
+        if task.field == 'gc':
+            value = GCSupplyDutyTurnin(*value)
+        setattr(catchable_fish[fish_key], task.field, value)
+
+
+def run_scan_tasks(jobs=0):
+    """
+    Runs every scanner over the catchable fish. Each task's sheet data is
+    extracted just before it's needed and dropped once it's been scanned
+    (or, with *jobs* other than 1, handed to one of up to *jobs* worker
+    processes; 0 means one per scanner), so only one task's rows are alive
+    in this process at a time. Each task's progress bar keeps its own line
+    (position=n), and the time each step took is logged at the end.
+    """
+    fish_keys = set(catchable_fish)
+
+    def extracted():
+        for n, task in enumerate(SCAN_TASKS):
+            task_start = timeit.default_timer()
+            data = task.extract(fish_keys)
+            extract_timings.append(timeit.default_timer() - task_start)
+            yield n, data
+            del data
+
+    extract_timings = []
+    start = timeit.default_timer()
+    if jobs == 1:
+        outcomes = []
+        for n, data in extracted():
+            outcomes.append(_run_scan_task(n, fish_keys, data))
+            del data
+    else:
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs or len(SCAN_TASKS),
+                                                    initializer=_init_scan_worker,
+                                                    initargs=(tqdm.get_lock(),)) as executor:
+            # Submitting as we go means the workers start on the first task
+            # while the later ones are still being extracted. The executor
+            # holds on to a task's arguments until it's finished, so only
+            # the (much smaller) pickled rows are kept, not the rows.
+            futures = []
+            for n, data in extracted():
+                payload = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+                del data
+                futures.append(executor.submit(_run_pickled_scan_task, n, fish_keys, payload))
+            outcomes = [future.result() for future in futures]
+    elapsed = timeit.default_timer() - start
+
+    # Merge in task order, so the result doesn't depend on which finished first.
+    for task, (results, _) in zip(SCAN_TASKS, outcomes):
+        _merge_scan_results(task, results)
+
+    logging.info('Extracting sheet data took %.3fs (%s)', sum(extract_timings),
+                 ', '.join('%s %.3fs' % (task.name, task_elapsed)
+                           for task, task_elapsed in zip(SCAN_TASKS, extract_timings)))
+    logging.info('Scan tasks took %.3fs, including extraction (%s)', elapsed,
+                 ', '.join('%s %.3fs' % (task.name, task_elapsed)
+                           for task, (_, task_elapsed) in zip(SCAN_TASKS, outcomes)))
 
 
 def is_important_fish(fish):
     # Always include BIG FISH!
-    if fish.item.rarity >= 2:
+    if fish.rarity >= 2:
         return True
 
     # SUPER IMPORTANT FISH
@@ -461,10 +613,6 @@ def is_important_fish(fish):
     return True
 
 
-important_fish = sorted(list(filter(is_important_fish, catchable_fish.values())),
-                        key=lambda x: x.item.key)
-
-
 #######################################################################
 
 import yaml
@@ -501,19 +649,21 @@ def ensure_hour_is_decimal(item):
         h, m = map(int, item['endHour'].split(':'))
         item['endHour'] = h + (m / 60.0)
 
-# Import the OLD data...
-fishes = yaml.load(open("private/fishData.yaml", 'r', encoding='utf-8'), Loader=Loader)
-# Adjust any start/end times expressed as time string instead of decimal.
-for fish in fishes:
-    ensure_hour_is_decimal(fish)
-known_fishes = dict([(fish['name'], fish) for fish in fishes])
+
+def load_known_fishes(yaml_file):
+    # Import the OLD data...
+    with open(yaml_file, 'r', encoding='utf-8') as f:
+        fishes = yaml.load(f, Loader=Loader)
+    # Adjust any start/end times expressed as time string instead of decimal.
+    for fish in fishes:
+        ensure_hour_is_decimal(fish)
+    return dict([(fish['name'], fish) for fish in fishes])
 
 
 def get_spot(spot):
-    if isinstance(spot, SpearfishingNode):
-        if spot.hidden:
-            return spot.gathering_point_base.key
-    return str(spot.place_name.name)
+    if spot.hidden:
+        return spot.key
+    return spot.name
 
 
 def supports_fish_eyes(fish):
@@ -521,10 +671,10 @@ def supports_fish_eyes(fish):
     if fish.spearfishing:
         return False
     # The fish must not be legendary: i.e. not include the phase: "オオヌシ".
-    if "オオヌシ" in fish.item.source_row['Description', Language.japanese]:
+    if fish.legendary:
         return False
     # As of 7.0, Fish Eyes only works on fish in areas prior to Endwalker.
-    if fish.expansion.key >= 4:
+    if fish.expansion >= 4:
         return False
 
     # While technically any other fish does support Fish Eyes, only fish with
@@ -536,10 +686,7 @@ def supports_fish_eyes(fish):
 
 def is_big_fish(fish):
     # The fish must include ヌシ in its description
-    if "ヌシ" in fish.item.source_row['Description', Language.japanese]:
-        return True
-
-    return False
+    return fish.big_fish
 
 
 def _flatten_lite(l):
@@ -547,154 +694,169 @@ def _flatten_lite(l):
 
 
 new_fishes = {}
-for fish in tracked_iter(important_fish,
-                         'Generating new fish database'):
-    folklore = False
-    if fish.params is not None:
-        folklore = fish.params['GatheringSubCategory']
-        folklore = False if folklore is None else str(folklore)
-
-    new_fishes[fish.item.key] = {
-        'name': str(fish.item.name),
-        'dataMissing': True,
-        'start': 0,
-        'end': 24,
-        'prevWeather': None,
-        'weather': None,
-        'bait': None,
-        'intuition': None,
-        'intuitionLength': None,
-        'hookset': None,
-        'tug': None,
-        'snagging': None,
-        'lure': None,
-        'gig': None,
-        'patch': None,
-        'computed': {
-            'locations': [get_spot(spot) for spot in fish.spots],
-            # 'timeRestricted': fish.params.time_restricted if fish.params is not None else False,
-            # 'weatherRestricted': fish.params.weather_restricted if fish.params is not None else False,
-            'folklore': folklore,
-            'spearfishing': fish.spearfishing,
-            'bigfish': fish.item.rarity >= 2,
-            'quest': len(fish.quest) > 0,
-            # 'shop': len(fish.shop) > 0,
-            'satisfaction': fish.satisfaction['Collectability{High}'] if fish.satisfaction else None,
-            'craft': len(fish.craft) > 0,
-            'gc': fish.gc is not None,
-            'leve': len(fish.leve) > 0,
-            'scrip': fish.scrip['CollectablesShopRefine']['LowCollectability'] if fish.scrip else None,
-            'reduce': fish.reduce,
-            'aquarium': fish.aquarium is not None,
-            'fishEyes': supports_fish_eyes(fish),
-            'bigFish': is_big_fish(fish)
+
+
+def merge_known_data(important_fish, known_fishes):
+    global new_fishes
+    new_fishes = {}
+    for fish in tracked_iter(important_fish,
+                             'Generating new fish database'):
+        folklore = fish.folklore[1] if fish.folklore is not None else False
+
+        new_fishes[fish.key] = {
+            'name': fish.name,
+            'dataMissing': True,
+            'start': 0,
+            'end': 24,
+            'prevWeather': None,
+            'weather': None,
+            'bait': None,
+            'intuition': None,
+            'intuitionLength': None,
+            'hookset': None,
+            'tug': None,
+            'snagging': None,
+            'lure': None,
+            'gig': None,
+            'patch': None,
+            'computed': {
+                'locations': [get_spot(spot) for spot in fish.spots],
+                # 'timeRestricted': fish.params.time_restricted if fish.params is not None else False,
+                # 'weatherRestricted': fish.params.weather_restricted if fish.params is not None else False,
+                'folklore': folklore,
+                'spearfishing': fish.spearfishing,
+                'bigfish': fish.rarity >= 2,
+                'quest': len(fish.quest) > 0,
+                # 'shop': len(fish.shop) > 0,
+                'satisfaction': fish.satisfaction,
+                'craft': len(fish.craft) > 0,
+                'gc': fish.gc is not None,
+                'leve': len(fish.leve) > 0,
+                'scrip': fish.scrip,
+                'reduce': fish.reduce,
+                'aquarium': fish.aquarium is not None,
+                'fishEyes': supports_fish_eyes(fish),
+                'bigFish': is_big_fish(fish)
+            }
         }
-    }
-
-    if str(fish.item.name) in known_fishes:
-        known_fish = known_fishes[str(fish.item.name)]
-        del new_fishes[fish.item.key]['dataMissing']
-        try:
-            new_fishes[fish.item.key].update({
-                'start': known_fish.get('startHour', 0),
-                'end': known_fish.get('endHour', 24),
-                'prevWeather': known_fish.get('previousWeatherSet', []),
-                'weather': known_fish.get('weatherSet', []),
-                'bait': _flatten_lite((known_fish.get('bestCatchPath', []) or [])[-1:]),
-                'intuition': known_fish.get('predators', None),
-                'intuitionLength': known_fish.get('intuitionLength', None),
-                'hookset': known_fish.get('hookset', None),
-                'tug': known_fish.get('tug', None),
-                'snagging': known_fish.get('snagging', None),
-                'lure': known_fish.get('lure', None),
-                'gig': known_fish.get('gig', None),
-                'patch': known_fish.get('patch', None)
-            })
-        except Exception:
-            print("ERROR: While processing %s" % fish.item.name)
-            import pprint
-            pprint.pprint(known_fish)
-            raise
-
-
-for fish in tracked_iter(new_fishes.values(),
-                         'Integrity Checking'):
-    errors = []
-
-    # # Check if time restricted.
-    # if fish['computed']['timeRestricted'] and \
-    #         fish['start'] == 0 and fish['end'] == 24:
-    #     errors += ['should be time restricted']
-    # elif not fish['computed']['timeRestricted'] and \
-    #         not (fish['start'] == 0 and fish['end'] == 24):
-    #     errors += ['should not be time restricted']
-
-    # # Check if weather restricted.
-    # if fish['computed']['weatherRestricted'] and \
-    #         len(fish['prevWeather'] or []) == 0 and \
-    #         len(fish['weather'] or []) == 0:
-    #     errors += ['should be weather restricted']
-    # elif not fish['computed']['weatherRestricted'] and \
-    #         (len(fish['weather'] or []) != 0 or \
-    #          len(fish['prevWeather'] or []) != 0):
-    #     errors += ['should not be weather restricted']
-
-    if len(errors) > 0:
-        if 'dataMissing' in fish and fish['dataMissing']:
-            errors += ['data missing for limited-time fish']
-        fish['integrityErrors'] = errors
-
-
-def _get_item_lookup_dict_entries():
+
+        if fish.name in known_fishes:
+            known_fish = known_fishes[fish.name]
+            del new_fishes[fish.key]['dataMissing']
+            try:
+                new_fishes[fish.key].update({
+                    'start': known_fish.get('startHour', 0),
+                    'end': known_fish.get('endHour', 24),
+                    'prevWeather': known_fish.get('previousWeatherSet', []),
+                    'weather': known_fish.get('weatherSet', []),
+                    'bait': _flatten_lite((known_fish.get('bestCatchPath', []) or [])[-1:]),
+                    'intuition': known_fish.get('predators', None),
+                    'intuitionLength': known_fish.get('intuitionLength', None),
+                    'hookset': known_fish.get('hookset', None),
+                    'tug': known_fish.get('tug', None),
+                    'snagging': known_fish.get('snagging', None),
+                    'lure': known_fish.get('lure', None),
+                    'gig': known_fish.get('gig', None),
+                    'patch': known_fish.get('patch', None)
+                })
+            except Exception:
+                logging.exception("Failed to process %s: %r", fish.name, known_fish)
+                raise
+
+    for fish in tracked_iter(new_fishes.values(),
+                             'Integrity Checking'):
+        errors = []
+
+        # # Check if time restricted.
+        # if fish['computed']['timeRestricted'] and \
+        #         fish['start'] == 0 and fish['end'] == 24:
+        #     errors += ['should be time restricted']
+        # elif not fish['computed']['timeRestricted'] and \
+        #         not (fish['start'] == 0 and fish['end'] == 24):
+        #     errors += ['should not be time restricted']
+
+        # # Check if weather restricted.
+        # if fish['computed']['weatherRestricted'] and \
+        #         len(fish['prevWeather'] or []) == 0 and \
+        #         len(fish['weather'] or []) == 0:
+        #     errors += ['should be weather restricted']
+        # elif not fish['computed']['weatherRestricted'] and \
+        #         (len(fish['weather'] or []) != 0 or \
+        #          len(fish['prevWeather'] or []) != 0):
+        #     errors += ['should not be weather restricted']
+
+        if len(errors) > 0:
+            if 'dataMissing' in fish and fish['dataMissing']:
+                errors += ['data missing for limited-time fish']
+            fish['integrityErrors'] = errors
+
+    return new_fishes
+
+
+def _get_item_lookup_entries():
     # Collect all of the fish and tackle names.
     fish_and_tackle_names = list(set(filter(None, reduce(
         add, [[fish['name']] +
               list((fish.get('intuition', {}) or {}).keys()) +
               (_flatten_lite(fish['bait'] or []))
               for fish in new_fishes.values()], []))))
-    # Match these with records in the Item sheet.
+    # Match these with records in the Item sheet. Formatting differences are
+    # tolerated here, and reported when the names are looked up.
+    matcher = NameMatcher(fish_and_tackle_names)
     for item in tracked_iter(realm.game_data.get_sheet(Item),
                              'Getting fish and tackle entries'):
-        if item.name not in fish_and_tackle_names:
-            continue
-        yield (item.name, item.key)
+        if matcher.match(item.name) is not None:
+            yield item
+    matcher.log_stats('Item name')
+
+
+WEATHER = {}
+ITEM = {}
+ITEM_NAMES = NameIndex()
 
 
-WEATHER = dict([(x.name, x.key) for x in realm.game_data.get_sheet(Weather)])
-ITEM = dict(_get_item_lookup_dict_entries())
+def build_lookups():
+    global WEATHER, ITEM, ITEM_NAMES
+    WEATHER = dict([(x.name, x.key) for x in realm.game_data.get_sheet(Weather)])
+    items = list(_get_item_lookup_entries())
+    ITEM = dict([(str(item.name), item.key) for item in items])
+    ITEM_NAMES = NameIndex()
+    # Display names go in first, so they win over any clashing sentence form.
+    for item in items:
+        ITEM_NAMES.add(item.name, item.key)
+    for item in items:
+        ITEM_NAMES.add(_item_sentence_name(item), item.key)
 
 
-with open("private/fishDataNew.yaml", 'w', encoding='utf-8') as f:
-    # Make things prettier...
-    def represent_none(self, _):
-        return self.represent_scalar('tag:yaml.org,2002:null', '')
+def write_new_yaml(path):
+    with open(path, 'w', encoding='utf-8') as f:
+        # Make things prettier...
+        def represent_none(self, _):
+            return self.represent_scalar('tag:yaml.org,2002:null', '')
 
-    def transformed_fish_pair(fish):
-        fish_entry = dict(fish)
-        del fish_entry['name']
-        # del fish_entry['computed']
-        return fish['name'], fish_entry
+        def transformed_fish_pair(fish):
+            fish_entry = dict(fish)
+            del fish_entry['name']
+            # del fish_entry['computed']
+            return fish['name'], fish_entry
 
-    Dumper.add_representer(type(None), represent_none)
-    yaml.dump(dict([transformed_fish_pair(fish) for fish in new_fishes.values()]),
-              f, Dumper=Dumper, default_flow_style=False, sort_keys=False,
-              allow_unicode=True, encoding='utf-8')
-    # f.write('---\n')
-    # f.writelines(['%s\n' % str(fish['name']) for fish in list(new_fishes.values())])
+        Dumper.add_representer(type(None), represent_none)
+        yaml.dump(dict([transformed_fish_pair(fish) for fish in new_fishes.values()]),
+                  f, Dumper=Dumper, default_flow_style=False, sort_keys=False,
+                  allow_unicode=True, encoding='utf-8')
+        # f.write('---\n')
+        # f.writelines(['%s\n' % str(fish['name']) for fish in list(new_fishes.values())])
 
 
 def _lookup_item_by_name_fuzzy(name):
     # Why you do this SE? Mahi-mahi =_= Also fish with an extra space at the end?!
-    result = ITEM.get(name, None)
-    if result is None:
-        result = next(filter(lambda x: x.strip().lower() == name.lower(), ITEM), None)
-        if result is not None:
-            logging.warning('The formatting of "%s" has changed in the DATs to: "%s"',
-                            name, result)
-        else:
-            result = ITEM[result]
-    if result is None:
-        raise KeyError(name)
+    # Raises NameNotFoundError, with suggestions, for real misspellings.
+    result, tier = ITEM_NAMES.find(name)
+    if tier is None:
+        return ITEM_NAMES.lookup(name)
+    if tier != 'exact':
+        logging.warning('The formatting of "%s" has changed in the DATs to: "%s"',
+                        name, ITEM_NAMES.name_of(result))
     return result
 
 
@@ -706,7 +868,7 @@ def convert_fish_to_json(fish: Fish):
 
     try:
         # Get the new database entry for this fish. (it better exist!)
-        db_entry = new_fishes[fish.item.key]
+        db_entry = new_fishes[fish.key]
 
         weather_keys = list(sorted([WEATHER[x] for x in (db_entry['weather'] or [])]))
         prev_weather_keys = list(sorted([WEATHER[x] for x in (db_entry['prevWeather'] or [])]))
@@ -717,25 +879,10 @@ def convert_fish_to_json(fish: Fish):
         if db_entry.get('intuition') is not None:
             intuition_entries = list([(_lookup_item_by_name_fuzzy(x[0]), x[1]) for x in db_entry['intuition'].items()])
 
-        def get_location_key(spot):
-            if isinstance(spot, SpearfishingNode):
-                if spot.hidden:
-                    return spot.gathering_point_base.key
-            return spot.key
-
-        aquarium_entry = None
-        if fish.aquarium is not None:
-            aquarium_entry = {'water': str(fish.aquarium['AquariumWater']),
-                              'size': int(fish.aquarium['Size'])}
-
-        folklore_key = False
-        if fish.params is not None:
-            folklore = fish.params['GatheringSubCategory']
-            if folklore is not None:
-                folklore_key = folklore.key
+        folklore_key = fish.folklore[0] if fish.folklore is not None else False
 
         json_entry = {
-            '_id': fish.item.key,
+            '_id': fish.key,
             # Information sourced via players
             'dataMissing': db_entry.get('dataMissing', False),
             'prevWeather': prev_weather_keys,
@@ -751,68 +898,35 @@ def convert_fish_to_json(fish: Fish):
             'lure': db_entry['lure'],
             'patch': db_entry['patch'],
             # Information sourced via DATs
-            'location': [get_location_key(x) for x in fish.spots],
+            'location': [spot.key for spot in fish.spots],
             # 'timeRestricted': fish.params.time_restricted if fish.params is not None else False,
             # 'weatherRestricted': fish.params.weather_restricted if fish.params is not None else False,
             'folklore': folklore_key,
             'spearfishing': fish.spearfishing,
-            'bigfish': fish.item.rarity >= 2,
+            'bigfish': fish.rarity >= 2,
             'quest': len(fish.quest) > 0,
             # 'shop': len(fish.shop) > 0,
-            'satisfaction': fish.satisfaction['Collectability{High}'] if fish.satisfaction else None,
+            'satisfaction': fish.satisfaction,
             'craft': len(fish.craft) > 0,
             'gc': fish.gc is not None,
             'leve': len(fish.leve) > 0,
-            'scrip': fish.scrip['CollectablesShopRefine']['LowCollectability'] if fish.scrip else None,
+            'scrip': fish.scrip,
             'reduce': fish.reduce,
-            'aquarium': aquarium_entry,
+            'aquarium': fish.aquarium,
             'fishEyes': supports_fish_eyes(fish),
             'bigFish': is_big_fish(fish)
         }
 
-        return fish.item.key, json_entry
+        return fish.key, json_entry
 
     except Exception:
-        print("ERROR: While processing %s" % fish.item.name)
-        import pprint
-        pprint.pprint(db_entry)
+        logging.exception("Failed to process %s: %r", fish.name, new_fishes.get(fish.key))
         raise
 
 
-def _make_localized_field(fld_name, row, col_name):
-    from pysaintcoinach.ex import IMultiRow
-    from pysaintcoinach.xiv import IXivRow
-
-    if isinstance(row, IXivRow):
-        row = row.source_row
-    if not isinstance(row, IMultiRow):
-        raise TypeError('Expected row to be a IMultiRow')
-
-    def try_get_value(row, col_name, lang):
-        try:
-            value = row[(col_name, lang)]
-            if value != '':
-                return value
-            # Fall through if value is blank!
-        except KeyError:
-            pass
-
-        # Use the default language name instead...
-        value = row[col_name]
-        # logging.warning("Missing %s data for %s[%u][%s], using \"%s\" instead.",
-        #                 lang.name,
-        #                 row.sheet.name,
-        #                 row.key,
-        #                 col_name,
-        #                 value)
-        return value
-
-    return map(lambda lang: (fld_name + lang.get_suffix(), try_get_value(row, col_name, lang)), LANGUAGES)
-
-
-def _make_static_localized_field(fld_name, value):
-    return zip([fld_name + lang.get_suffix() for lang in LANGUAGES],
-               repeat(value, len(LANGUAGES)))
+def _localize_column(sheet_name, col_name, keys, fld_name='name'):
+    return extract_localized_column(realm.game_data.get_sheet(sheet_name), col_name, keys,
+                                    fld_name, LANGUAGES)
 
 
 def __build_supporting_json_tables(_iter: Iterable[Fish]):
@@ -825,79 +939,111 @@ def __build_supporting_json_tables(_iter: Iterable[Fish]):
     weather_types = {}
     folklore_books = {}
 
-    # The ITEMS table is generated from the fish and tackle data (ITEMS).
-    for item_id in tracked_iter(ITEM.values(), 'Generating ITEMS data table'):
-        item_entry = realm.game_data.get_sheet(Item)[item_id]
-        items[item_id] = dict([
-            ('_id', item_id),
-            *_make_localized_field('name', item_entry, 'Name'),
-            ('icon', '%06u' % item_entry.get_raw('Icon'))])
-
     # The rest is based on which fish we actually have.
     # Technically, we should still generate the territory list for everything,
     # but screw that, only what we actually need is fine...
+    # Rows are collected first, then all of the names are localized in bulk.
+    # The fish only keep keys, so the rows are looked up once per key here.
+    spearfishing_spots = {}
+    fishing_spots = {}
+    territory_rows = {}
+    weather_rows = {}
+    folklore_rows = {}
     for fish in tracked_iter(_iter, 'Generating necessary lookup tables'):
         territories_to_add = set()
         if fish.spearfishing:
-            def _decode_spearfishing_node_name(x):
-                if x.hidden:
-                    return _make_static_localized_field('name', 'Swimming Shadows')
-                else:
-                    return _make_localized_field('name', x.place_name, 'Name')
             for spot in fish.spots:
-                if spot.gathering_point_base.key not in spearfishing_nodes:
-                    spearfishing_nodes[spot.gathering_point_base.key] = dict([
-                        ('_id', spot.gathering_point_base.key),
-                        *_decode_spearfishing_node_name(spot),
-                        ('territory_id', spot.territory_type.key),
-                        ('placename_id', spot.place_name.key),
-                        ('hidden', spot.hidden)])
-                    territories_to_add.add(spot.territory_type)
+                if spot.key not in spearfishing_spots:
+                    spearfishing_spots[spot.key] = spot
+                    territories_to_add.add(spot.territory)
         else:
             for spot in fish.spots:
-                if spot.key not in fishing_nodes:
-                    fishing_nodes[spot.key] = dict([
-                        ('_id', spot.key),
-                        *_make_localized_field('name', spot.place_name, 'Name'),
-                        ('territory_id', spot.get_raw('TerritoryType')),
-                        ('placename_id', spot.place_name.key),
-                        ('map_coords', [spot.map_x, spot.map_y, spot.radius])])
-                    territories_to_add.add(spot.territory_type)
-
-        for territory in territories_to_add:
-            if territory is not None and territory.key not in territories:
-                def _collect_weather_rates(rate):
-                    return [(r[1].key, r[0]) for r in rate.weather_rates if r[1].key != 0]
-
-                territories[territory.key] = dict({
-                    '_id': territory.key,
-                    'map_id': territory.map.key,
-                    'map_scale': territory.map.size_factor,
-                    'zone_id': territory.place_name.key,
-                    'region_id': territory.region_place_name.key,
-                    'weather_rates': _collect_weather_rates(territory.weather_rate)})
-
-                # Add entries for this territory's region and zone as well.
-                if territory.place_name.key not in zones:
-                    zones[territory.place_name.key] = dict(
-                        _make_localized_field('name', territory.place_name, 'Name'))
-                if territory.region_place_name.key not in regions:
-                    regions[territory.region_place_name.key] = dict(
-                        _make_localized_field('name', territory.region_place_name, 'Name'))
-
+                if spot.key not in fishing_spots:
+                    fishing_spots[spot.key] = realm.game_data.get_sheet(FishingSpot)[spot.key]
+                    territories_to_add.add(spot.territory)
+
+        for territory_key in territories_to_add:
+            if territory_key is not None and territory_key not in territory_rows:
+                territory = realm.game_data.get_sheet('TerritoryType')[territory_key]
+                territory_rows[territory_key] = territory
                 # Add any new unique weather types to the table.
                 for weather in territory.weather_rate.possible_weathers:
-                    if weather.key != 0 and weather.key not in weather_types:
-                        weather_types[weather.key] = dict([
-                            *_make_localized_field('name', weather, 'Name'),
-                            ('icon', '%06u' % weather.get_raw('Icon'))])
-
-        if fish.params is not None:
-            folklore = fish.params['GatheringSubCategory']
-            if folklore is not None and folklore.key not in folklore_books:
-                folklore_books[folklore.key] = dict([
-                    *_make_localized_field('book', folklore, 'FolkloreBook'),
-                    *_make_localized_field('name', folklore['Item'], 'Name')])
+                    if weather.key != 0 and weather.key not in weather_rows:
+                        weather_rows[weather.key] = weather
+
+        if fish.folklore is not None and fish.folklore[0] not in folklore_rows:
+            folklore_rows[fish.folklore[0]] = \
+                realm.game_data.get_sheet('GatheringSubCategory')[fish.folklore[0]]
+
+    item_names = _localize_column('Item', 'Name', [
+        *ITEM.values(),
+        *[folklore.get_raw('Item') for folklore in folklore_rows.values()]])
+    place_names = _localize_column('PlaceName', 'Name', [
+        *[spot.place_name for spot in spearfishing_spots.values() if not spot.hidden],
+        *[spot.place_name.key for spot in fishing_spots.values()],
+        *[territory.place_name.key for territory in territory_rows.values()],
+        *[territory.region_place_name.key for territory in territory_rows.values()]])
+    weather_names = _localize_column('Weather', 'Name', weather_rows.keys())
+    folklore_names = _localize_column('GatheringSubCategory', 'FolkloreBook',
+                                      folklore_rows.keys(), 'book')
+
+    # The ITEMS table is generated from the fish and tackle data (ITEMS).
+    for item_id in tracked_iter(ITEM.values(), 'Generating ITEMS data table'):
+        item_entry = realm.game_data.get_sheet(Item)[item_id]
+        items[item_id] = dict([
+            ('_id', item_id),
+            *item_names[item_id].items(),
+            ('icon', '%06u' % item_entry.get_raw('Icon'))])
+
+    def _decode_spearfishing_node_name(x):
+        if x.hidden:
+            return make_static_localized_field('name', 'Swimming Shadows', LANGUAGES)
+        else:
+            return place_names[x.place_name].items()
+
+    for key, spot in spearfishing_spots.items():
+        spearfishing_nodes[key] = dict([
+            ('_id', key),
+            *_decode_spearfishing_node_name(spot),
+            ('territory_id', spot.territory),
+            ('placename_id', spot.place_name),
+            ('hidden', spot.hidden)])
+
+    for key, spot in fishing_spots.items():
+        fishing_nodes[key] = dict([
+            ('_id', key),
+            *place_names[spot.place_name.key].items(),
+            ('territory_id', spot.get_raw('TerritoryType')),
+            ('placename_id', spot.place_name.key),
+            ('map_coords', [spot.map_x, spot.map_y, spot.radius])])
+
+    def _collect_weather_rates(rate):
+        return [(r[1].key, r[0]) for r in rate.weather_rates if r[1].key != 0]
+
+    for key, territory in territory_rows.items():
+        territories[key] = dict({
+            '_id': key,
+            'map_id': territory.map.key,
+            'map_scale': territory.map.size_factor,
+            'zone_id': territory.place_name.key,
+            'region_id': territory.region_place_name.key,
+            'weather_rates': _collect_weather_rates(territory.weather_rate)})
+
+        # Add entries for this territory's region and zone as well.
+        if territory.place_name.key not in zones:
+            zones[territory.place_name.key] = dict(place_names[territory.place_name.key])
+        if territory.region_place_name.key not in regions:
+            regions[territory.region_place_name.key] = dict(place_names[territory.region_place_name.key])
+
+    for key, weather in weather_rows.items():
+        weather_types[key] = dict([
+            *weather_names[key].items(),
+            ('icon', '%06u' % weather.get_raw('Icon'))])
+
+    for key, folklore in folklore_rows.items():
+        folklore_books[key] = dict([
+            *folklore_names[key].items(),
+            *item_names[folklore.get_raw('Item')].items()])
 
     return {'items': dict(sorted(items.items(), key=itemgetter(0))),
             'fishing_nodes': dict(sorted(fishing_nodes.items(), key=itemgetter(0))),
@@ -909,34 +1055,297 @@ def __build_supporting_json_tables(_iter: Iterable[Fish]):
             'weather_types': dict(sorted(weather_types.items(), key=itemgetter(0)))}
 
 
-def pretty_dump(obj):
-    return json.dumps(obj, sort_keys=False, indent=2, ensure_ascii=False).replace('\n', '\n  ')
-
-
-with open("private/new_data.js", 'w', encoding='utf-8') as f:
+def write_new_data_js(important_fish, path):
     # Output everything in JavaScript format, using IDs to support localization.
-    import json
     import datetime
 
     support_tables = __build_supporting_json_tables(important_fish)
 
-    f.write('const DATA = {\n')
-    f.write('  FISH: %s,\n' % pretty_dump(dict(map(convert_fish_to_json,
-                                                   tracked_iter(important_fish,
-                                                                'Converting fish')))))
-    f.write('  FISHING_SPOTS: %s,\n' % pretty_dump(support_tables['fishing_nodes']))
-    f.write('  SPEARFISHING_SPOTS: %s,\n' % pretty_dump(support_tables['spearfishing_nodes']))
-    f.write('  ITEMS: %s,\n' % pretty_dump(support_tables['items']))
-    f.write('  TERRITORIES: %s,\n' % pretty_dump(support_tables['territories']))
-    f.write('  WEATHER_TYPES: %s,\n' % pretty_dump(support_tables['weather_types']))
-    f.write('  REGIONS: %s,\n' % pretty_dump(support_tables['regions']))
-    f.write('  ZONES: %s,\n' % pretty_dump(support_tables['zones']))
-    f.write('  FOLKLORE: %s,\n' % pretty_dump(support_tables['folklore_books']))
+    write_js_tables(path, 'DATA', [
+        ('FISH', dict(map(convert_fish_to_json,
+                          tracked_iter(important_fish, 'Converting fish')))),
+        ('FISHING_SPOTS', support_tables['fishing_nodes']),
+        ('SPEARFISHING_SPOTS', support_tables['spearfishing_nodes']),
+        ('ITEMS', support_tables['items']),
+        ('TERRITORIES', support_tables['territories']),
+        ('WEATHER_TYPES', support_tables['weather_types']),
+        ('REGIONS', support_tables['regions']),
+        ('ZONES', support_tables['zones']),
+        ('FOLKLORE', support_tables['folklore_books']),
+        ('VERSION', datetime.datetime.now().strftime('%Y.%m.%d.%H.%M'))],
+        layout=PRETTY, terminator='};')
+
+
+#######################################################################
+# Checkpoints
+#
+# Each stage's result is stored as plain data. Rows from ordinary sheets are
+# stored by key, and looked up again when the checkpoint is loaded.
+
+CHECKPOINT_FORMAT = 2
+
+
+def fish_to_plain(fish: Fish):
+    return OrderedDict([
+        ('item', fish.key),
+        ('name', fish.name),
+        ('rarity', fish.rarity),
+        ('reduce', fish.reduce),
+        ('legendary', fish.legendary),
+        ('bigFish', fish.big_fish),
+        ('spearfishing', fish.spearfishing),
+        ('spots', [list(spot) for spot in fish.spots]),
+        ('expansion', fish.expansion),
+        ('folklore', list(fish.folklore) if fish.folklore is not None else None),
+        ('quest', [list(quest) for quest in fish.quest]),
+        ('scrip', fish.scrip),
+        ('satisfaction', fish.satisfaction),
+        ('gc', [fish.gc.count, fish.gc.exp, fish.gc.seals] if fish.gc is not None else None),
+        ('leve', fish.leve),
+        ('craft', fish.craft),
+        ('aquarium', fish.aquarium),
+        ('ecology', fish.ecology)])
+
+
+def fish_from_plain(value) -> Fish:
+    fish = Fish(value['item'], value['name'],
+                rarity=value['rarity'],
+                reduce=value['reduce'],
+                legendary=value['legendary'],
+                big_fish=value['bigFish'],
+                spearfishing=value['spearfishing'],
+                spots=[Spot(*spot) for spot in value['spots']],
+                expansion=value['expansion'])
+    fish.folklore = tuple(value['folklore']) if value['folklore'] is not None else None
+    fish.quest = [tuple(quest) for quest in value['quest']]
+    fish.scrip = value['scrip']
+    fish.satisfaction = value['satisfaction']
+    fish.gc = GCSupplyDutyTurnin(*value['gc']) if value['gc'] is not None else None
+    fish.leve = value['leve']
+    fish.craft = value['craft']
+    fish.aquarium = value['aquarium']
+    fish.ecology = value['ecology']
+    return fish
+
+
+def _load_fishes(records):
+    return dict((record['item'], fish_from_plain(record))
+                for record in tracked_iter(records, 'Loading fish from checkpoint'))
+
+
+# The helper modules (in this directory) the output depends on. A change to
+# any of them invalidates the checkpoints, the same as a change to this script.
+_HELPER_MODULES = (
+    'build_cache',
+    'localized_fields',
+    'js_data',
+    'sheet_index',
+    'name_index',
+    'extracted_sheet_plugin')
+
+
+def _checkpoint_path(args, name):
+    return os.path.join(args.checkpoint_dir, '%s.json' % name)
+
+
+def _load_checkpoint(args, name):
+    path = _checkpoint_path(args, name)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        checkpoint = json.load(f, object_pairs_hook=OrderedDict)
+    if checkpoint.get('format') != CHECKPOINT_FORMAT:
+        return None
+    return checkpoint
+
+
+def _save_checkpoint(args, name, inputs, data, outputs):
+    os.makedirs(args.checkpoint_dir, exist_ok=True)
+    checkpoint = OrderedDict([('format', CHECKPOINT_FORMAT),
+                              ('inputs', inputs),
+                              ('digest', digest(data)),
+                              ('outputs', OrderedDict((path, file_digest(path)) for path in outputs)),
+                              ('data', data)])
+    # An interrupted write must not leave a truncated checkpoint behind.
+    with atomic_open(_checkpoint_path(args, name)) as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    return checkpoint
+
+
+#######################################################################
+# Stages
+#
+# A stage is given the data of the stages it requires, and returns its own
+# (plain) data, which is checkpointed. It's rerun when its inputs change:
+# the game or this script, the data of the stages it requires, or its own
+# extra inputs. Files it writes (*outputs*) must also be unchanged for its
+# checkpoint to count.
+
+Stage = namedtuple('Stage', 'name func requires inputs outputs')
+
+STAGES = OrderedDict()
+
+
+def pipeline_stage(name, requires=(), inputs=lambda args: [], outputs=lambda args: []):
+    def decorator(func):
+        STAGES[name] = Stage(name, func, requires, inputs, outputs)
+        return func
+    return decorator
+
+
+@pipeline_stage('spots')
+def stage_spots(args):
+    catchable_fish.clear()
+    scan_spots()
+    return [fish_to_plain(fish) for fish in catchable_fish.values()]
+
+
+@pipeline_stage('scanners', requires=('spots',))
+def stage_scanners(args, spots):
+    catchable_fish.clear()
+    catchable_fish.update(_load_fishes(spots))
+    run_scan_tasks(args.jobs)
+    return [fish_to_plain(fish) for fish in catchable_fish.values()]
 
-    f.write('  VERSION: "%s"\n};' % datetime.datetime.now().strftime('%Y.%m.%d.%H.%M'))
 
+@pipeline_stage('filter', requires=('scanners',))
+def stage_filter(args, scanned):
+    fishes = _load_fishes(scanned)
+    important_fish = sorted(filter(is_important_fish, fishes.values()),
+                            key=lambda x: x.key)
+    return [fish_to_plain(fish) for fish in important_fish]
+
+
+@pipeline_stage('yaml', requires=('filter',),
+                inputs=lambda args: [file_digest(args.yaml_file)],
+                outputs=lambda args: [args.yaml_out])
+def stage_yaml(args, important):
+    important_fish = list(_load_fishes(important).values())
+    merge_known_data(important_fish, load_known_fishes(args.yaml_file))
+    write_new_yaml(args.yaml_out)
+    # JSON object keys are always strings, so keep these as pairs.
+    return [[key, fish] for key, fish in new_fishes.items()]
+
+
+@pipeline_stage('json', requires=('filter', 'yaml'),
+                outputs=lambda args: [args.js_file])
+def stage_json(args, important, merged):
+    global new_fishes
+    important_fish = list(_load_fishes(important).values())
+    new_fishes = dict((key, fish) for key, fish in merged)
+    build_lookups()
+    write_new_data_js(important_fish, args.js_file)
+    return None
+
+
+def run_pipeline(args):
+    """
+    Runs the stages in order, reusing every checkpoint that's still valid.
+    `--from-stage` reruns that stage and everything after it; `--only-stage`
+    reruns just that one stage, taking its inputs from the checkpoints.
+    With `--trace-memory`, each stage's peak memory is reported as well;
+    tracemalloc can't see into worker processes, so the scanners run
+    in-process then.
+    """
+    global realm
+    names = list(STAGES)
+    from_index = names.index(args.from_stage) if args.from_stage else len(names)
+    last_index = names.index(args.only_stage) if args.only_stage else len(names) - 1
+    versions = [read_game_version(args.game_path), script_version(__file__, _HELPER_MODULES)]
+
+    results = {}
+    timings = OrderedDict()
+    peaks = OrderedDict()
+    if args.trace_memory:
+        if args.jobs != 1:
+            logging.warning('--trace-memory runs the scanners in-process (ignoring -j %d)', args.jobs)
+            args.jobs = 1
+        tracemalloc.start()
+    for index, name in enumerate(names[:last_index + 1]):
+        stage = STAGES[name]
+        inputs = digest(name, versions, [results[r]['digest'] for r in stage.requires],
+                         stage.inputs(args))
+        outputs = stage.outputs(args)
+        forced = index >= from_index or name == args.only_stage
+
+        checkpoint = None if forced else _load_checkpoint(args, name)
+        if args.only_stage is not None and name != args.only_stage:
+            # Earlier stages only come from their checkpoints.
+            if checkpoint is None:
+                logging.error('No checkpoint for stage "%s"; run it first', name)
+                return False
+            if checkpoint['inputs'] != inputs:
+                logging.warning('Checkpoint for stage "%s" is stale; using it anyway', name)
+        elif checkpoint is not None and checkpoint['inputs'] != inputs:
+            logging.info('Stage "%s" is out of date', name)
+            checkpoint = None
+        elif checkpoint is not None and any(checkpoint['outputs'].get(path) != file_digest(path)
+                                            for path in outputs):
+            logging.info('Output of stage "%s" changed', name)
+            checkpoint = None
+
+        if checkpoint is None:
+            if realm is None:
+                realm = _init_saintcoinach(args.game_path)
+            start = timeit.default_timer()
+            if args.trace_memory:
+                tracemalloc.reset_peak()
+            data = stage.func(args, *[results[r]['data'] for r in stage.requires])
+            if args.trace_memory:
+                peaks[name] = tracemalloc.get_traced_memory()[1]
+            checkpoint = _save_checkpoint(args, name, inputs, data, outputs)
+            timings[name] = timeit.default_timer() - start
+        else:
+            logging.info('Using checkpoint for stage "%s"', name)
+        results[name] = checkpoint
+
+    logging.info('Ran %u stage(s): %s', len(timings),
+                 ', '.join('%s %.3fs' % (name, elapsed) for name, elapsed in timings.items()) or 'none')
+    if args.trace_memory:
+        tracemalloc.stop()
+        logging.info('Peak memory: %s',
+                     ', '.join('%s %.1f MiB' % (name, peak / (1024 * 1024))
+                               for name, peak in peaks.items()) or 'none')
+    return True
 
-_finish_time = timeit.default_timer()
 
-from datetime import timedelta
-print("Total Time: %s" % timedelta(seconds=_finish_time - _start_time))
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Dumps every catchable fish from the DATs')
+    parser.add_argument('--game_path', '-gpath', type=str,
+                        default=DEFAULT_GAME_PATH,
+                        dest='game_path',
+                        help='Path to FF14 installation')
+    parser.add_argument('-i', '--in', type=str,
+                        default=os.path.join(_SCRIPT_PATH, 'fishData.yaml'),
+                        dest='yaml_file',
+                        help='Path to current fish data YAML file')
+    parser.add_argument('--yaml-out', type=str,
+                        default=os.path.join(_SCRIPT_PATH, 'fishDataNew.yaml'),
+                        dest='yaml_out',
+                        help='Where to store the merged fish data (YAML)')
+    parser.add_argument('-o', '--out', type=str,
+                        default=os.path.join(_SCRIPT_PATH, 'new_data.js'),
+                        dest='js_file',
+                        help='Where to store Java Script data')
+    parser.add_argument('--checkpoints', type=str,
+                        default=os.path.join(_SCRIPT_PATH, '.dump_checkpoints'),
+                        dest='checkpoint_dir',
+                        help='Where to store the output of each stage')
+    parser.add_argument('-j', '--jobs', type=int, default=0,
+                        help='Number of processes for the scanners (default: one per scanner; 1 to disable)')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Report the peak memory of each stage (implies -j 1; slows things down)')
+    stage_group = parser.add_mutually_exclusive_group()
+    stage_group.add_argument('--from-stage', type=str, choices=list(STAGES), default=None,
+                             help='Rerun this stage and every stage after it')
+    stage_group.add_argument('--only-stage', type=str, choices=list(STAGES), default=None,
+                             help='Rerun only this stage, using the checkpoints of earlier stages')
+    args = parser.parse_args()
+
+    ok = run_pipeline(args)
+
+    _finish_time = timeit.default_timer()
+
+    from datetime import timedelta
+    print("Total Time: %s" % timedelta(seconds=_finish_time - _start_time))
+    sys.exit(0 if ok else 1)
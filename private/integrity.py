@@ -0,0 +1,349 @@
+"""
+Data integrity rules for fishData.yaml.
+
+Each rule is a generator registered with `integrity_rule`. It is given the
+shared `IntegrityContext` and a single fish entry, and yields
+(level, message, args) tuples, which are logged exactly like a
+`logging.log(level, message, *args)` call. Rules only see plain data: the
+YAML entries, plus the facts manageFishData pulls out of the DATs for each
+fish name up front.
+"""
+from collections import OrderedDict, namedtuple
+import hashlib
+import json
+import logging
+import os
+import time
+import timeit
+
+import yaml
+
+REPORT_FORMAT = 1
+
+Rule = namedtuple('Rule', 'name func fails')
+Finding = namedtuple('Finding', 'fish_index rule_index level message args')
+
+RULES = OrderedDict()
+
+
+def integrity_rule(name, fails=True):
+    """
+    Registers a rule. Rules run in registration order. If *fails* is False,
+    the rule's errors are logged but don't fail the check.
+    """
+    def decorator(func):
+        RULES[name] = Rule(name, func, fails)
+        return func
+    return decorator
+
+
+class IntegrityContext(object):
+    """
+    Everything the rules need, indexed up front.
+
+    *dat_facts* maps a fish name to a dict with its `is_hidden`,
+    `time_restricted`, `weather_restricted` and `special_conditions` flags.
+    Fish without both a FishParameter and a FishingNoteInfo entry are left
+    out.
+    """
+
+    def __init__(self, fishes, dat_facts):
+        self.fishes = fishes
+        self.dat_facts = dat_facts
+        self.fish_by_name = {}
+        for fish in fishes:
+            self.fish_by_name.setdefault(fish['name'], fish)
+
+
+def prepare_fish(fish, ensure_hour_is_decimal):
+    fish.setdefault('startHour', 0)
+    fish.setdefault('endHour', 24)
+    fish.setdefault('weatherSet', [])
+    fish.setdefault('previousWeatherSet', [])
+    fish.setdefault('bestCatchPath', [])
+
+    ensure_hour_is_decimal(fish)
+    return fish
+
+
+def mooched_names(fish):
+    """
+    Returns the fish mooched to catch *fish*, closest to it first. The first
+    entry of bestCatchPath is the bait, so it's skipped.
+    """
+    for entry in reversed((fish.get('bestCatchPath') or [])[1:]):
+        if isinstance(entry, list):
+            yield from entry
+        else:
+            yield entry
+
+
+@integrity_rule('mooch-hooksets', fails=False)
+def check_mooch_hooksets(ctx, fish):
+    # Check for hookset definition.
+    # For fish that require mooching, Patience is almost always used. Knowing
+    # which hookset to use is vital, so make sure mooch fish have it defined!
+    if len(fish.get('bestCatchPath') or []) > 1:
+        if fish.get('hookset') is None:
+            yield logging.ERROR, '%s requires mooching and should have a hookset defined', (fish['name'],)
+        for mooched_name in mooched_names(fish):
+            mooched_fish = ctx.fish_by_name.get(mooched_name)
+            if mooched_fish is None:
+                yield logging.ERROR, '%s is missing from database?!', (mooched_name,)
+                continue
+            if mooched_fish.get('hookset') is None:
+                yield (logging.ERROR, '%s is mooched to catch %s and should have a hookset defined',
+                       (mooched_fish['name'], fish['name']))
+
+
+# VERY IMPORTANT NOTE:
+#   The game data very often does not restrict the weather or time for
+#   mooched fish. That is, if a particular fish can only be caught by
+#   mooching a fish with time/weather restrictions, it itself won't
+#   appear to be restricted (according to the DATs).
+#   For the sake of use experience, restrictions have often been copied
+#   over to the target fish. This should be revisted once the UI allows
+#   better display of mooch fish (similar to intuition fish).
+
+# NOTE: As of Patch 6.4, the TimeRestriction and WeatherRestriction fields
+# are no longer reliable. We're not yet sure if these fields even exist
+# anymore in the DATs.
+
+@integrity_rule('time-restriction')
+def check_time_restriction(ctx, fish):
+    facts = ctx.dat_facts.get(fish['name'])
+    if facts is None:
+        return
+    always_up = fish['startHour'] == 0 and fish['endHour'] == 24
+    if facts['time_restricted'] and always_up:
+        yield logging.ERROR, '%s should be time restricted', (fish['name'],)
+    elif not facts['time_restricted'] and not always_up:
+        yield logging.ERROR, '%s should not be time restricted', (fish['name'],)
+
+
+@integrity_rule('weather-restriction')
+def check_weather_restriction(ctx, fish):
+    facts = ctx.dat_facts.get(fish['name'])
+    if facts is None:
+        return
+    has_weather = len(fish['previousWeatherSet'] or []) != 0 or \
+        len(fish['weatherSet'] or []) != 0
+    if facts['weather_restricted'] and not has_weather:
+        yield logging.ERROR, '%s should be weather restricted', (fish['name'],)
+    elif not facts['weather_restricted'] and has_weather:
+        yield logging.ERROR, '%s should not be weather restricted', (fish['name'],)
+
+
+@integrity_rule('special-conditions')
+def check_special_conditions(ctx, fish):
+    facts = ctx.dat_facts.get(fish['name'])
+    if facts is None:
+        return
+    # Check if fish eyes or snagging should be set.
+    # This is not 100% accurate yet. According to crowd-sourced data, even when
+    # this check says Snagging isn't required, the majority of comments say it
+    # is needed. It doesn't help that it also seems to apply to Fish Eyes.
+    # NOTE: I've left the "Fish Eyes" check in there for now. I expect this
+    # table to undergo significant changes in 5.2... Please look forward to it.
+    fish_eyes_needed = fish.get('fishEyes') or False
+    snagging_needed = fish.get('snagging') or False
+    # As of Patch 6.4, the "Rare" field has been deleted. I think it might have been moved to
+    # FishingNoteInfo as "SpecialConditions".
+    if not facts['is_hidden'] and facts['special_conditions']:
+        if fish_eyes_needed is False and snagging_needed is False:
+            yield logging.ERROR, '%s should require Fish Eyes or Snagging', (fish['name'],)
+    elif snagging_needed is not False:
+        yield logging.ERROR, '%s should not require Snagging', (fish['name'],)
+
+
+def _run_rule(rule_index, rule, ctx, indexes):
+    start = timeit.default_timer()
+    findings = []
+    for fish_index in indexes:
+        for level, message, args in rule.func(ctx, ctx.fishes[fish_index]):
+            findings.append(Finding(fish_index, rule_index, level, message, args))
+    return findings, timeit.default_timer() - start
+
+
+class IntegrityResult(object):
+    """
+    The findings of a run, plus how long each rule took. *names* maps the
+    index of every fish checked to its name.
+    """
+
+    def __init__(self, rules, findings, timings, names):
+        self.rules = rules
+        self.findings = findings
+        self.timings = timings
+        self.names = names
+
+    @property
+    def checked(self):
+        return len(self.names)
+
+    @property
+    def passed(self):
+        return not any(self.rules[f.rule_index].fails and f.level >= logging.ERROR
+                       for f in self.findings)
+
+    def log(self):
+        for finding in self.findings:
+            logging.log(finding.level, finding.message, *finding.args)
+        if not self.passed:
+            logging.error('Data integrity check failed...')
+
+    def report(self):
+        rules = []
+        for rule_index, rule in enumerate(self.rules):
+            rules.append(OrderedDict([
+                ('name', rule.name),
+                ('fails', rule.fails),
+                ('seconds', round(self.timings[rule_index], 6)),
+                ('findings', sum(1 for f in self.findings if f.rule_index == rule_index))]))
+        findings = [OrderedDict([('fish', self.names[f.fish_index]),
+                                 ('rule', self.rules[f.rule_index].name),
+                                 ('level', logging.getLevelName(f.level)),
+                                 ('message', f.message % f.args)])
+                    for f in self.findings]
+        return OrderedDict([('format', REPORT_FORMAT),
+                            ('passed', self.passed),
+                            ('checked', self.checked),
+                            ('rules', rules),
+                            ('findings', findings)])
+
+
+def run_rules(ctx, indexes=None, rules=None):
+    """
+    Runs every rule over the fish at *indexes* (default: all of them).
+
+    The rules run one after another in this process, each timed on its own,
+    over every fish. They're cheap enough (a few ms for the whole YAML file)
+    that worker processes would only add their startup cost. Findings are
+    put back in YAML order, then rule order, so the log reads fish by fish.
+    """
+    rules = list((rules or RULES).values())
+    if indexes is None:
+        indexes = range(len(ctx.fishes))
+    indexes = list(indexes)
+
+    results = [_run_rule(rule_index, rule, ctx, indexes) for rule_index, rule in enumerate(rules)]
+
+    # Stable sort, so each rule's findings for a fish keep their order.
+    findings = sorted((f for rule_findings, _ in results for f in rule_findings),
+                      key=lambda f: (f.fish_index, f.rule_index))
+    return IntegrityResult(rules, findings, [elapsed for _, elapsed in results],
+                           OrderedDict((n, ctx.fishes[n]['name']) for n in indexes))
+
+
+def write_report(path, result, extra=None):
+    report = OrderedDict()
+    report.update(extra or {})
+    report.update(result.report())
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logging.info('Wrote integrity report to %s', path)
+
+
+def _entry_digest(fish):
+    return hashlib.sha1(json.dumps(fish, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def entry_digests(fishes):
+    return dict((fish['name'], _entry_digest(fish)) for fish in fishes)
+
+
+def mooch_dependents(fishes):
+    """
+    Maps each fish name to the indexes of the fish that mooch it.
+    """
+    dependents = {}
+    for index, fish in enumerate(fishes):
+        for name in mooched_names(fish):
+            dependents.setdefault(name, set()).add(index)
+    return dependents
+
+
+def affected_indexes(previous_digests, fishes):
+    """
+    Returns the indexes of the fish that need rechecking after an edit: the
+    entries that changed (or were added), plus every fish whose catch path
+    mooches a changed or removed entry.
+    """
+    digests = entry_digests(fishes)
+    changed = set(name for name, digest in digests.items()
+                  if previous_digests.get(name) != digest)
+    changed |= set(previous_digests) - set(digests)
+
+    dependents = mooch_dependents(fishes)
+    affected = set(index for index, fish in enumerate(fishes) if fish['name'] in changed)
+    for name in changed:
+        affected |= dependents.get(name, set())
+    return sorted(affected), digests
+
+
+def document_problem(fishes):
+    """
+    Returns why *fishes* (a freshly loaded YAML document) can't be checked,
+    or None if it's a list of entries that all have a name.
+    """
+    if not isinstance(fishes, list):
+        return 'expected a list of fish, got %s' % type(fishes).__name__
+    for index, fish in enumerate(fishes):
+        if not isinstance(fish, dict):
+            return 'entry %u is not a mapping' % index
+        if fish.get('name') is None:
+            return 'entry %u has no name' % index
+    return None
+
+
+def watch(path, load_fishes, dat_facts, interval=0.5):
+    """
+    Checks *path*, then keeps checking it each time it's saved, until
+    interrupted. *dat_facts* is built once and reused. Only the entries that
+    changed (and the fish that mooch them) are checked again.
+    """
+    fishes = load_fishes(path)
+    result = run_rules(IntegrityContext(fishes, dat_facts))
+    result.log()
+    digests = entry_digests(fishes)
+    mtime = os.stat(path).st_mtime_ns
+
+    logging.info('Watching %s for changes (Ctrl+C to stop)', path)
+    try:
+        while True:
+            time.sleep(interval)
+            try:
+                current_mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                # Some editors replace the file on save; catch it next time.
+                continue
+            if current_mtime == mtime:
+                continue
+            mtime = current_mtime
+
+            start = timeit.default_timer()
+            # The file may be caught mid-edit (truncated, an entry half
+            # written, ...); just wait for the next save.
+            try:
+                fishes = load_fishes(path)
+            except yaml.YAMLError as e:
+                logging.error('Could not parse %s: %s', path, e)
+                continue
+            except Exception as e:
+                logging.error('Could not load %s: %s: %s', path, type(e).__name__, e)
+                continue
+            problem = document_problem(fishes)
+            if problem is not None:
+                logging.error('Skipping %s: %s', path, problem)
+                continue
+            indexes, digests = affected_indexes(digests, fishes)
+            if len(indexes) == 0:
+                logging.info('No fish changed')
+                continue
+            result = run_rules(IntegrityContext(fishes, dat_facts), indexes)
+            result.log()
+            logging.info('Checked %u of %u fish in %.3fs: %s',
+                         result.checked, len(fishes), timeit.default_timer() - start,
+                         'OK' if result.passed else 'FAILED')
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,282 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+
+from localized_fields import split_localized, LANGUAGE_CODES
+
+# Layouts supported by JsDataWriter.
+#  - FOLDABLE: One line per table, wrapped in braces on their own lines (data.js).
+#  - PRETTY: Indented JSON, nested one level deeper than the variable (fish_info_data.js).
+FOLDABLE = 'foldable'
+PRETTY = 'pretty'
+
+
+@contextmanager
+def atomic_open(path, encoding='utf-8', binary=False):
+    """
+    Opens a temporary file next to *path* for writing, and moves it over
+    *path* once the block completes. If anything fails, *path* is left as it
+    was and the temporary file is removed.
+    """
+    path = os.path.abspath(path)
+    mode = os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644
+    fd, temp_path = tempfile.mkstemp(prefix='.%s.' % os.path.basename(path),
+                                     suffix='.tmp',
+                                     dir=os.path.dirname(path))
+    try:
+        with open(fd, 'wb' if binary else 'w', encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class JsDataWriter(object):
+    """
+    Streams JavaScript data files one table entry at a time.
+
+    The output is byte-for-byte what formatting each table as a single
+    `json.dumps` string would produce, without ever holding the whole
+    string in memory.
+    """
+
+    def __init__(self, f, layout=FOLDABLE):
+        if layout not in (FOLDABLE, PRETTY):
+            raise ValueError(layout)
+        self.__f = f
+        self.__layout = layout
+
+    def write_value(self, obj):
+        if self.__layout == FOLDABLE:
+            self.__write_foldable(obj)
+        else:
+            self.__write_pretty(obj)
+
+    def __write_foldable(self, obj):
+        if not isinstance(obj, (dict, list, tuple)):
+            self.__f.write(json.dumps(obj, ensure_ascii=False))
+            return
+
+        if isinstance(obj, dict):
+            # Encode each entry as a single-key object, then drop the braces.
+            # This keeps the key conversion rules identical to json.dumps.
+            opening, closing = '{', '}'
+            entries = (json.dumps({k: v}, ensure_ascii=False)[1:-1] for k, v in obj.items())
+        else:
+            opening, closing = '[', ']'
+            entries = (json.dumps(v, ensure_ascii=False) for v in obj)
+
+        self.__f.write(opening + '\n    ')
+        for n, entry in enumerate(entries):
+            if n != 0:
+                self.__f.write(', ')
+            self.__f.write(entry)
+        self.__f.write('\n  ' + closing)
+
+    def __write_pretty(self, obj):
+        encoder = json.JSONEncoder(indent=2, ensure_ascii=False)
+        for chunk in encoder.iterencode(obj):
+            self.__f.write(chunk.replace('\n', '\n  '))
+
+    def write_tables(self, var_name, tables, terminator='}\n'):
+        """
+        Writes `const <var_name> = {...}` with one property per table.
+        *tables* is a sequence of (name, value) pairs.
+        """
+        tables = list(tables)
+        self.__f.write('const %s = {\n' % var_name)
+        for n, (name, table) in enumerate(tables):
+            self.__f.write('  %s: ' % name)
+            self.write_value(table)
+            self.__f.write(',\n' if n + 1 < len(tables) else '\n')
+        self.__f.write(terminator)
+
+    def write_const(self, var_name, obj):
+        """
+        Writes `const <var_name> = <obj>;`.
+        """
+        self.__f.write('const %s = ' % var_name)
+        self.write_value(obj)
+        self.__f.write(';')
+
+
+def format_js_tables(var_name, tables, layout=FOLDABLE, terminator='}\n'):
+    f = io.StringIO()
+    JsDataWriter(f, layout).write_tables(var_name, tables, terminator)
+    return f.getvalue()
+
+
+def write_js_tables(path, var_name, tables, layout=FOLDABLE, terminator='}\n'):
+    with atomic_open(path) as f:
+        JsDataWriter(f, layout).write_tables(var_name, tables, terminator)
+    logging.info('Wrote %s (%u bytes)', path, os.path.getsize(path))
+
+
+def write_js_const(path, var_name, obj, layout=PRETTY):
+    with atomic_open(path) as f:
+        JsDataWriter(f, layout).write_const(var_name, obj)
+    logging.info('Wrote %s (%u bytes)', path, os.path.getsize(path))
+
+
+
+_CONST_PAT = re.compile(r'^const (\w+) = ')
+_TABLE_NAME_PAT = re.compile(r'^  (\w+): ', re.M)
+
+
+def read_js_data(path):
+    """
+    Reads a file written by `write_js_tables` or `write_js_const` back in.
+
+    Returns a (var_name, value) pair. For table files, the value is an
+    OrderedDict of tables. JSON object keys come back as strings.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return parse_js_data(f.read())
+
+
+def parse_js_data(text):
+    m = _CONST_PAT.match(text)
+    if m is None:
+        raise ValueError('Expected "const <name> = ..."')
+    body = text[m.end():].rstrip().rstrip(';')
+    # Table names are bare identifiers at the top level; quote them so the
+    # rest parses as JSON. (JSON strings can't span lines, so this can't
+    # match inside a value.)
+    body = _TABLE_NAME_PAT.sub(r'  "\1": ', body)
+    return m.group(1), json.loads(body, object_pairs_hook=OrderedDict)
+
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_FORMAT = 1
+
+
+def _chunk_file_name(table, chunk, digest):
+    name = table.lower().replace('_', '-')
+    if chunk is not None:
+        name += '.%s' % chunk
+    return '%s.%s.json' % (name, digest[:12])
+
+
+def write_json_chunks(out_dir, chunks, extra=None):
+    """
+    Writes each (table, chunk, obj) entry of *chunks* to its own JSON file in
+    *out_dir*, plus a manifest listing every file.
+
+    File names include a hash of their contents, so a file can be cached
+    forever; only the (small) manifest needs to be refetched. Chunk files
+    listed by the previous manifest but no longer referenced are removed.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+
+    previous_files = set()
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            for entries in json.load(f).get('tables', {}).values():
+                previous_files.update(entry['file'] for entry in entries)
+
+    tables = OrderedDict()
+    for table, chunk, obj in chunks:
+        data = json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        file_name = _chunk_file_name(table, chunk, digest)
+        file_path = os.path.join(out_dir, file_name)
+        # Same name means same contents; nothing to do.
+        if not os.path.exists(file_path):
+            with atomic_open(file_path, encoding=None, binary=True) as f:
+                f.write(data)
+        tables.setdefault(table, []).append(OrderedDict([
+            ('chunk', chunk),
+            ('file', file_name),
+            ('sha256', digest),
+            ('bytes', len(data)),
+            ('count', len(obj))]))
+
+    manifest = OrderedDict([('format', MANIFEST_FORMAT)])
+    manifest.update(extra or {})
+    manifest['tables'] = tables
+    with atomic_open(manifest_path) as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    current_files = set(entry['file'] for entries in tables.values() for entry in entries)
+    for file_name in previous_files - current_files:
+        if os.path.exists(os.path.join(out_dir, file_name)):
+            os.unlink(os.path.join(out_dir, file_name))
+
+    logging.info('Wrote %u chunks to %s (%u bytes)', len(current_files), out_dir,
+                 sum(entry['bytes'] for entries in tables.values() for entry in entries))
+    return manifest
+
+
+def _language_file(path, suffix):
+    root, ext = os.path.splitext(path)
+    return '%s.%s%s' % (root, suffix, ext)
+
+
+def _log_language_sizes(path, core_path, language_paths):
+    core_size = os.path.getsize(core_path)
+    full_size = os.path.getsize(path) if os.path.exists(path) else None
+    for code, language_path in language_paths.items():
+        size = core_size + os.path.getsize(language_path)
+        if full_size:
+            logging.info('%s: core + %s = %u bytes (%.1f%% smaller than %u bytes)',
+                         os.path.basename(path), code, size,
+                         100.0 * (full_size - size) / full_size, full_size)
+        else:
+            logging.info('%s: core + %s = %u bytes', os.path.basename(path), code, size)
+
+
+def write_per_language_tables(path, var_name, tables, layout=FOLDABLE, terminator='}\n',
+                              codes=LANGUAGE_CODES):
+    """
+    Writes a language-neutral `<name>.core.js` plus one `<name>.<code>.js`
+    per language next to *path*. The string files define `<var_name>_STRINGS`
+    with the localized fields of each table, keyed the same way as the table.
+    """
+    core_tables = []
+    string_tables = OrderedDict((code, []) for code in codes)
+    for name, table in tables:
+        if isinstance(table, dict):
+            table, strings = split_localized(table, codes=codes)
+            for code in codes:
+                if len(strings[code]) != 0:
+                    string_tables[code].append((name, strings[code]))
+        core_tables.append((name, table))
+
+    core_path = _language_file(path, 'core')
+    write_js_tables(core_path, var_name, core_tables, layout, terminator)
+    language_paths = OrderedDict()
+    for code in codes:
+        language_paths[code] = _language_file(path, code)
+        write_js_tables(language_paths[code], var_name + '_STRINGS', string_tables[code],
+                        layout, terminator)
+    _log_language_sizes(path, core_path, language_paths)
+
+
+def write_per_language_const(path, var_name, obj, key_field, layout=PRETTY, codes=LANGUAGE_CODES):
+    """
+    Same as `write_per_language_tables`, but for a single list of records
+    (such as FISH_INFO) identified by *key_field*.
+    """
+    core, strings = split_localized(obj, key_field, codes)
+
+    core_path = _language_file(path, 'core')
+    write_js_const(core_path, var_name, core, layout)
+    language_paths = OrderedDict()
+    for code in codes:
+        language_paths[code] = _language_file(path, code)
+        write_js_const(language_paths[code], var_name + '_STRINGS', strings[code], layout)
+    _log_language_sizes(path, core_path, language_paths)
@@ -0,0 +1,268 @@
+from collections import OrderedDict
+import logging
+import timeit
+
+
+def make_localized_field(fld_name, row, col_name, languages, convert=None):
+    """
+    Returns (field, value) pairs for a single row, one per language.
+
+    This is the original per-row path. Each language is fetched separately,
+    falling back to the default language when the value is missing or blank.
+    Prefer `extract_localized_column` when localizing many rows of a sheet.
+    """
+    from pysaintcoinach.ex import IMultiRow
+    from pysaintcoinach.xiv import IXivRow
+
+    if isinstance(row, IXivRow):
+        row = row.source_row
+    if not isinstance(row, IMultiRow):
+        raise TypeError('Expected row to be a IMultiRow')
+
+    convert = convert or (lambda v: v)
+
+    def try_get_value(row, col_name, lang):
+        try:
+            value = convert(row[(col_name, lang)])
+            if value != '':
+                return value
+            # Fall through if value is blank!
+        except KeyError:
+            pass
+
+        # Use the default language name instead...
+        value = convert(row[col_name])
+        logging.debug("Missing %s data for %s[%u][%s], using \"%s\" instead.",
+                      lang.name,
+                      row.sheet.name,
+                      row.key,
+                      col_name,
+                      value)
+        return value
+
+    return map(lambda lang: (fld_name + lang.get_suffix(), try_get_value(row, col_name, lang)), languages)
+
+
+def make_static_localized_field(fld_name, value, languages):
+    return [(fld_name + lang.get_suffix(), value) for lang in languages]
+
+
+def _read_column(sheet, column, keys, convert):
+    # Reads a single column for all *keys* (a set) in one pass over the
+    # sheet's rows. Rows missing from the sheet are simply left out of the
+    # result.
+    values = {}
+    for row in sheet:
+        if row.key in keys:
+            values[row.key] = convert(row[column])
+    return values
+
+
+def _column_index(sheet, col_name):
+    # Indexing by position skips the name lookup on every row.
+    column = sheet.header.find_column(col_name)
+    return column.index if column is not None else col_name
+
+
+# Below this fraction of the sheet's rows, asking each row for each language
+# beats reading the whole column once per language.
+PER_ROW_FRACTION = 0.1
+
+
+def _row_count(sheet):
+    try:
+        return len(sheet)
+    except TypeError:
+        return getattr(sheet, 'count', None)
+
+
+def _source_sheet(sheet, col_name):
+    # The localised sheets hang off the multi-language sheet backing the rows.
+    first_row = next(iter(sheet), None)
+    source_sheet = getattr(getattr(first_row, 'source_row', first_row), 'sheet', None)
+    if not hasattr(source_sheet, 'get_localised_sheet'):
+        logging.warning('%s is not backed by a multi-language sheet; %s will only have '
+                        'default language values', getattr(sheet, 'name', sheet), col_name)
+        return None
+    return source_sheet
+
+
+def _extract_per_row(sheet, col_name, keys, fld_name, languages, convert):
+    result = OrderedDict()
+    absent = []
+    for key in keys:
+        try:
+            row = sheet[key]
+        except KeyError:
+            absent.append(key)
+            row = None
+        if row is not None:
+            result[key] = OrderedDict(make_localized_field(fld_name, row, col_name, languages, convert))
+        else:
+            result[key] = OrderedDict((fld_name + lang.get_suffix(), '') for lang in languages)
+    if len(absent) != 0:
+        logging.warning('%u keys are missing from %s: %s', len(absent),
+                        getattr(sheet, 'name', sheet), ', '.join(map(str, sorted(absent))))
+    return result
+
+
+def extract_localized_column(sheet, col_name, keys, fld_name, languages, convert=None):
+    """
+    Localizes one column of *sheet* for every key in *keys*.
+
+    Rather than asking each row for each language, the column is read in a
+    single pass over each language's sheet. For only a few keys (under
+    PER_ROW_FRACTION of the sheet), the rows are asked one by one
+    instead. Blank or missing values fall back to the default language (and
+    keys the default language doesn't have either are left blank). Returns
+    an OrderedDict mapping each key to an OrderedDict of `{fld_name}_{lang}`
+    fields, in *languages* order.
+    """
+    convert = convert or (lambda v: v)
+    keys = list(OrderedDict.fromkeys(filter(lambda k: k is not None, keys)))
+    result = OrderedDict((key, OrderedDict()) for key in keys)
+    if len(keys) == 0:
+        return result
+
+    row_count = _row_count(sheet)
+    if row_count is not None and len(keys) < row_count * PER_ROW_FRACTION:
+        return _extract_per_row(sheet, col_name, keys, fld_name, languages, convert)
+    return _extract_column_major(sheet, col_name, keys, fld_name, languages, convert)
+
+
+def _extract_column_major(sheet, col_name, keys, fld_name, languages, convert):
+    result = OrderedDict((key, OrderedDict()) for key in keys)
+    wanted = set(keys)
+    defaults = _read_column(sheet, col_name, wanted, convert)
+    absent = wanted - set(defaults)
+    if len(absent) != 0:
+        logging.warning('%u keys are missing from %s: %s', len(absent),
+                        getattr(sheet, 'name', sheet), ', '.join(map(str, sorted(absent))))
+
+    source_sheet = _source_sheet(sheet, col_name)
+    for lang in languages:
+        values = {}
+        if source_sheet is not None:
+            try:
+                localised_sheet = source_sheet.get_localised_sheet(lang)
+            except KeyError:
+                logging.warning('%s has no %s sheet; using default language values for %s',
+                                source_sheet.name, lang.name, col_name)
+            else:
+                values = _read_column(localised_sheet, _column_index(localised_sheet, col_name),
+                                      wanted, convert)
+
+        field = fld_name + lang.get_suffix()
+        missing = 0
+        for key in keys:
+            value = values.get(key, '')
+            if value == '':
+                value = defaults.get(key, '')
+                missing += 1
+            result[key][field] = value
+        if missing != 0:
+            logging.debug("Missing %s data for %u rows of %s[%s], using default language instead.",
+                          lang.name, missing, getattr(source_sheet, 'name', sheet), col_name)
+
+    return result
+
+
+def benchmark(sheet, col_name, keys, languages, number=3):
+    """
+    Compares the per-row path against the column-major extractor (whichever
+    one `extract_localized_column` would pick for this many keys).
+
+    Both paths must produce the same values; returns the best time (in
+    seconds) of each as a (per_row, column_major) tuple.
+    """
+    keys = list(keys)
+    per_row = OrderedDict(
+        (key, OrderedDict(make_localized_field('name', sheet[key], col_name, languages)))
+        for key in keys)
+    column_major = _extract_column_major(sheet, col_name, keys, 'name', languages, lambda v: v)
+    if per_row != column_major:
+        raise AssertionError('Localized values differ between the two paths')
+
+    per_row_time = min(timeit.repeat(
+        lambda: [list(make_localized_field('name', sheet[key], col_name, languages)) for key in keys],
+        number=1, repeat=number))
+    column_major_time = min(timeit.repeat(
+        lambda: _extract_column_major(sheet, col_name, keys, 'name', languages, lambda v: v),
+        number=1, repeat=number))
+
+    logging.info('Localizing %s[%s] for %u rows: per-row %.3fs, column-major %.3fs (%.1fx)',
+                 getattr(sheet, 'name', sheet), col_name, len(keys),
+                 per_row_time, column_major_time, per_row_time / max(column_major_time, 1e-9))
+    return per_row_time, column_major_time
+
+
+# Language codes used for localized fields, e.g. name_en. These match the
+# LANGUAGES list the data scripts load.
+LANGUAGE_CODES = ('en', 'ja', 'de', 'fr', 'ko')
+
+
+def _split_record(record, codes):
+    core = OrderedDict()
+    strings = OrderedDict((code, OrderedDict()) for code in codes)
+    for field, value in record.items():
+        base, _, code = field.rpartition('_')
+        if base and code in strings:
+            strings[code][base] = value
+        else:
+            core[field] = value
+    return core, strings
+
+
+def split_localized(table, key_field=None, codes=LANGUAGE_CODES):
+    """
+    Splits the localized fields out of a table of records.
+
+    *table* is either a dict of records, or a list of records identified by
+    *key_field*. Returns the language-neutral table (same shape as *table*)
+    and a dict mapping each language code to `{key: {field: value}}`.
+    Records without localized fields don't appear in the string tables.
+    """
+    strings = OrderedDict((code, OrderedDict()) for code in codes)
+    if isinstance(table, dict):
+        items = table.items()
+        core = OrderedDict()
+    else:
+        items = ((record[key_field], record) for record in table)
+        core = []
+
+    for key, record in items:
+        if isinstance(record, dict):
+            record, record_strings = _split_record(record, codes)
+            for code, fields in record_strings.items():
+                if len(fields) != 0:
+                    strings[code][key] = fields
+        if isinstance(core, dict):
+            core[key] = record
+        else:
+            core.append(record)
+
+    return core, strings
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+    import sys
+
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+    import manageFishData
+
+    parser = argparse.ArgumentParser(description='Benchmark localized column extraction')
+    parser.add_argument('--game_path', '-gpath', type=str,
+                        default=r"C:\Program Files (x86)\SquareEnix\FINAL FANTASY XIV - A Realm Reborn",
+                        dest='game_path',
+                        help='Path to FF14 installation')
+    parser.add_argument('--sheet', type=str, default='Item', help='Sheet to localize')
+    parser.add_argument('--column', type=str, default='Name', help='Column to localize')
+    parser.add_argument('--rows', type=int, default=2000, help='Number of rows to localize')
+    args = parser.parse_args()
+
+    xiv = manageFishData.load_dats(args)
+    sheet = xiv.game_data.get_sheet(args.sheet)
+    keys = [row.key for row, _ in zip(sheet, range(args.rows))]
+    benchmark(sheet, args.column, keys, manageFishData.LANGUAGES)
@@ -13,13 +13,26 @@ except ImportError:
 from yaml.resolver import Resolver
 import re
 import json
+import timeit
 from operator import itemgetter, attrgetter, add
 from collections import OrderedDict, namedtuple
 from functools import reduce
-from itertools import islice, repeat
-from more_itertools import flatten, nth, consume
+from itertools import islice
+from more_itertools import flatten, chunked
+from concurrent.futures import ProcessPoolExecutor
 import logging
 
+from name_index import NameIndex, NameMatcher
+from sheet_index import SheetIndexCache
+from localized_fields import make_static_localized_field, extract_localized_column
+from js_data import write_js_tables, write_json_chunks, write_per_language_tables, atomic_open
+from build_cache import read_game_version, script_version, digest, file_digest
+from asset_manifest import update_assets
+from columnar import encode_table
+from data_delta import write_delta, diff_files
+import integrity
+import uptime_stats
+
 try:
     _SCRIPT_PATH = os.path.abspath(__path__)
 except:
@@ -44,6 +57,16 @@ REGIONS = {}
 ZONES = {}
 LANGUAGES = []
 GATHERING_SUB_CATEGORIES = None
+# Name indexes used for resolving names in the YAML file to their IDs.
+FISH_NAMES = NameIndex()
+WEATHER_NAMES = NameIndex()
+FISHING_NODE_NAMES = NameIndex()
+SPEARFISHING_NODE_NAMES = NameIndex()
+# Item-keyed reverse indexes for the sheets consulted per fish.
+SHEET_INDEXES = None  # type: SheetIndexCache
+# Plain-data facts pulled from the DATs for each fish (see get_fish_facts).
+FISH_FACTS = {}
+SPOT_EX_VERSIONS = {}
 
 
 # Remove implicit parser for sexagesimal (base 60) to int.
@@ -75,9 +98,31 @@ def first(iterable, pred, default=None):
     return next(filter(pred, iterable), default)
 
 
-def load_dats(args):
+def _add_saintcoinach_path():
     # Add the Saint Coinach python API to the path.
-    sys.path += [os.path.join(_HELPER_LIBS_PATH, 'saintcoinach-py')]
+    path = os.path.join(_HELPER_LIBS_PATH, 'saintcoinach-py')
+    if path not in sys.path:
+        sys.path += [path]
+
+
+def _languages():
+    # The languages don't depend on the DATs, so they're available without
+    # loading them (e.g. when the data tables come from the snapshot).
+    global LANGUAGES
+    if len(LANGUAGES) == 0:
+        _add_saintcoinach_path()
+        from pysaintcoinach.ex.language import Language
+
+        LANGUAGES = [Language.english,
+                     Language.japanese,
+                     Language.german,
+                     Language.french,
+                     Language.korean]
+    return LANGUAGES
+
+
+def load_dats(args):
+    _add_saintcoinach_path()
 
     from pysaintcoinach import ARealmReversed
     import pysaintcoinach.text as text
@@ -88,13 +133,7 @@ def load_dats(args):
 
     extracted_sheet_plugin.initialize()
 
-    global LANGUAGES
-
-    LANGUAGES = [Language.english,
-                 Language.japanese,
-                 Language.german,
-                 Language.french,
-                 Language.korean]
+    _languages()
 
     _string_decoder = text.XivStringDecoder.default()
 
@@ -124,49 +163,80 @@ def _collect_weather_rates(rate):
     return [(r[1].key, r[0]) for r in rate.weather_rates if r[1].key != 0]
 
 
-def _make_localized_field(fld_name, row, col_name):
-    from pysaintcoinach.ex import IMultiRow
-    from pysaintcoinach.xiv import IXivRow
+def _make_static_localized_field(fld_name, value):
+    return make_static_localized_field(fld_name, value, _languages())
 
-    global LANGUAGES
 
-    if isinstance(row, IXivRow):
-        row = row.source_row
-    if not isinstance(row, IMultiRow):
-        raise TypeError('Expected row to be a IMultiRow')
+def _localize_column(sheet_name, col_name, keys, fld_name='name'):
+    sheet = XIV.game_data.get_sheet(sheet_name)
+    return extract_localized_column(sheet, col_name, keys, fld_name, _languages())
 
-    def try_get_value(row, col_name, lang):
-        try:
-            value = row[(col_name, lang)]
-            if value != '':
-                return value
-            # Fall through if value is blank!
-        except KeyError:
-            pass
-
-        # Use the default language name instead...
-        value = row[col_name]
-        logging.debug("Missing %s data for %s[%u][%s], using \"%s\" instead.",
-                        lang.name,
-                        row.sheet.name,
-                        row.key,
-                        col_name,
-                        value)
-        return value
-
-    return map(lambda lang: (fld_name + lang.get_suffix(), try_get_value(row, col_name, lang)), LANGUAGES)
 
+class _Lazy(object):
+    """
+    Stand-in for an expensive object that isn't created until first used.
+    """
 
-def _make_static_localized_field(fld_name, value):
-    return zip([fld_name + lang.get_suffix() for lang in LANGUAGES],
-               repeat(value, len(LANGUAGES)))
+    def __init__(self, factory):
+        self.__factory = factory
+        self.__value = None
 
+    def __getattr__(self, name):
+        if self.__value is None:
+            self.__value = self.__factory()
+        return getattr(self.__value, name)
 
-def _decode_spearfishing_node_name(x):
-    if x.get_raw('PlaceName') != 0:
-        return _make_localized_field('name', x['PlaceName'], 'Name')
-    else:
-        return _make_static_localized_field('name', 'Node')
+
+# Tables built by initialize_data, in the order they're stored in the snapshot.
+SNAPSHOT_TABLES = ['WEATHER_RATES', 'WEATHER_TYPES', 'FISHING_NODES', 'SPEARFISHING_NODES',
+                   'REGIONS', 'ZONES', 'GATHERING_SUB_CATEGORIES']
+SNAPSHOT_FORMAT = 1
+
+
+def _load_data_snapshot(args):
+    if args.refresh_snapshot or not os.path.exists(args.snapshot_file):
+        return None
+
+    try:
+        with open(args.snapshot_file, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f, object_pairs_hook=OrderedDict)
+    except ValueError as e:
+        logging.warning('Data snapshot is unreadable (%s), rebuilding from the DATs', e)
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('format') != SNAPSHOT_FORMAT:
+        logging.info('Data snapshot has an unknown format, rebuilding from the DATs')
+        return None
+
+    versions = {'game_version': read_game_version(args.game_path),
+                'script_version': script_version(__file__, _HELPER_MODULES)}
+    if versions['game_version'] is None or \
+            any(snapshot.get(k) != v for k, v in versions.items()):
+        logging.info('Data snapshot is stale, rebuilding from the DATs')
+        return None
+
+    tables = snapshot.get('tables') or {}
+    missing = [name for name in SNAPSHOT_TABLES if name not in tables]
+    if len(missing) != 0:
+        logging.warning('Data snapshot is missing %s, rebuilding from the DATs', ', '.join(missing))
+        return None
+
+    return OrderedDict((name, OrderedDict(map(tuple, tables[name])))
+                       for name in SNAPSHOT_TABLES)
+
+
+def _save_data_snapshot(args, tables):
+    game_version = read_game_version(args.game_path)
+    if game_version is None:
+        return
+
+    snapshot = OrderedDict([('format', SNAPSHOT_FORMAT),
+                            ('game_version', game_version),
+                            ('script_version', script_version(__file__, _HELPER_MODULES)),
+                            ('tables', OrderedDict((name, list(table.items()))
+                                                   for name, table in tables.items()))])
+    # A partial snapshot must never be left where the next run would load it.
+    with atomic_open(args.snapshot_file) as f:
+        json.dump(_to_plain_data(snapshot), f, ensure_ascii=False)
 
 
 def initialize_data(args):
@@ -180,9 +250,62 @@ def initialize_data(args):
     global REGIONS
     global ZONES
     global GATHERING_SUB_CATEGORIES
+    global WEATHER_NAMES
+    global FISHING_NODE_NAMES
+    global SPEARFISHING_NODE_NAMES
+    global SHEET_INDEXES
+
+    # Only open the DATs once something actually needs them.
+    XIV = _Lazy(lambda: load_dats(args))
+    SHEET_INDEXES = SheetIndexCache(_Lazy(lambda: XIV.game_data))
+
+    start = timeit.default_timer()
+    tables = _load_data_snapshot(args)
+    if tables is not None:
+        logging.info('Loaded data snapshot in %.3fs', timeit.default_timer() - start)
+    else:
+        tables = _build_data_tables()
+        _save_data_snapshot(args, tables)
+        logging.info('Built data tables in %.3fs', timeit.default_timer() - start)
+
+    WEATHER_RATES = tables['WEATHER_RATES']
+    WEATHER_TYPES = tables['WEATHER_TYPES']
+    FISHING_NODES = tables['FISHING_NODES']
+    SPEARFISHING_NODES = tables['SPEARFISHING_NODES']
+    REGIONS = tables['REGIONS']
+    ZONES = tables['ZONES']
+    GATHERING_SUB_CATEGORIES = tables['GATHERING_SUB_CATEGORIES']
+
+    ICON_MAP = {
+        '': [
+            (9, 'DEFAULT.png'),
+            (60166, 'aquarium.png'),
+        ],
+        'mapmarker': [
+            (60556, 'folklore.png')
+        ],
+        'action': [
+            (1115, 'powerful_hookset.png'),  # Action[Name="Powerful Hookset"]
+            (1116, 'precision_hookset.png'),  # Action[Name="Precision Hookset"]
+            (60671, 'small_gig.png'),
+            (60672, 'normal_gig.png'),
+            (60673, 'large_gig.png'),
+        ],
+        'status': [
+            (11101, 'intuition.png'),  # Status[Name="Fisher's Intuition"]
+            (11102, 'snagging.png'),  # Status[Name="Snagging"]
+            (11103, 'fish_eyes.png'),  # Status[Name="Fish Eyes"]
+        ]
+    }
+
+    KeyValuePair = namedtuple('KeyValuePair', ['key', 'value'])
+
+    WEATHER_NAMES = _build_name_index(WEATHER_TYPES)
+    FISHING_NODE_NAMES = _build_name_index(FISHING_NODES)
+    SPEARFISHING_NODE_NAMES = _build_name_index(SPEARFISHING_NODES)
 
-    XIV = load_dats(args)
 
+def _build_data_tables():
     TERRITORIES = list(filter(lambda data: data.get_raw('Map') != 0 and
                                            _is_town_or_field_territory(data['Name']),
                               XIV.game_data.get_sheet('TerritoryType')))
@@ -197,30 +320,53 @@ def initialize_data(args):
                'weather_rates': _collect_weather_rates(territory.weather_rate)}))
         for territory in TERRITORIES])
 
+    sub_categories = list(XIV.game_data.get_sheet('GatheringSubCategory'))
+    weathers = [weather for weather in
+                set(reduce(add, [t.weather_rate.possible_weathers for t in TERRITORIES], []))
+                if weather.key != 0]
+    # TODO: Support Ocean Fishing nodes as well.
+    fishing_spots = [spot for spot in XIV.game_data.get_sheet('FishingSpot')
+                     if spot.get_raw('PlaceName{Main}') == 0 and spot.get_raw('TerritoryType') != 0]
+    spearfishing_points = [x for x in XIV.game_data.get_sheet('GatheringPoint')
+                           if x['GatheringPointBase']['GatheringType'].key == 5]
+
+    # Localize each column in bulk, rather than row by row.
+    folklore_books = _localize_column('GatheringSubCategory', 'FolkloreBook',
+                                      [x.key for x in sub_categories], 'book')
+    folklore_items = _localize_column('Item', 'Name', [x.get_raw('Item') for x in sub_categories])
+    weather_names = _localize_column('Weather', 'Name', [x.key for x in weathers])
+    place_names = _localize_column('PlaceName', 'Name', [
+        *[spot.get_raw('PlaceName') for spot in fishing_spots],
+        *[x.get_raw('PlaceName') for x in spearfishing_points if x.get_raw('PlaceName') != 0],
+        *[territory.region_place_name.key for territory in TERRITORIES],
+        *[territory.place_name.key for territory in TERRITORIES]])
+
+    def _decode_spearfishing_node_name(x):
+        if x.get_raw('PlaceName') != 0:
+            return place_names[x.get_raw('PlaceName')].items()
+        else:
+            return _make_static_localized_field('name', 'Node')
+
     GATHERING_SUB_CATEGORIES = dict([
         (x.key,
-         dict([*_make_localized_field('book', x, 'FolkloreBook'),
-               *_make_localized_field('name', x['Item'], 'Name')]))
-        for x in XIV.game_data.get_sheet('GatheringSubCategory')])
+         dict([*folklore_books[x.key].items(),
+               *folklore_items[x.get_raw('Item')].items()]))
+        for x in sub_categories])
 
     WEATHER_TYPES = dict([
         (weather.key,
-         dict([*_make_localized_field('name', weather, 'Name'),
+         dict([*weather_names[weather.key].items(),
                ('icon', '%06u' % weather.get_raw('Icon'))]))
-        for weather in
-        set(reduce(add, [t.weather_rate.possible_weathers for t in TERRITORIES], []))
-        if weather.key != 0])
+        for weather in weathers])
 
-    # TODO: Support Ocean Fishing nodes as well.
     FISHING_NODES = dict([
         (spot.key,
          dict([('_id', spot.key),
-               *_make_localized_field('name', spot['PlaceName'], 'Name'),
+               *place_names[spot.get_raw('PlaceName')].items(),
                ('territory_id', spot.get_raw('TerritoryType')),
                ('placename_id', spot.key),
                ('map_coords', [spot.map_x, spot.map_y, spot.radius])]))
-        for spot in XIV.game_data.get_sheet('FishingSpot')
-        if spot.get_raw('PlaceName{Main}') == 0 and spot.get_raw('TerritoryType') != 0])
+        for spot in fishing_spots])
 
     SPEARFISHING_NODES = dict([
         (x['GatheringPointBase'].key,
@@ -228,78 +374,68 @@ def initialize_data(args):
                *_decode_spearfishing_node_name(x),
                ('territory_id', x.get_raw('TerritoryType')),
                ('placename_id', x.key)]))
-        for x in XIV.game_data.get_sheet('GatheringPoint')
-        if x['GatheringPointBase']['GatheringType'].key == 5])
+        for x in spearfishing_points])
 
     REGIONS = dict([
         (territory.region_place_name.key,
-         dict(_make_localized_field('name', territory.region_place_name, 'Name')))
+         dict(place_names[territory.region_place_name.key]))
         for territory in TERRITORIES])
 
     ZONES = dict([
         (territory.place_name.key,
-         dict(_make_localized_field('name', territory.place_name, 'Name')))
+         dict(place_names[territory.place_name.key]))
         for territory in TERRITORIES])
 
-    ICON_MAP = {
-        '': [
-            (9, 'DEFAULT.png'),
-            (60166, 'aquarium.png'),
-        ],
-        'mapmarker': [
-            (60556, 'folklore.png')
-        ],
-        'action': [
-            (1115, 'powerful_hookset.png'),  # Action[Name="Powerful Hookset"]
-            (1116, 'precision_hookset.png'),  # Action[Name="Precision Hookset"]
-            (60671, 'small_gig.png'),
-            (60672, 'normal_gig.png'),
-            (60673, 'large_gig.png'),
-        ],
-        'status': [
-            (11101, 'intuition.png'),  # Status[Name="Fisher's Intuition"]
-            (11102, 'snagging.png'),  # Status[Name="Snagging"]
-            (11103, 'fish_eyes.png'),  # Status[Name="Fish Eyes"]
-        ]
-    }
-
     # Store the dictionaries sorted by key
     # This makes the generated JS a bit more consistent.
-    WEATHER_RATES = OrderedDict(sorted(WEATHER_RATES.items(), key=lambda t: t[0]))
-    WEATHER_TYPES = OrderedDict(sorted(WEATHER_TYPES.items(), key=lambda t: t[0]))
-    FISHING_NODES = OrderedDict(sorted(FISHING_NODES.items(), key=lambda t: t[0]))
-    SPEARFISHING_NODES = OrderedDict(sorted(SPEARFISHING_NODES.items(), key=lambda t: t[0]))
-    REGIONS = OrderedDict(sorted(REGIONS.items(), key=lambda t: t[0]))
-    ZONES = OrderedDict(sorted(ZONES.items(), key=lambda t: t[0]))
-    GATHERING_SUB_CATEGORIES = OrderedDict(sorted(GATHERING_SUB_CATEGORIES.items(), key=lambda t: t[0]))
+    return OrderedDict([
+        ('WEATHER_RATES', OrderedDict(sorted(WEATHER_RATES.items(), key=lambda t: t[0]))),
+        ('WEATHER_TYPES', OrderedDict(sorted(WEATHER_TYPES.items(), key=lambda t: t[0]))),
+        ('FISHING_NODES', OrderedDict(sorted(FISHING_NODES.items(), key=lambda t: t[0]))),
+        ('SPEARFISHING_NODES', OrderedDict(sorted(SPEARFISHING_NODES.items(), key=lambda t: t[0]))),
+        ('REGIONS', OrderedDict(sorted(REGIONS.items(), key=lambda t: t[0]))),
+        ('ZONES', OrderedDict(sorted(ZONES.items(), key=lambda t: t[0]))),
+        ('GATHERING_SUB_CATEGORIES', OrderedDict(sorted(GATHERING_SUB_CATEGORIES.items(), key=lambda t: t[0])))])
 
-    KeyValuePair = namedtuple('KeyValuePair', ['key', 'value'])
+
+def _build_name_index(table):
+    return NameIndex((entry['name_en'], key) for key, entry in table.items())
+
+
+def _name_indexes():
+    return OrderedDict([('Fish and tackle', FISH_NAMES),
+                        ('Weather', WEATHER_NAMES),
+                        ('Fishing spot', FISHING_NODE_NAMES),
+                        ('Spearfishing spot', SPEARFISHING_NODE_NAMES)])
+
+
+def _log_name_index_stats():
+    for label, index in _name_indexes().items():
+        index.log_stats(label)
 
 
 def lookup_fish_by_name(name):
     if isinstance(name, list):
         return [lookup_fish_by_name(x) for x in name]
 
-    result = nth(filter(lambda item: item[1]['name_en'] == name,
-                        fish_and_tackle_data.items()), 0)
-    if result is None:
-        # Why you do this SE? Mahi-mahi =_= Also fish with an extra space at the end?!
-        result = nth(filter(lambda item: item[1]['name_en'].strip().lower() == name.lower(),
-                            fish_and_tackle_data.items()), 0)
-        if result is None:
-            raise ValueError(name)
-        else:
-            logging.warning('The formatting of "%s" has changed in the DATs to: "%s"',
-                            name, result[1]['name_en'])
-    return KeyValuePair(*result)
+    # Why you do this SE? Mahi-mahi =_= Also fish with an extra space at the end?!
+    key, tier = FISH_NAMES.find(name)
+    if tier is None:
+        raise ValueError(name)
+    if tier != 'exact':
+        logging.warning('The formatting of "%s" has changed in the DATs to: "%s"',
+                        name, fish_and_tackle_data[key]['name_en'])
+    return KeyValuePair(key, fish_and_tackle_data[key])
 
 
 def lookup_weather_by_name(name):
-    result = nth(filter(lambda item: item[1]['name_en'] == name,
-                        WEATHER_TYPES.items()), 0)
-    if result is None:
+    key, tier = WEATHER_NAMES.find(name)
+    if tier is None:
         raise ValueError(name)
-    return KeyValuePair(*result)
+    if tier != 'exact':
+        logging.warning('The formatting of "%s" has changed in the DATs to: "%s"',
+                        name, WEATHER_TYPES[key]['name_en'])
+    return KeyValuePair(key, WEATHER_TYPES[key])
 
 
 def lookup_fishing_spot_by_name(name):
@@ -308,16 +444,12 @@ def lookup_fishing_spot_by_name(name):
         name = name[0]
     if name is None:
         return KeyValuePair(None, None)
-    result = nth(filter(lambda item: item[1]['name_en'] == name,
-                        FISHING_NODES.items()), 0)
-    if result is None:
-        # HOLD ON, Clorifex says SE f's this up a lot... and can sometimes turn
-        # the first letter of place names to lowercase... Seriously SE?
-        result = nth(filter(lambda item: item[1]['name_en'].lower() == name.lower(),
-                            FISHING_NODES.items()), 0)
-        if result is None:
-            raise ValueError(name)
-    return KeyValuePair(*result)
+    # HOLD ON, Clorifex says SE f's this up a lot... and can sometimes turn
+    # the first letter of place names to lowercase... Seriously SE?
+    key, tier = FISHING_NODE_NAMES.find(name)
+    if tier is None:
+        raise ValueError(name)
+    return KeyValuePair(key, FISHING_NODES[key])
 
 
 def lookup_spearfishing_spot_by_name(name):
@@ -328,26 +460,91 @@ def lookup_spearfishing_spot_by_name(name):
         return KeyValuePair(None, None)
     if isinstance(name, int):
         return KeyValuePair(name, None)
-    result = nth(filter(lambda item: item[1]['name_en'] == name,
-                        SPEARFISHING_NODES.items()), 0)
-    if result is None:
+    key, tier = SPEARFISHING_NODE_NAMES.find(name)
+    if tier is None:
         logging.warning("Spearfishing Spot lookup failed: %s", name)
         # raise ValueError(name)
         return KeyValuePair(None, None)
-    return KeyValuePair(*result)
+    return KeyValuePair(key, SPEARFISHING_NODES[key])
+
 
+def _to_plain_data(o):
+    # pysaintcoinach hands back its own string types; make sure only builtin
+    # types end up in anything that gets pickled or cached.
+    if isinstance(o, str):
+        return str(o)
+    if isinstance(o, dict):
+        return type(o)((k, _to_plain_data(v)) for k, v in o.items())
+    if isinstance(o, (list, tuple)):
+        return type(o)(_to_plain_data(v) for v in o)
+    return o
 
-def supports_fish_eyes(fish_id, location_id, fish_notes, patch):
+
+def _extract_fish_facts(fish_id):
     from pysaintcoinach.ex.language import Language
 
-    # The fish must not be legendary: i.e. not include the phase: "オオヌシ".
     fish = XIV.game_data.get_sheet('Item')[fish_id]
-    if "オオヌシ" in fish.source_row['Description', Language.japanese]:
+    description = fish.source_row['Description', Language.japanese]
+
+    # Aquarium information:
+    # - Just pull this from the DATs. Sometimes they add support for old fish.
+    aquarium_entry = SHEET_INDEXES.get('AquariumFish').first(fish_id)
+    if aquarium_entry is not None:
+        aquarium_entry = dict({'water': str(aquarium_entry['AquariumWater']),
+                               'size': int(aquarium_entry['Size'])})
+
+    # Technically, every fish /should/ have an entry in these tables... but we'll be safe.
+    folklore = None
+    fish_parameter = SHEET_INDEXES.get('FishParameter').first(fish_id)
+    fish_notes = SHEET_INDEXES.get('FishingNoteInfo').first(fish_id)
+    if fish_parameter is not None and fish_notes is not None:
+        folklore = fish_parameter['GatheringSubCategory']
+        if folklore is not None:
+            # Convert to raw key to allow for localization (and less duplication)
+            folklore = folklore.key
+
+    if fish.as_boolean('IsCollectable'):
+        min_collectability = get_min_collectability(fish_id)
+    else:
+        min_collectability = None
+
+    return _to_plain_data({
+        'aquarium': aquarium_entry,
+        'in_fishing_log': fish_parameter is not None and fish_notes is not None,
+        'folklore': folklore,
+        'collectable': min_collectability,
+        # Legendary fish include the phrase: "オオヌシ".
+        'legendary': "オオヌシ" in description,
+        # Big fish include "ヌシ".
+        'big_fish': "ヌシ" in description})
+
+
+def get_fish_facts(fish_id):
+    """Returns the DAT-sourced values conversion needs for a single fish.
+
+    Facts are extracted on first use. When converting in a worker process,
+    they come pre-loaded from the conversion snapshot instead.
+
+    """
+    if fish_id not in FISH_FACTS:
+        FISH_FACTS[fish_id] = _extract_fish_facts(fish_id)
+    return FISH_FACTS[fish_id]
+
+
+def get_spot_ex_version(location_id):
+    if location_id not in SPOT_EX_VERSIONS:
+        spot = XIV.game_data.get_sheet('FishingSpot')[location_id]
+        SPOT_EX_VERSIONS[location_id] = spot.territory_type['ExVersion'].key
+    return SPOT_EX_VERSIONS[location_id]
+
+
+def supports_fish_eyes(fish_id, location_id, patch):
+    # The fish must not be legendary: i.e. not include the phase: "オオヌシ".
+    if get_fish_facts(fish_id)['legendary']:
         return False
     # As of 7.0, Fish Eyes only works on fish in areas prior to Endwalker.
     if location_id is not None:
-        spot = XIV.game_data.get_sheet('FishingSpot')[location_id]
-        if spot.territory_type['ExVersion'].key >= 4:
+        if get_spot_ex_version(location_id) >= 4:
             return False
     else:
         # Sigh... let's just use the patch instead... One more reason to switch
@@ -363,20 +560,13 @@ def supports_fish_eyes(fish_id, location_id, fish_notes, patch):
 
 
 def is_big_fish(fish_id):
-    from pysaintcoinach.ex.language import Language
-
     # If "ヌシ" is in the Japanese text then it's a big fish.
     # There's technically one fish where the text appears twice, Namitaro, but that doesn't matter here
-    fish = XIV.game_data.get_sheet('Item')[fish_id]
-    if "ヌシ" in fish.source_row['Description', Language.japanese]:
-        return True
-
-    return False
+    return get_fish_facts(fish_id)['big_fish']
 
 
 def get_min_collectability(fish_id, default=None):
-    shop_item = next(filter(lambda row: row.get_raw('Item') == fish_id,
-                            XIV.game_data.get_sheet('CollectablesShopItem')), default)
+    shop_item = SHEET_INDEXES.get('CollectablesShopItem').first(fish_id, default)
     if shop_item is not None:
         return shop_item['CollectablesShopRefine']['LowCollectability']
     return 1
@@ -438,27 +628,17 @@ def _convert_fish_to_json(item):
     if item.get('predators') is not None:
         predators = list([(lookup_fish_by_name(x[0]).key, x[1]) for x in item['predators'].items()])
 
-    # Aquarium information:
-    # - Just pull this from the DATs. Sometimes they add support for old fish.
-    aquarium_entry = first(XIV.game_data.get_sheet('AquariumFish'),
-                           lambda r: r.get_raw('Item') == key)
+    facts = get_fish_facts(key)
+
+    # Aquarium information is pulled from the DATs.
+    aquarium_entry = facts['aquarium']
     if aquarium_entry is not None:
-        aquarium_entry = dict({'water': str(aquarium_entry['AquariumWater']),
-                               'size': int(aquarium_entry['Size'])})
+        aquarium_entry = dict(aquarium_entry)
 
     # Check if the fish requires Folklore (use the DATs, ignore old data from YAML file)
-    # Technically, every fish /should/ have an entry in this table... but we'll be safe.
-    folklore = None
+    folklore = facts['folklore']
     data_missing = None
-    fish_parameter = first(XIV.game_data.get_sheet('FishParameter'),
-                           lambda r: r.get_raw('Item') == key)
-    fish_notes = first(XIV.game_data.get_sheet('FishingNoteInfo'),
-                       lambda r: r.get_raw('Item') == key)
-    if fish_parameter is not None and fish_notes is not None:
-        folklore = fish_parameter['GatheringSubCategory']
-        if folklore is not None:
-            # Convert to raw key to allow for localization (and less duplication)
-            folklore = folklore.key
+    if facts['in_fishing_log']:
         # If the entry is marked as "dataMissing", then populate the time and weather
         # restriction values. Also, display a warning in the logs so we know we need
         # to resolve the missing information in the future.
@@ -474,12 +654,7 @@ def _convert_fish_to_json(item):
     elif item.get('gig') is None:
         logging.warning('%s does not have an entry in FishingNoteInfo?!', item['name'])
 
-    is_collectable = XIV.game_data.get_sheet('Item')[key].as_boolean('IsCollectable')
-
-    if is_collectable:
-        min_collectability = get_min_collectability(key)
-    else:
-        min_collectability = None
+    min_collectability = facts['collectable']
 
     tug_type = item.get('tug', None)
     if tug_type is not None:
@@ -494,7 +669,7 @@ def _convert_fish_to_json(item):
     # Instead, the action is now a buff that enables non-legendary fish with
     # only a time restriction to be caught whenever.
     if item.get('gig') is None:
-        fish_eyes = supports_fish_eyes(key, location, fish_notes, item.get('patch'))
+        fish_eyes = supports_fish_eyes(key, location, item.get('patch'))
     else:
         # Fish Eyes doesn't affect spearfishing.
         fish_eyes = False
@@ -525,99 +700,342 @@ def _convert_fish_to_json(item):
                          'dataMissing': data_missing}))
 
 
-def _unformated_name(obj):
-    return obj['name_en'].strip().lower()
-
-
 def _flatten_lite(l):
     return list(flatten(map(lambda x: [x] if not isinstance(x, list) else x, l)))
 
 
+def _build_conversion_snapshot(fishes):
+    # pysaintcoinach rows can't be pickled, so pull everything conversion
+    # touches out of the DATs up front. Each worker rebuilds its lookup
+    # indexes from these tables. Facts are only needed for the fish being
+    # converted, not the bait.
+    # Resolving the names here shouldn't count towards the lookup stats;
+    # the workers report their own.
+    stats = FISH_NAMES.stats.copy()
+    for fish in fishes:
+        fish_id, tier = FISH_NAMES.find(fish['name'])
+        if tier is not None:
+            get_fish_facts(fish_id)
+    FISH_NAMES.stats = stats
+    for location_id in FISHING_NODES:
+        get_spot_ex_version(location_id)
+
+    return _to_plain_data({
+        'fish_and_tackle_data': fish_and_tackle_data,
+        'weather_types': WEATHER_TYPES,
+        'fishing_nodes': FISHING_NODES,
+        'spearfishing_nodes': SPEARFISHING_NODES,
+        'fish_facts': FISH_FACTS,
+        'spot_ex_versions': SPOT_EX_VERSIONS})
+
+
+def _init_conversion_worker(snapshot):
+    global fish_and_tackle_data
+    global WEATHER_TYPES
+    global FISHING_NODES
+    global SPEARFISHING_NODES
+    global FISH_FACTS
+    global SPOT_EX_VERSIONS
+    global KeyValuePair
+    global FISH_NAMES
+    global WEATHER_NAMES
+    global FISHING_NODE_NAMES
+    global SPEARFISHING_NODE_NAMES
+
+    fish_and_tackle_data = snapshot['fish_and_tackle_data']
+    WEATHER_TYPES = snapshot['weather_types']
+    FISHING_NODES = snapshot['fishing_nodes']
+    SPEARFISHING_NODES = snapshot['spearfishing_nodes']
+    FISH_FACTS = snapshot['fish_facts']
+    SPOT_EX_VERSIONS = snapshot['spot_ex_versions']
+    KeyValuePair = namedtuple('KeyValuePair', ['key', 'value'])
+
+    FISH_NAMES = _build_name_index(fish_and_tackle_data)
+    WEATHER_NAMES = _build_name_index(WEATHER_TYPES)
+    FISHING_NODE_NAMES = _build_name_index(FISHING_NODES)
+    SPEARFISHING_NODE_NAMES = _build_name_index(SPEARFISHING_NODES)
+
+
+def _convert_fish_chunk(fishes):
+    for index in _name_indexes().values():
+        index.stats.clear()
+
+    start = timeit.default_timer()
+    results = list(map(convert_fish_to_json, fishes))
+    elapsed = timeit.default_timer() - start
+
+    return (os.getpid(), elapsed, results,
+            dict((label, index.stats.copy()) for label, index in _name_indexes().items()))
+
+
+def convert_fishes(fishes, jobs=1, chunk_size=50):
+    """Converts YAML fish entries into (key, OrderedDict) pairs.
+
+    With *jobs* > 1, the entries are split into chunks and converted by a
+    process pool. The results are returned in the same order as *fishes*
+    either way.
+
+    """
+    if jobs <= 1 or len(fishes) <= chunk_size:
+        return list(map(convert_fish_to_json, fishes))
+
+    start = timeit.default_timer()
+    snapshot = _build_conversion_snapshot(fishes)
+    logging.info('Built conversion snapshot in %.3fs', timeit.default_timer() - start)
+
+    results = []
+    worker_stats = OrderedDict()
+    name_indexes = _name_indexes()
+    with ProcessPoolExecutor(max_workers=jobs,
+                             initializer=_init_conversion_worker,
+                             initargs=(snapshot,)) as executor:
+        for pid, elapsed, chunk_results, lookup_stats in executor.map(_convert_fish_chunk,
+                                                                       chunked(fishes, chunk_size)):
+            results += chunk_results
+            chunks, count, total = worker_stats.get(pid, (0, 0, 0.0))
+            worker_stats[pid] = (chunks + 1, count + len(chunk_results), total + elapsed)
+            for label, stats in lookup_stats.items():
+                name_indexes[label].stats.update(stats)
+
+    for pid, (chunks, count, total) in worker_stats.items():
+        logging.info('Worker %u: converted %u fish in %u chunks (%.3fs)', pid, count, chunks, total)
+    logging.info('Converted %u fish using %u workers in %.3fs',
+                 len(results), jobs, timeit.default_timer() - start)
+
+    return results
+
+
+REBUILD_CACHE_FORMAT = 1
+
+
+# The helper modules (in this directory) the output depends on. A change to
+# any of them invalidates the caches, the same as a change to this script.
+_HELPER_MODULES = (
+    'build_cache',
+    'name_index',
+    'sheet_index',
+    'localized_fields',
+    'js_data',
+    'asset_manifest',
+    'columnar',
+    'data_delta',
+    'integrity',
+    'uptime_stats',
+    'catch_windows',
+    'weather_forecast',
+    'extracted_sheet_plugin')
+
+
+def _load_rebuild_cache(args):
+    versions = OrderedDict([('format', REBUILD_CACHE_FORMAT),
+                            ('game_version', read_game_version(args.game_path)),
+                            ('script_version', script_version(__file__, _HELPER_MODULES))])
+    if versions['game_version'] is None:
+        logging.warning('Incremental rebuild disabled; the game version is unknown')
+        return None
+
+    cache = None
+    if os.path.exists(args.cache_file):
+        try:
+            with open(args.cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f, object_pairs_hook=OrderedDict)
+        except ValueError as e:
+            # Left behind by a version that didn't write the cache atomically.
+            logging.warning('Rebuild cache is unreadable (%s), starting over', e)
+        else:
+            stale = [k for k, v in versions.items() if cache.get(k) != v]
+            if len(stale) != 0:
+                logging.info('Rebuild cache is stale (%s changed), starting over', ', '.join(stale))
+                cache = None
+
+    if cache is None:
+        cache = versions
+        cache.update([('items', None), ('output', None), ('fish', OrderedDict())])
+    return cache
+
+
+def _save_rebuild_cache(args, cache):
+    # A Ctrl-C mid-write must not leave a truncated cache for the next run.
+    with atomic_open(args.cache_file) as f:
+        json.dump(cache, f, ensure_ascii=False)
+
+
+def _convert_fishes_incremental(fishes, cache, jobs=1):
+    # Hash the entries *before* conversion; it fills in defaults in place.
+    hashes = [digest(fish) for fish in fishes]
+    cached = cache['fish']
+
+    misses = [fish for fish, h in zip(fishes, hashes) if h not in cached]
+    converted = iter(convert_fishes(misses, jobs))
+
+    results = []
+    fresh = OrderedDict()
+    for h in hashes:
+        if h in cached:
+            key, record = cached[h]
+        else:
+            key, record = next(converted)
+        results.append((key, record))
+        fresh[h] = [key, record]
+
+    logging.info('Incremental rebuild: %u cached, %u converted, %u stale entries dropped',
+                 len(fishes) - len(misses), len(misses),
+                 len(set(cached.keys()) - set(fresh.keys())))
+    cache['fish'] = fresh
+    return results, digest(hashes)
+
+
+def _match_fish_and_tackle_data(fish_and_tackle_names):
+    # Match these with Item records in a single pass.
+    # Formatting differences (case, extra spaces, Gura...) are tolerated here,
+    # and reported when the names are looked up during conversion.
+    matcher = NameMatcher(fish_and_tackle_names)
+    matches = [item for item in XIV.game_data.get_sheet('Item')
+               if matcher.match(item['Name']) is not None]
+    matcher.log_stats('Item name')
+
+    names = _localize_column('Item', 'Name', [item.key for item in matches])
+    items = OrderedDict([
+        (item.key, dict([
+            ('_id', item.key),
+            *names[item.key].items(),
+            ('icon', '%06u' % item.get_raw('Icon')),
+            ('ilvl', item.get_raw('Level{Item}'))]))
+        for item in matches])
+    return matcher, items
+
+
+def _expansion_of(patch):
+    # Patches are stored as numbers, e.g. 6.5 -> "6".
+    return str(int(patch)) if patch is not None else 'unknown'
+
+
+def write_split_data(out_dir, tables):
+    """Writes the data tables as separately cacheable JSON chunks.
+
+    FISH is split by expansion so the front-end can load the current
+    expansion first; every other table gets a file of its own. The
+    manifest lists each chunk along with its hash.
+
+    """
+    tables = OrderedDict(tables)
+    expansions = OrderedDict()
+    for key, fish in tables.pop('FISH').items():
+        expansions.setdefault(_expansion_of(fish['patch']), OrderedDict())[key] = fish
+    released = sorted(filter(str.isdigit, expansions), key=int)
+    ordered = released + [x for x in expansions if not x.isdigit()]
+
+    chunks = [('FISH', expansion, expansions[expansion]) for expansion in ordered]
+    chunks += [(name, None, table) for name, table in tables.items()]
+    return write_json_chunks(out_dir, chunks,
+                             extra=OrderedDict([('latest', released[-1] if released else None)]))
+
+
 def rebuild_fish_data(args):
     global fish_and_tackle_data
+    global FISH_NAMES
     # Parse the fish data in the YAML file.
     fishes = yaml.load(open(args.yaml_file, 'r', encoding='utf-8'), Loader=Loader)
 
+    cache = _load_rebuild_cache(args) if args.incremental else None
+
     # Collect all of the fish/tackle names.
-    fish_and_tackle_names = list(set(filter(None, reduce(
-        add, [[fish['name']] +
-              list((fish.get('predators', {}) or {}).keys()) +
-              (_flatten_lite(fish['bestCatchPath'] or []))
-              for fish in fishes], []))))
-    # Match these with Item records.
-    fish_and_tackle_data = OrderedDict()
-    for item in XIV.game_data.get_sheet('Item'):
-        if item['Name'] not in fish_and_tackle_names:
-            # Try a little harder...
-            if item['Name'].strip().lower() not in map(lambda x: x.lower(), fish_and_tackle_names):
-                continue
-        fish_and_tackle_data[item.key] = dict([
-            ('_id', item.key),
-            *_make_localized_field('name', item, 'Name'),
-            ('icon', '%06u' % item.get_raw('Icon')),
-            ('ilvl', item.get_raw('Level{Item}'))])
+    fish_names = set(fish['name'] for fish in fishes)
+    predators = set(filter(None, flatten(
+        (fish.get('predators', {}) or {}).keys() for fish in fishes)))
+    fish_and_tackle_names = set(filter(None, flatten(
+        _flatten_lite(fish['bestCatchPath'] or []) for fish in fishes))) | \
+        fish_names | predators
+
+    # The ITEMS table only depends on the set of names (and the DATs).
+    items_digest = digest(sorted(fish_and_tackle_names))
+    if cache is not None and (cache['items'] or {}).get('digest') == items_digest:
+        logging.info('Using cached ITEMS table')
+        fish_and_tackle_data = OrderedDict(map(tuple, cache['items']['data']))
+        matcher = None
+    else:
+        matcher, fish_and_tackle_data = _match_fish_and_tackle_data(fish_and_tackle_names)
 
-    # Verify nothing's missing.
-    diffs = set(fish_and_tackle_names) - \
-            set(map(itemgetter('name_en'), fish_and_tackle_data.values()))
-    if len(diffs) != 0:
-        # Allow minor formatting issues.
-        non_formatting_diffs = set(map(lambda x: x.strip().lower(), diffs)) - \
-                               set(map(_unformated_name, fish_and_tackle_data.values()))
-        if len(non_formatting_diffs) != 0:
-            # Okay... allow for a few more formatting issues... Gura...
-            gura_diffs = set(map(lambda x: x.replace(' ',''), non_formatting_diffs)) - \
-                         set(map(lambda x: x['name_en'].strip().lower().replace(' ',''),
-                                 fish_and_tackle_data.values()))
-            if len(gura_diffs) != 0:
-                raise KeyError("Missing item names: %s" % ', '.join(gura_diffs))
-
-    # Make sure any predators have data defined for them too!
-    predators = set(filter(None,
-                       reduce(add,
-                              [list((fish.get('predators', {}) or {}).keys())
-                               for fish in fishes])))
-    diffs = predators - \
-            set([fish['name'] for fish in fishes]) - \
-            set(map(itemgetter('name_en'), fish_and_tackle_data.values()))
-    if len(diffs) != 0:
-        # Allow minor formatting issues.
-        non_formatting_diffs = set(map(lambda x: x.strip().lower(), diffs)) - \
-                               set(map(_unformated_name, fish_and_tackle_data.values()))
-        if len(non_formatting_diffs) != 0:
-            # Okay... allow for a few more formatting issues... Gura...
-            gura_diffs = set(map(lambda x: x.replace(' ',''), non_formatting_diffs)) - \
-                         set(map(lambda x: x['name_en'].strip().lower().replace(' ',''),
-                                 fish_and_tackle_data.values()))
-            if len(gura_diffs) != 0:
-                raise KeyError("Missing predators: %s" % ', '.join(gura_diffs))
-
-    diffs = predators - \
-            set([fish['name'] for fish in fishes])
+    if matcher is not None:
+        # Verify nothing's missing.
+        diffs = matcher.unresolved()
+        if len(diffs) != 0:
+            raise KeyError("Missing item names: %s" % ', '.join(diffs))
+
+        # Make sure any predators have data defined for them too!
+        diffs = matcher.unresolved(predators - fish_names)
+        if len(diffs) != 0:
+            raise KeyError("Missing predators: %s" % ', '.join(diffs))
+
+    diffs = predators - fish_names
     if len(diffs) != 0:
         raise KeyError("Missing predator definitions: %s" % ', '.join(diffs))
 
-    fish_data = OrderedDict(map(convert_fish_to_json, fishes))
+    FISH_NAMES = _build_name_index(fish_and_tackle_data)
+
+    if cache is not None:
+        cache['items'] = OrderedDict([('digest', items_digest),
+                                      ('data', list(_to_plain_data(fish_and_tackle_data).items()))])
+        fish_data, fish_digest = _convert_fishes_incremental(fishes, cache, args.jobs)
+        fish_data = OrderedDict(fish_data)
+    else:
+        fish_data = OrderedDict(convert_fishes(fishes, args.jobs))
+    _log_name_index_stats()
+    SHEET_INDEXES.log_stats()
 
     # Re-sort the ITEMS dictionary.
     fish_and_tackle_data = OrderedDict(sorted(fish_and_tackle_data.items(), key=lambda t: t[0]))
 
-    with open(args.js_file, 'w', encoding='utf-8') as f:
-        def dump_foldable(o):
-            s = json.dumps(o, ensure_ascii=False)
-            return s[0] + '\n    ' + s[1:][:-1] + '\n  ' + s[-1]
-
-        f.write("const DATA = {\n")
-        f.write("  FISH: %s,\n" % dump_foldable(fish_data))
-        f.write("  FISHING_SPOTS: %s,\n" % dump_foldable(FISHING_NODES))
-        f.write("  SPEARFISHING_SPOTS: %s,\n" % dump_foldable(SPEARFISHING_NODES))
-        f.write("  ITEMS: %s,\n" % dump_foldable(fish_and_tackle_data))
-        f.write("  WEATHER_RATES: %s,\n" % dump_foldable(WEATHER_RATES))
-        f.write("  WEATHER_TYPES: %s,\n" % dump_foldable(WEATHER_TYPES))
-        f.write("  REGIONS: %s,\n" % dump_foldable(REGIONS))
-        f.write("  ZONES: %s,\n" % dump_foldable(ZONES))
-        f.write("  FOLKLORE: %s\n" % dump_foldable(GATHERING_SUB_CATEGORIES))
-        f.write("}\n")
+    # Skip rewriting the JS file if none of its inputs have changed.
+    up_to_date = False
+    if cache is not None:
+        # The uptime horizon starts on the day of the build.
+        output_digest = digest(fish_digest, items_digest, args.format,
+                               uptime_stats.default_start() if args.uptime else None)
+        previous = cache['output'] or {}
+        up_to_date = previous.get('digest') == output_digest and \
+            previous.get('sha1') == file_digest(args.js_file)
+        if up_to_date:
+            logging.info('%s is up-to-date', args.js_file)
+
+    tables = [('FISH', fish_data),
+              ('FISHING_SPOTS', FISHING_NODES),
+              ('SPEARFISHING_SPOTS', SPEARFISHING_NODES),
+              ('ITEMS', fish_and_tackle_data),
+              ('WEATHER_RATES', WEATHER_RATES),
+              ('WEATHER_TYPES', WEATHER_TYPES),
+              ('REGIONS', REGIONS),
+              ('ZONES', ZONES),
+              ('FOLKLORE', GATHERING_SUB_CATEGORIES)]
+    if args.uptime:
+        # Precomputed uptime/rarity, so the tracker needn't estimate it.
+        tables.append(('UPTIME', uptime_stats.uptime_table(OrderedDict(tables))))
+
+    previous_text = None
+    if args.delta and not up_to_date and os.path.exists(args.js_file):
+        with open(args.js_file, 'r', encoding='utf-8', newline='') as f:
+            previous_text = f.read()
+
+    if not up_to_date:
+        if args.format == 'columnar':
+            # Store FISH as parallel arrays; see columnar.py for the layout.
+            write_js_tables(args.js_file, 'DATA', [('FISH', encode_table(fish_data))] + tables[1:])
+        else:
+            write_js_tables(args.js_file, 'DATA', tables)
+    if previous_text is not None:
+        write_delta(previous_text, args.js_file)
+    if args.split_dir is not None:
+        write_split_data(args.split_dir, tables)
+    if args.per_language:
+        write_per_language_tables(args.js_file, 'DATA', tables)
+    if args.precompress:
+        update_assets([args.js_file])
+
+    if cache is not None:
+        if not up_to_date:
+            cache['output'] = OrderedDict([('digest', output_digest),
+                                           ('sha1', file_digest(args.js_file))])
+        _save_rebuild_cache(args, cache)
 
     if args.with_icons:
         # Create image/fish_n_tackle dir if not exists
@@ -670,107 +1088,172 @@ def rebuild_fish_data(args):
             fishing_note_book.crop((124, 28, 144, 48)).save(os.path.join(_SCRIPT_PATH, 'images', 'folklore.png'))
 
 
-def check_data_integrity(args):
-    has_errors = False
-    # Parse the fish data in the YAML file.
-    fishes = yaml.load(open(args.yaml_file, 'r'), Loader=Loader)
+def _build_integrity_facts():
+    """Returns the DAT facts the integrity rules need, keyed by fish name.
+
+    Each sheet is walked once (through its index) and each item name is
+    read once, rather than dereferencing every row's Item for every fish.
+    Like the old `first(...)` scans, the first row for a name wins.
+
+    """
+    fish_parameters = SHEET_INDEXES.get('FishParameter')
+    fishing_notes = SHEET_INDEXES.get('FishingNoteInfo')
+    items = XIV.game_data.get_sheet('Item')
+
+    def rows_by_name(index):
+        rows = {}
+        for item_id in index.keys():
+            rows.setdefault(str(items[item_id]['Name']), index.first(item_id))
+        return rows
+
+    parameters_by_name = rows_by_name(fish_parameters)
+    notes_by_name = rows_by_name(fishing_notes)
+
+    facts = {}
+    for name, fish_params in parameters_by_name.items():
+        fish_notes = notes_by_name.get(name)
+        if fish_notes is None:
+            continue
+        facts[name] = {'is_hidden': bool(fish_params['IsHidden']),
+                       'time_restricted': fish_notes.as_boolean('TimeRestriction'),
+                       'weather_restricted': fish_notes.as_boolean('WeatherRestriction'),
+                       'special_conditions': bool(fish_notes['SpecialConditions'])}
+    return facts
 
+
+def _load_integrity_fishes(yaml_file):
+    # Parse the fish data in the YAML file.
+    fishes = yaml.load(open(yaml_file, 'r'), Loader=Loader)
+    # Leave malformed documents (e.g. caught mid-edit by --watch) for the
+    # caller to report.
+    if integrity.document_problem(fishes) is not None:
+        return fishes
     for fish in fishes:
-        fish = fish  # type: dict
-
-        fish.setdefault('startHour', 0)
-        fish.setdefault('endHour', 24)
-        fish.setdefault('weatherSet', [])
-        fish.setdefault('previousWeatherSet', [])
-        fish.setdefault('bestCatchPath', [])
-
-        ensure_hour_is_decimal(fish)
-
-        # Check for hookset definition.
-        # For fish that require mooching, Patience is almost always used. Knowing
-        # which hookset to use is vital, so make sure mooch fish have it defined!
-        if len(fish.get('bestCatchPath') or []) > 1:
-            if fish.get('hookset') is None:
-                logging.error('%s requires mooching and should have a hookset defined', fish['name'])
-            for mooched_name, mooched_fish in map(lambda name: (name, first(fishes, lambda x: x['name'] == name)),
-                                                  reversed(list(consume(iter(fish['bestCatchPath']), 1)))):
-                if mooched_fish is None:
-                    logging.error('%s is missing from database?!', mooched_name)
-                    continue
-                if mooched_fish.get('hookset') is None:
-                    logging.error('%s is mooched to catch %s and should have a hookset defined',
-                                  mooched_fish['name'], fish['name'])
-
-        # For each fish, verify time and weather restrictions have been recorded.
-        fish_params = first(XIV.game_data.get_sheet('FishParameter'),
-                            lambda x: x['Item'] is not None and x['Item']['Name'] == fish['name'])
-        fish_notes = first(XIV.game_data.get_sheet('FishingNoteInfo'),
-                           lambda x: x['Item'] is not None and x['Item']['Name'] == fish['name'])
-        if fish_params is None or fish_notes is None:
+        integrity.prepare_fish(fish, ensure_hour_is_decimal)
+    return fishes
+
+
+def check_data_integrity(args):
+    start = timeit.default_timer()
+    dat_facts = _build_integrity_facts()
+    index_time = timeit.default_timer() - start
+
+    if args.watch:
+        # Keep the DAT facts warm, and only recheck what gets edited.
+        integrity.watch(args.yaml_file, _load_integrity_fishes, dat_facts, args.interval)
+        return True
+
+    fishes = _load_integrity_fishes(args.yaml_file)
+    ctx = integrity.IntegrityContext(fishes, dat_facts)
+
+    result = integrity.run_rules(ctx)
+    result.log()
+
+    logging.debug('Built integrity indexes in %.3fs', index_time)
+    for rule, elapsed in zip(result.rules, result.timings):
+        logging.debug('Rule %s took %.3fs', rule.name, elapsed)
+    if args.report_file is not None:
+        integrity.write_report(args.report_file, result,
+                               extra=OrderedDict([('yaml', args.yaml_file),
+                                                  ('index_seconds', round(index_time, 6))]))
+
+    return result.passed
+
+
+def _scan_fishing_spots(xiv):
+    """Returns (key, name, location) for each fish found at a fishing spot."""
+    from pysaintcoinach.xiv.fishing_spot import FishingSpot
+    found = []
+    for fishing_spot in xiv.game_data.get_sheet(FishingSpot):
+        if fishing_spot.place_name.key == 0:
+            continue
+        if fishing_spot.get_raw("PlaceName{Main}") != 0:
+            # TODO: For now, exclude Ocean Fishing nodes.
             continue
+        for fish in fishing_spot.items:
+            found.append((fish.key, str(fish.name), str(fishing_spot.place_name)))
+    return found
 
-        # VERY IMPORTANT NOTE:
-        #   The game data very often does not restrict the weather or time for
-        #   mooched fish. That is, if a particular fish can only be caught by
-        #   mooching a fish with time/weather restrictions, it itself won't
-        #   appear to be restricted (according to the DATs).
-        #   For the sake of use experience, restrictions have often been copied
-        #   over to the target fish. This should be revisted once the UI allows
-        #   better display of mooch fish (similar to intuition fish).
 
-        # NOTE: As of Patch 6.4, the TimeRestriction and WeatherRestriction fields
-        # are no longer reliable. We're not yet sure if these fields even exist
-        # anymore in the DATs.
+def _scan_spearfishing_points(xiv):
+    """Returns (key, name, location) for each fish found at a spearfishing point."""
+    from pysaintcoinach.xiv.gathering_point import GatheringPoint
+    found = []
+    for gathering_point in xiv.game_data.get_sheet(GatheringPoint):
+        # We only care about spearfishing gathering points.
+        if gathering_point.base.type.key != 5:
+            continue
+        for item in gathering_point.base.items:
+            # Get the BASE gathering point only!
+            # This check is broken, but for now, it doesn't appear to trigger on any data.
+            # Revisit later please.
+            is_hidden = gathering_point['Count'] == 6  # super-sketch, but this is the field, Index: 2
+            found.append((item.key,
+                          str(item.name),
+                          gathering_point.base.key if is_hidden else str(gathering_point.place_name.name)))
+    return found
+
+
+ADDNEW_SCANNERS = OrderedDict([('FishingSpot', _scan_fishing_spots),
+                               ('GatheringPoint', _scan_spearfishing_points)])
+
+
+def _run_addnew_scanner(game_path, name):
+    # Runs in a worker process. Rows can't be sent back, so each worker opens
+    # its own copy of the DATs and returns plain tuples.
+    start = timeit.default_timer()
+    xiv = load_dats(argparse.Namespace(game_path=game_path))
+    load_time = timeit.default_timer() - start
+    found = ADDNEW_SCANNERS[name](xiv)
+    return found, load_time, timeit.default_timer() - start - load_time
+
 
-        # Check if time restricted.
-        if fish_notes.as_boolean('TimeRestriction') and \
-                fish['startHour'] == 0 and fish['endHour'] == 24:
-            has_errors = True
-            logging.error('%s should be time restricted', fish['name'])
-        elif not fish_notes.as_boolean('TimeRestriction') and \
-                not (fish['startHour'] == 0 and fish['endHour'] == 24):
-            has_errors = True
-            logging.error('%s should not be time restricted', fish['name'])
-
-        # Check if weather restricted.
-        if fish_notes.as_boolean('WeatherRestriction') and \
-                len(fish['previousWeatherSet'] or []) == 0 and \
-                len(fish['weatherSet'] or []) == 0:
-            has_errors = True
-            logging.error('%s should be weather restricted', fish['name'])
-        elif not fish_notes.as_boolean('WeatherRestriction') and \
-                (len(fish['weatherSet'] or []) != 0 or
-                 len(fish['previousWeatherSet'] or []) != 0):
-            has_errors = True
-            logging.error('%s should not be weather restricted', fish['name'])
-
-        # Check if fish eyes or snagging should be set.
-        # This is not 100% accurate yet. According to crowd-sourced data, even when
-        # this check says Snagging isn't required, the majority of comments say it
-        # is needed. It doesn't help that it also seems to apply to Fish Eyes.
-        # NOTE: I've left the "Fish Eyes" check in there for now. I expect this
-        # table to undergo significant changes in 5.2... Please look forward to it.
-        fish_eyes_needed = fish.get('fishEyes') or False
-        snagging_needed = fish.get('snagging') or False
-        # As of Patch 6.4, the "Rare" field has been deleted. I think it might have been moved to
-        # FishingNoteInfo as "SpecialConditions".
-        if not fish_params['IsHidden'] and fish_notes['SpecialConditions']:
-            if fish_eyes_needed is False and snagging_needed is False:
-                has_errors = True
-                logging.error('%s should require Fish Eyes or Snagging', fish['name'])
-        elif snagging_needed is not False:
-            has_errors = True
-            logging.error('%s should not require Snagging', fish['name'])
-
-    if has_errors:
-        logging.error('Data integrity check failed...')
-
-    return not has_errors
+def _scan_for_fish(args):
+    """Runs every addnew scanner, in worker processes if --jobs is above 1.
+
+    Each worker has to open its own copy of the DATs, which takes far longer
+    than either scan, so that's only worth it when the scans themselves get
+    much slower than loading the DATs. Both costs are logged, to tell.
+
+    Returns an OrderedDict of scanner name -> candidates, with each fish key
+    kept only once (at its first location).
+
+    """
+    results = OrderedDict()
+    if args.jobs <= 1:
+        start = timeit.default_timer()
+        XIV.game_data  # Opens the DATs, unless something already has.
+        logging.info('Opened the DATs in %.3fs', timeit.default_timer() - start)
+        for name, scanner in ADDNEW_SCANNERS.items():
+            start = timeit.default_timer()
+            results[name] = (scanner(XIV), 0.0, timeit.default_timer() - start)
+    else:
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(ADDNEW_SCANNERS))) as executor:
+            futures = OrderedDict((name, executor.submit(_run_addnew_scanner, args.game_path, name))
+                                  for name in ADDNEW_SCANNERS)
+            for name, future in futures.items():
+                results[name] = future.result()
+        logging.info('Worker processes spent %.3fs opening the DATs, and %.3fs scanning',
+                     sum(load_time for _, load_time, _ in results.values()),
+                     sum(scan_time for _, _, scan_time in results.values()))
+
+    candidates = OrderedDict()
+    for name, (found, load_time, scan_time) in results.items():
+        unique = OrderedDict()
+        for key, fish_name, location in found:
+            unique.setdefault(key, (fish_name, location))
+        candidates[name] = unique
+        logging.info('Scanned %s: %u fish, %u unique (scan %.3fs)',
+                     name, len(found), len(unique), scan_time)
+    return candidates
 
 
 def add_new_fish_data(args):
     global XIV  # type: 'pysaintcoinach.ARealmReversed'
 
+    timings = OrderedDict()
+    start = timeit.default_timer()
+
     # Parse the fish data in the YAML file.
     fishes = yaml.load(open(args.existing_data, 'r', encoding='utf-8'), Loader=Loader)
     known_fishes = [fish['name'] for fish in fishes]
@@ -780,81 +1263,71 @@ def add_new_fish_data(args):
         with open(args.ignored_fish, 'r') as f:
             known_fishes += [fish.strip() for fish in f]
 
-    known_fishes = set(known_fishes)
+    known_names = NameIndex(((name, name) for name in known_fishes),
+                            tiers=('exact', 'folded', 'collapsed'))
+    timings['load'] = timeit.default_timer() - start
 
-    # Iterate all of the FishingSpot entries next, skipping any fish we already know about.
+    # Scan the FishingSpot and GatheringPoint sheets.
+    start = timeit.default_timer()
+    candidates = _scan_for_fish(args)
+    timings['scan'] = timeit.default_timer() - start
+
+    # Skip any fish we already know about.
+    start = timeit.default_timer()
     new_fishes = {}
 
-    from pysaintcoinach.xiv.fishing_spot import FishingSpot
-    for fishing_spot in XIV.game_data.get_sheet(FishingSpot):
-        if fishing_spot.place_name.key == 0:
+    for key, (fish_name, location) in candidates['FishingSpot'].items():
+        known_name, tier = known_names.find(fish_name)
+        if tier == 'exact':
             continue
-        if fishing_spot.get_raw("PlaceName{Main}") != 0:
-            # TODO: For now, exclude Ocean Fishing nodes.
+        if tier is not None:
+            # Tried a little harder (formatting?)
+            logging.warning("Fish name formatting mismatch. Have \"%s\" but DATs had \"%s\".",
+                            known_name, fish_name)
             continue
-        for fish in fishing_spot.items:
-            if str(fish.name) in known_fishes:
-                continue
-            # Try a little harder (formatting?)
-            misformatted_fish_name = next(filter(lambda n: n.lower() == str(fish.name).strip().lower()
-                                                           or n.lower().replace(' ', '') == str(fish.name).strip().lower().replace(' ', ''),
-                                                 known_fishes), None)
-            if misformatted_fish_name is not None:
-                logging.warning("Fish name formatting mismatch. Have \"%s\" but DATs had \"%s\".",
-                                misformatted_fish_name, str(fish.name))
-                continue
-
-            if fish.key not in new_fishes:
-
-                new_fishes[fish.key] = {
-                    'name': str(fish.name),
-                    'location': str(fishing_spot.place_name),
-                    'startHour': 0,
-                    'endHour': 24,
-                    'previousWeatherSet': None,
-                    'weatherSet': None,
-                    'bestCatchPath': None,
-                    'predators': None,
-                    'tug': None,
-                    'hookset': None,
-                    'lure': None,
-                    'snagging': None,
-                    'patch': float(args.patch),
-                    'dataMissing': True
-                }
+
+        if key not in new_fishes:
+
+            new_fishes[key] = {
+                'name': fish_name,
+                'location': location,
+                'startHour': 0,
+                'endHour': 24,
+                'previousWeatherSet': None,
+                'weatherSet': None,
+                'bestCatchPath': None,
+                'predators': None,
+                'tug': None,
+                'hookset': None,
+                'lure': None,
+                'snagging': None,
+                'patch': float(args.patch),
+                'dataMissing': True
+            }
 
     # Include spearfishing as well.
-    from pysaintcoinach.xiv.gathering_point import GatheringPoint
-    for gathering_point in XIV.game_data.get_sheet(GatheringPoint):
-        # We only care about spearfishing gathering points.
-        if gathering_point.base.type.key != 5:
+    for key, (fish_name, location) in candidates['GatheringPoint'].items():
+        if known_names.find(fish_name)[1] == 'exact':
             continue
-        for item in gathering_point.base.items:
-            if str(item.name) in known_fishes:
-                continue
-
-            if item.key not in new_fishes:
-                # Get the BASE gathering point only!
-                # This check is broken, but for now, it doesn't appear to trigger on any data.
-                # Revisit later please.
-                is_hidden = gathering_point['Count'] == 6  # super-sketch, but this is the field, Index: 2
-
-                new_fishes[item.key] = {
-                    'name': str(item.name),
-                    'location': gathering_point.base.key if is_hidden else str(gathering_point.place_name.name),
-                    'startHour': 0,
-                    'endHour': 24,
-                    'previousWeatherSet': None,
-                    'weatherSet': None,
-                    'bestCatchPath': None,
-                    'predators': None,
-                    'gig': 'UNKNOWN',
-                    'patch': float(args.patch),
-                    'dataMissing': True
-                }
-
-        # Dump the new fish data to a YAML file.
 
+        if key not in new_fishes:
+            new_fishes[key] = {
+                'name': fish_name,
+                'location': location,
+                'startHour': 0,
+                'endHour': 24,
+                'previousWeatherSet': None,
+                'weatherSet': None,
+                'bestCatchPath': None,
+                'predators': None,
+                'gig': 'UNKNOWN',
+                'patch': float(args.patch),
+                'dataMissing': True
+            }
+    timings['resolve'] = timeit.default_timer() - start
+    start = timeit.default_timer()
+
+    # Dump the new fish data to a YAML file.
     with open(args.new_data, 'w', encoding='utf-8') as f:
         # Exclude fish without a name.
         def exclude_nameless_fish(fish):
@@ -874,7 +1347,90 @@ def add_new_fish_data(args):
             else:
                 return '# %d *Unnamed fish* at %s' % (_id, fish['location'])
         f.writelines(['%s\n' % new_fish_name(_id, fish) for (_id, fish) in list(new_fishes.items())])
+    timings['write'] = timeit.default_timer() - start
+
+    known_names.log_stats('Known fish')
+    logging.info('Found %u new fish (%s)', len(new_fishes),
+                 ', '.join('%s %.3fs' % (phase, elapsed) for phase, elapsed in timings.items()))
+    return True
+
+
+def find_catch_windows(args):
+    """Writes the next catch windows of every fish (from a data.js) as JSON.
+
+    Uses catch_windows, which does what FishWatcher does in the browser, but
+    for every fish in one pass. Times are Eorzea milliseconds. Intuition
+    requirements aren't applied; those fish list their `predators` so the
+    windows can be checked against them.
+
+    """
+    from js_data import read_js_data
+    import catch_windows
+    from weather_forecast import WeatherTable, to_eorzea
+    import time
+
+    start = timeit.default_timer()
+    _, tables = read_js_data(args.js_file)
+    fishes = [catch_windows.fish_conditions(fish, tables['FISHING_SPOTS'], tables['SPEARFISHING_SPOTS'])
+              for fish in tables['FISH'].values()]
+    table = WeatherTable(tables['WEATHER_RATES'])
+
+    if args.start is None:
+        args.start = int(to_eorzea(time.time() * 1000))
+    windows = catch_windows.find_windows(fishes, table, args.start, args.count,
+                                         max_periods=args.max_periods)
+    fish_eyes_windows = catch_windows.find_windows([fish for fish in fishes if fish.fish_eyes],
+                                                   table, args.start, args.count,
+                                                   fish_eyes=True, max_periods=args.max_periods)
+
+    results = OrderedDict()
+    for fish in fishes:
+        entry = OrderedDict([('alwaysUp', catch_windows.is_always_up(fish)),
+                             ('windows', [list(w) for w in windows[fish.id]])])
+        if fish.fish_eyes:
+            entry['fishEyesAlwaysUp'] = catch_windows.is_always_up(fish, fish_eyes=True)
+            entry['fishEyesWindows'] = [list(w) for w in fish_eyes_windows[fish.id]]
+        if len(fish.predators) != 0:
+            entry['predators'] = fish.predators
+        results[str(fish.id)] = entry
+
+    incomplete = [fish.id for fish in fishes
+                  if not catch_windows.is_always_up(fish) and 0 < len(windows[fish.id]) < args.count]
+    never = [fish.id for fish in fishes
+             if not catch_windows.is_always_up(fish) and len(windows[fish.id]) == 0]
+    if len(never) != 0:
+        logging.warning('No windows found for %u fish: %s', len(never), ', '.join(map(str, never)))
+    if len(incomplete) != 0:
+        logging.warning('Fewer than %u windows found for %u fish', args.count, len(incomplete))
+
+    with open(args.out_file, 'w', encoding='utf-8') as f:
+        json.dump(OrderedDict([('start', args.start),
+                               ('count', args.count),
+                               ('fish', results)]), f, separators=(',', ':'))
+    logging.info('Wrote windows for %u fish to %s in %.3fs',
+                 len(fishes), args.out_file, timeit.default_timer() - start)
+    return True
+
+
+def compute_uptime_stats(args):
+    """Writes the uptime/rarity stats of every fish (from a data.js) as JSON.
 
+    This is the same table `rebuild --uptime` embeds as UPTIME.
+
+    """
+    from js_data import read_js_data
+
+    start = timeit.default_timer()
+    _, tables = read_js_data(args.js_file)
+    horizon_start = uptime_stats.default_start()
+    stats = uptime_stats.uptime_table(tables, horizon_start, args.periods)
+    with open(args.out_file, 'w', encoding='utf-8') as f:
+        json.dump(OrderedDict([('format', uptime_stats.UPTIME_FORMAT),
+                               ('start', horizon_start),
+                               ('periods', args.periods),
+                               ('fish', stats)]), f, separators=(',', ':'))
+    logging.info('Wrote uptime for %u fish to %s in %.3fs',
+                 len(stats), args.out_file, timeit.default_timer() - start)
     return True
 
 
@@ -898,6 +1454,33 @@ if __name__ == '__main__':
                                 help='Path to FF14 installation')
     parser_rebuild.add_argument('--with-icons', action='store_true', default=False,
                                 help='Extract missing icons')
+    parser_rebuild.add_argument('-j', '--jobs', type=int, default=1,
+                                help='Number of processes used to convert fish (default: 1)')
+    parser_rebuild.add_argument('--incremental', action='store_true', default=False,
+                                help='Only convert fish whose YAML entry changed since the last rebuild')
+    parser_rebuild.add_argument('--cache', type=str,
+                                default=os.path.join(_SCRIPT_PATH, '.rebuild_cache.json'),
+                                dest='cache_file',
+                                help='Where to store the incremental rebuild cache')
+    parser_rebuild.add_argument('--split', type=str, default=None,
+                                dest='split_dir',
+                                help='Also write the tables as per-expansion JSON chunks to this directory')
+    parser_rebuild.add_argument('--per-language', action='store_true', default=False,
+                                help='Also write a language-neutral core file plus one string file per language')
+    parser_rebuild.add_argument('--format', type=str, choices=['records', 'columnar'], default='records',
+                                help='Layout of the FISH table in the JS file (default: %(default)s)')
+    parser_rebuild.add_argument('--delta', action='store_true', default=False,
+                                help='Also write a delta from the previous JS file to the new one')
+    parser_rebuild.add_argument('--uptime', action='store_true', default=False,
+                                help='Also embed precomputed uptime stats (UPTIME) for every fish')
+    parser_rebuild.add_argument('--precompress', action='store_true', default=False,
+                                help='Write .gz/.br variants and record the digest in the asset manifest')
+    parser_rebuild.add_argument('--snapshot', type=str,
+                                default=os.path.join(_SCRIPT_PATH, '.data_snapshot.json'),
+                                dest='snapshot_file',
+                                help='Where to store the snapshot of tables read from the DATs')
+    parser_rebuild.add_argument('--refresh-snapshot', action='store_true', default=False,
+                                help='Ignore any existing snapshot and rebuild it from the DATs')
     parser_rebuild.set_defaults(func=rebuild_fish_data)
 
     parser_integrity = subparsers.add_parser('integrity',
@@ -910,6 +1493,19 @@ if __name__ == '__main__':
                                   default=r"C:\Program Files (x86)\SquareEnix\FINAL FANTASY XIV - A Realm Reborn",
                                   dest='game_path',
                                   help='Path to FF14 installation')
+    parser_integrity.add_argument('--snapshot', type=str,
+                                  default=os.path.join(_SCRIPT_PATH, '.data_snapshot.json'),
+                                  dest='snapshot_file',
+                                  help='Where to store the snapshot of tables read from the DATs')
+    parser_integrity.add_argument('--refresh-snapshot', action='store_true', default=False,
+                                  help='Ignore any existing snapshot and rebuild it from the DATs')
+    parser_integrity.add_argument('--report', type=str, default=None,
+                                  dest='report_file',
+                                  help='Also write a JSON report (findings and per-rule timings) here')
+    parser_integrity.add_argument('--watch', action='store_true', default=False,
+                                  help='Keep running, and recheck the YAML file whenever it changes')
+    parser_integrity.add_argument('--interval', type=float, default=0.5,
+                                  help='How often (in seconds) --watch checks the YAML file')
     parser_integrity.set_defaults(func=check_data_integrity)
 
     parser_addnew = subparsers.add_parser('addnew',
@@ -931,8 +1527,61 @@ if __name__ == '__main__':
     parser_addnew.add_argument('-x', '--ignore',
                                dest='ignored_fish',
                                help='List of fish to always ignore (one per line)')
+    parser_addnew.add_argument('-j', '--jobs', type=int, default=1,
+                               help='Scan FishingSpot and GatheringPoint in separate processes, '
+                                    'each opening its own copy of the DATs (default: 1, no processes)')
+    parser_addnew.add_argument('--snapshot', type=str,
+                               default=os.path.join(_SCRIPT_PATH, '.data_snapshot.json'),
+                               dest='snapshot_file',
+                               help='Where to store the snapshot of tables read from the DATs')
+    parser_addnew.add_argument('--refresh-snapshot', action='store_true', default=False,
+                               help='Ignore any existing snapshot and rebuild it from the DATs')
     parser_addnew.set_defaults(func=add_new_fish_data)
 
+    parser_diff = subparsers.add_parser('diff',
+                                        help='Writes the delta between two builds of data.js')
+    parser_diff.add_argument('old_file', type=str, help='Previous data.js')
+    parser_diff.add_argument('new_file', type=str, help='New data.js')
+    parser_diff.add_argument('-o', '--out', type=str, default=None,
+                             dest='delta_file',
+                             help='Where to store the delta (default: next to NEW, named after OLD\'s hash)')
+    parser_diff.set_defaults(func=lambda args: diff_files(args.old_file, args.new_file, args.delta_file),
+                             game_data=False)
+
+    parser_windows = subparsers.add_parser('windows',
+                                           help='Writes the next catch windows of every fish as JSON')
+    parser_windows.add_argument('--data', type=str,
+                                default=os.path.join(_SCRIPT_PATH, '..', 'js', 'app', 'data.js'),
+                                dest='js_file',
+                                help='data.js to read the fish and weather rates from')
+    parser_windows.add_argument('-o', '--out', type=str,
+                                default=os.path.join(_SCRIPT_PATH, 'catchWindows.json'),
+                                dest='out_file',
+                                help='Where to store the windows (JSON)')
+    parser_windows.add_argument('-n', '--count', type=int, default=10,
+                                help='Number of windows per fish (default: %(default)s)')
+    parser_windows.add_argument('--start', type=int, default=None,
+                                help='Eorzea time (ms) to start from (default: now)')
+    parser_windows.add_argument('--max-periods', type=int, default=100000,
+                                help='Give up on a fish after this many weather periods (default: %(default)s)')
+    parser_windows.set_defaults(func=find_catch_windows, game_data=False)
+
+    parser_uptime = subparsers.add_parser('uptime',
+                                          help='Writes uptime/rarity stats of every fish as JSON')
+    parser_uptime.add_argument('--data', type=str,
+                               default=os.path.join(_SCRIPT_PATH, '..', 'js', 'app', 'data.js'),
+                               dest='js_file',
+                               help='data.js to read the fish and weather rates from')
+    parser_uptime.add_argument('-o', '--out', type=str,
+                               default=os.path.join(_SCRIPT_PATH, 'uptime.json'),
+                               dest='out_file',
+                               help='Where to store the stats (JSON)')
+    parser_uptime.add_argument('--periods', type=int, default=uptime_stats.DEFAULT_PERIODS,
+                               help='Number of weather periods to simulate (default: %(default)s, one Earth year)')
+    parser_uptime.set_defaults(func=compute_uptime_stats, game_data=False)
+
     args = parser.parse_args()
-    initialize_data(args)
+    # Some commands only work with generated files, and don't need the DATs.
+    if getattr(args, 'game_data', True):
+        initialize_data(args)
     args.func(args)
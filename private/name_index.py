@@ -0,0 +1,234 @@
+from collections import Counter, OrderedDict
+import logging
+
+
+_MISSING = object()
+
+
+def _exact(name):
+    return name
+
+
+def _stripped(name):
+    return name.strip()
+
+
+def _folded(name):
+    return name.strip().casefold()
+
+
+def _collapsed(name):
+    # Gura... Some names lose (or gain) a space between words in the DATs.
+    return ''.join(name.split()).casefold()
+
+
+# Each tier is a progressively looser normalization of a name. Lookups try
+# the tiers in order, so an exact match always wins over a formatting match.
+NAME_TIERS = OrderedDict([
+    ('exact', _exact),
+    ('stripped', _stripped),
+    ('folded', _folded),
+    ('collapsed', _collapsed),
+])
+
+
+def _trigrams(name):
+    # Padded, so short names and word starts still get a few trigrams.
+    padded = '  %s ' % _collapsed(name)
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class NameNotFoundError(KeyError):
+    """
+    Raised by NameIndex.lookup when no tier resolves a name. *suggestions*
+    holds the closest (name, value) pairs, best first.
+    """
+
+    def __init__(self, name, suggestions=()):
+        super(NameNotFoundError, self).__init__(name)
+        self.name = name
+        self.suggestions = list(suggestions)
+
+    def __str__(self):
+        if len(self.suggestions) == 0:
+            return repr(self.name)
+        return '%r (did you mean %s?)' % (
+            self.name, ', '.join('"%s"' % name for name, _ in self.suggestions))
+
+
+class NameIndex(object):
+    """
+    Hash-based name resolution with increasingly forgiving match tiers.
+
+    Every name added to the index is stored under its normalized key for each
+    tier. When more than one name shares a key, the first one added wins, the
+    same as scanning the original table in order. A value may be added under
+    several names (e.g. an item's singular form); the first is its display
+    name.
+
+    Names that no tier resolves fall through to `suggest`, which ranks the
+    indexed names by how many trigrams they share with the one asked for.
+    """
+
+    def __init__(self, items=(), tiers=tuple(NAME_TIERS)):
+        self.__tiers = [(tier, NAME_TIERS[tier]) for tier in tiers]
+        self.__keys = dict((tier, {}) for tier in tiers)
+        self.__names = {}
+        self.__aliases = OrderedDict()
+        # trigram -> indexes into __aliases; built on the first miss.
+        self.__trigrams = None
+        self.stats = Counter()
+        for name, value in items:
+            self.add(name, value)
+
+    @property
+    def tiers(self): return [tier for tier, _ in self.__tiers]
+
+    def __len__(self):
+        return len(self.__names)
+
+    def add(self, name, value):
+        if name is None:
+            return
+        name = str(name)
+        for tier, normalize in self.__tiers:
+            self.__keys[tier].setdefault(normalize(name), value)
+        self.__names.setdefault(value, name)
+        if name not in self.__aliases:
+            self.__aliases[name] = value
+            self.__trigrams = None
+
+    def name_of(self, value):
+        return self.__names.get(value)
+
+    def find(self, name):
+        """
+        Returns a (value, tier) pair for *name*, or (None, None) if no tier
+        resolves it.
+        """
+        name = str(name)
+        for tier, normalize in self.__tiers:
+            value = self.__keys[tier].get(normalize(name), _MISSING)
+            if value is not _MISSING:
+                self.stats[tier] += 1
+                return value, tier
+        self.stats['missing'] += 1
+        return None, None
+
+    def lookup(self, name):
+        """
+        Returns the value for *name*. Raises NameNotFoundError (a KeyError)
+        with the closest suggestions if no tier resolves it.
+        """
+        value, tier = self.find(name)
+        if tier is None:
+            raise NameNotFoundError(name, self.suggest(name))
+        return value
+
+    def _trigram_index(self):
+        if self.__trigrams is None:
+            self.__trigrams = {}
+            for n, name in enumerate(self.__aliases):
+                for trigram in _trigrams(name):
+                    self.__trigrams.setdefault(trigram, []).append(n)
+        return self.__trigrams
+
+    def suggest(self, name, limit=5, cutoff=0.5):
+        """
+        Returns up to *limit* (name, value) pairs for the indexed names most
+        like *name*, best first. Candidates are the names sharing a trigram
+        with it, ranked by Dice coefficient; those scoring below *cutoff*
+        are dropped. Each value is suggested once, under its best name.
+        """
+        wanted = _trigrams(str(name))
+        index = self._trigram_index()
+        shared = Counter()
+        for trigram in wanted:
+            shared.update(index.get(trigram, ()))
+
+        aliases = list(self.__aliases.items())
+        scored = []
+        for n, count in shared.items():
+            alias, value = aliases[n]
+            score = 2.0 * count / (len(wanted) + len(_trigrams(alias)))
+            if score >= cutoff:
+                scored.append((-score, n))
+        scored.sort()
+
+        suggestions = []
+        seen = set()
+        for _, n in scored:
+            alias, value = aliases[n]
+            if value in seen:
+                continue
+            seen.add(value)
+            suggestions.append((alias, value))
+            if len(suggestions) == limit:
+                break
+        return suggestions
+
+    def log_stats(self, label):
+        logging.info('%s name lookups: %s', label,
+                     ', '.join('%s=%u' % (tier, self.stats[tier])
+                               for tier in self.tiers + ['missing']))
+
+
+class NameMatcher(object):
+    """
+    Resolves a fixed set of wanted names against a stream of candidates.
+
+    The wanted names are normalized once up front, so each candidate costs a
+    handful of dict probes. Every wanted name remembers the tightest tier it
+    was matched by, which is what the missing-name diagnostics are built on.
+    """
+
+    def __init__(self, names, tiers=tuple(NAME_TIERS)):
+        self.__tiers = [(tier, NAME_TIERS[tier]) for tier in tiers]
+        self.__wanted = dict((tier, {}) for tier in tiers)
+        self.__resolved = {}
+        self.stats = Counter()
+        for name in names:
+            for tier, normalize in self.__tiers:
+                self.__wanted[tier].setdefault(normalize(name), []).append(name)
+
+    def match(self, candidate):
+        """
+        Returns the tightest tier matching *candidate*, or None.
+        """
+        candidate = str(candidate)
+        best = None
+        for rank, (tier, normalize) in enumerate(self.__tiers):
+            names = self.__wanted[tier].get(normalize(candidate))
+            if not names:
+                continue
+            for name in names:
+                if self.__resolved.get(name, rank + 1) > rank:
+                    self.__resolved[name] = rank
+            if best is None:
+                best = tier
+        if best is not None:
+            self.stats[best] += 1
+        return best
+
+    def resolved_tier(self, name):
+        rank = self.__resolved.get(name)
+        return self.__tiers[rank][0] if rank is not None else None
+
+    def unresolved(self, names=None):
+        """
+        Returns the wanted names (or the subset *names*) that no candidate
+        matched, in sorted order.
+        """
+        if names is None:
+            names = set(_flatten_values(self.__wanted[self.__tiers[0][0]]))
+        return sorted(filter(lambda name: name not in self.__resolved, names))
+
+    def log_stats(self, label):
+        logging.info('%s matches: %s', label,
+                     ', '.join('%s=%u' % (tier, self.stats[tier])
+                               for tier, _ in self.__tiers))
+
+
+def _flatten_values(d):
+    for values in d.values():
+        yield from values
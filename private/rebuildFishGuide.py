@@ -3,6 +3,11 @@ import sys
 import logging
 import json
 
+from localized_fields import extract_localized_column
+from sheet_index import SheetIndex
+from js_data import write_js_const, write_per_language_const
+from asset_manifest import update_assets
+
 logging.basicConfig(level=logging.INFO, stream=sys.stderr)
 if os.environ.get('SILENCE_PYSAINTCOINACH'):
     logging.getLogger('pysaintcoinach').setLevel(logging.WARNING)
@@ -18,15 +23,6 @@ except:
 _HELPER_LIBS_PATH = _SCRIPT_PATH
 
 
-def first(iterable, pred, default=None):
-    """Returns the first item for which pred(item) is true.
-
-    If no true value is found, returns *default*
-
-    """
-    return next(filter(pred, iterable), default)
-
-
 def _init_saintcoinach(args):
     global XIV
 
@@ -68,37 +64,9 @@ def _init_saintcoinach(args):
     return XIV
 
 
-def _make_localized_field(fld_name, row, col_name):
-    from pysaintcoinach.ex import IMultiRow
-    from pysaintcoinach.xiv import IXivRow
-
-    global LANGUAGES
-
-    if isinstance(row, IXivRow):
-        row = row.source_row
-    if not isinstance(row, IMultiRow):
-        raise TypeError('Expected row to be a IMultiRow')
-
-    def try_get_value(row, col_name, lang):
-        try:
-            value = str(row[(col_name, lang)])
-            if value != '':
-                return value
-            # Fall through if value is blank!
-        except KeyError:
-            pass
-
-        # Use the default language name instead...
-        value = str(row[col_name])
-        logging.debug("Missing %s data for %s[%u][%s], using \"%s\" instead.",
-                        lang.name,
-                        row.sheet.name,
-                        row.key,
-                        col_name,
-                        value)
-        return value
-
-    return map(lambda lang: (fld_name + lang.get_suffix(), try_get_value(row, col_name, lang)), LANGUAGES)
+def _localize_column(sheet_name, col_name, keys, fld_name):
+    return extract_localized_column(XIV.game_data.get_sheet(sheet_name), col_name, keys,
+                                    fld_name, LANGUAGES, convert=str)
 
 
 def _build_fish_infos():
@@ -113,18 +81,32 @@ def _build_fish_infos():
     fish_in_log = [x for x in XIV.game_data.get_sheet('FishParameter')
                    if x.get_raw('Item') != 0 and x.is_in_log]
 
-    fish_infos = []
-
     # The fishing guide in game has some funky ordering going on. It's primarily
     # sorted by FishPaarameter[7], and then by FishParameter.key...
+    fish_in_log = sorted(fish_in_log, key=lambda x: (x[7], x.key))
+
+    fish_notes_index = SheetIndex(XIV.game_data.get_sheet('FishingNoteInfo'))
+
+    # Localize each column in bulk, rather than row by row.
+    fish_keys = [fish.key for fish in fish_in_log]
+    names = _localize_column('Item', 'Name', [fish.item.key for fish in fish_in_log], 'name')
+    descs = _localize_column('FishParameter', 'Text', fish_keys, 'desc')
+    records = _localize_column('FishParameter', 'FishingRecordType', fish_keys, 'record')
+    regions = _localize_column('PlaceName', 'Name',
+                               [fish['FishingSpot'].territory_type.region_place_name.key
+                                for fish in fish_in_log], 'region')
+    zones = _localize_column('PlaceName', 'Name',
+                             [fish['FishingSpot'].territory_type.place_name.key
+                              for fish in fish_in_log], 'zone')
 
-    for fish in sorted(fish_in_log, key=lambda x: (x[7], x.key)):
-        fish_notes = first(XIV.game_data.get_sheet('FishingNoteInfo'),
-                           lambda r: r.get_raw('Item') == fish.item.key)
+    fish_infos = []
+
+    for fish in fish_in_log:
+        fish_notes = fish_notes_index.first(fish.item.key)
         fish_info = dict([
             ('id', fish.item.key),
-            *_make_localized_field('name', fish.item, 'Name'),
-            *_make_localized_field('desc', fish, 'Text'),
+            *names[fish.item.key].items(),
+            *descs[fish.key].items(),
             ('icon', '%06u' % fish.item.get_raw('Icon')),
             ('extra_icon', '%06u' % (fish.item.get_raw('Icon') + 50000)),
             ('level', [x for x in fish['GatheringItemLevel'].column_values]),
@@ -134,10 +116,10 @@ def _build_fish_infos():
             ('collectable', fish.item.is_collectable),
             ('rarity', fish.item.rarity),
             # TODO: These should be normalized to reduce data size
-            *_make_localized_field('record', fish, 'FishingRecordType'),
+            *records[fish.key].items(),
             # TODO: Normalize the two fields by reusing existing data in DATA.[REGIONS|ZONES]
-            *_make_localized_field('region', fish['FishingSpot'].territory_type.region_place_name, 'Name'),
-            *_make_localized_field('zone', fish['FishingSpot'].territory_type.place_name, 'Name'),
+            *regions[fish['FishingSpot'].territory_type.region_place_name.key].items(),
+            *zones[fish['FishingSpot'].territory_type.place_name.key].items(),
             ])
         fish_infos += [fish_info]
 
@@ -161,11 +143,11 @@ def _update_icons(fish_infos):
 
 
 def _output_javascript(args, fish_infos):
-    def pretty_dump(obj):
-        return json.dumps(obj, sort_keys=False, indent=2, ensure_ascii=False).replace('\n', '\n  ')
-
-    with open(args.js_file, 'w', encoding='utf-8') as f:
-        f.write('const FISH_INFO = %s;' % pretty_dump(fish_infos))
+    write_js_const(args.js_file, 'FISH_INFO', fish_infos)
+    if args.per_language:
+        write_per_language_const(args.js_file, 'FISH_INFO', fish_infos, 'id')
+    if args.precompress:
+        update_assets([args.js_file])
 
 
 if __name__ == '__main__':
@@ -182,6 +164,10 @@ if __name__ == '__main__':
                         help='Path to FF14 installation')
     parser.add_argument('--with-icons', action='store_true', default=False,
                         help='Extract missing icons')
+    parser.add_argument('--per-language', action='store_true', default=False,
+                        help='Also write a language-neutral core file plus one string file per language')
+    parser.add_argument('--precompress', action='store_true', default=False,
+                        help='Write .gz/.br variants and record the digest in the asset manifest')
 
     args = parser.parse_args()
 
@@ -0,0 +1,237 @@
+from collections import OrderedDict, namedtuple
+import logging
+import timeit
+
+
+class SheetIndex(object):
+    """
+    Reverse index (multimap) over a single sheet.
+
+    The sheet is walked exactly once. Each row is filed under the value
+    returned by *key*, which is either a column name (read with `get_raw`)
+    or a callable taking the row. Rows keep their original sheet order, so
+    `first()` returns the same row a linear `first(sheet, pred)` scan would.
+    """
+
+    def __init__(self, sheet, key='Item', skip=(0, None)):
+        self.__name = getattr(sheet, 'name', str(sheet))
+        self.__rows = OrderedDict()
+        self.__row_count = 0
+
+        if callable(key):
+            get_key = key
+        else:
+            get_key = lambda row: row.get_raw(key)
+
+        start = timeit.default_timer()
+        for row in sheet:
+            self.__row_count += 1
+            row_key = get_key(row)
+            if row_key in skip:
+                continue
+            self.__rows.setdefault(row_key, []).append(row)
+        self.__build_time = timeit.default_timer() - start
+
+        logging.debug('Indexed %s: %u rows, %u keys in %.3fs',
+                      self.__name, self.__row_count, len(self.__rows), self.__build_time)
+
+    @property
+    def name(self): return self.__name
+
+    @property
+    def build_time(self): return self.__build_time
+
+    @property
+    def row_count(self): return self.__row_count
+
+    @property
+    def size(self): return len(self.__rows)
+
+    def __contains__(self, key):
+        return key in self.__rows
+
+    def __len__(self):
+        return len(self.__rows)
+
+    def keys(self):
+        return self.__rows.keys()
+
+    def first(self, key, default=None):
+        rows = self.__rows.get(key)
+        return rows[0] if rows else default
+
+    def get_all(self, key):
+        return self.__rows.get(key, [])
+
+
+class SheetIndexCache(object):
+    """
+    Builds sheet indexes on first use and reuses them for the rest of the run.
+    """
+
+    def __init__(self, game_data):
+        self.__game_data = game_data
+        self.__indexes = OrderedDict()
+
+    def get(self, sheet_name, key='Item'):
+        cache_key = (sheet_name, key)
+        if cache_key not in self.__indexes:
+            self.__indexes[cache_key] = SheetIndex(self.__game_data.get_sheet(sheet_name), key)
+        return self.__indexes[cache_key]
+
+    def __iter__(self):
+        return iter(self.__indexes.values())
+
+    def log_stats(self):
+        for index in self:
+            logging.info('Sheet index %s: %u rows -> %u keys in %.3fs',
+                         index.name, index.row_count, index.size, index.build_time)
+
+
+class JoinSpec(namedtuple('JoinSpec', 'sheet columns project where')):
+    """
+    Declares a join between a set of keys (usually item keys) and a sheet.
+
+    *columns* are the names of the columns holding keys (read with
+    `get_raw`), or a callable taking the row and returning (key, slot)
+    pairs. *project* takes the row and the slot (the index of the matching
+    column) and returns the value recorded for the match; by default, the
+    row's key. If given, *where* is checked first, and rows it rejects are
+    skipped without reading any key columns.
+    """
+    __slots__ = ()
+
+    def __new__(cls, sheet, columns, project=None, where=None):
+        return super(JoinSpec, cls).__new__(cls, sheet, columns, project, where)
+
+
+class PlainRow(object):
+    """
+    A row's key and the values of a few of its columns, pulled out of the
+    sheet by `extract_rows`. It reads like a sheet row (`row[column]` and
+    `row.get_raw(column)`), but holds plain values, so it can be sent to
+    another process.
+    """
+    __slots__ = ('key', 'values')
+
+    def __init__(self, key, values):
+        self.key = key
+        self.values = values
+
+    def __getitem__(self, column):
+        return self.values[column]
+
+    def get_raw(self, column):
+        return self.values[column]
+
+
+def extract_rows(rows, columns, where=None):
+    """
+    Reads *columns* out of *rows* in a single pass, as a list of PlainRow.
+
+    *columns* maps each field to either a column name (read with `get_raw`)
+    or a callable taking the row. If given, *where* is checked first, and
+    rows it rejects are left out without reading any columns.
+    """
+    readers = [(field, column if callable(column) else
+                (lambda column: lambda row: row.get_raw(column))(column))
+               for field, column in columns.items()]
+    return [PlainRow(row.key, dict((field, read(row)) for field, read in readers))
+            for row in rows
+            if where is None or where(row)]
+
+
+def hash_join(rows, spec, keys):
+    """
+    Joins *keys* against *rows* (the spec's sheet) in a single pass.
+
+    Returns an OrderedDict (multimap) mapping each key that was matched to
+    the list of projections of its matches, in sheet order.
+    """
+    keys = keys if isinstance(keys, (set, frozenset, dict)) else set(keys)
+    project = spec.project or (lambda row, slot: row.key)
+    where = spec.where
+
+    matches = OrderedDict()
+    row_count = 0
+    start = timeit.default_timer()
+    if callable(spec.columns):
+        for row in rows:
+            row_count += 1
+            if where is not None and not where(row):
+                continue
+            for key, slot in spec.columns(row):
+                if key in keys:
+                    matches.setdefault(key, []).append(project(row, slot))
+    else:
+        columns = list(enumerate(spec.columns))
+        for row in rows:
+            row_count += 1
+            if where is not None and not where(row):
+                continue
+            get_raw = row.get_raw
+            for slot, column in columns:
+                key = get_raw(column)
+                if key in keys:
+                    matches.setdefault(key, []).append(project(row, slot))
+
+    logging.debug('Joined %s: %u rows, %u keys matched in %.3fs',
+                  spec.sheet, row_count, len(matches), timeit.default_timer() - start)
+    return matches
+
+
+def benchmark(row_count=5000, key_count=300, columns=8, number=3):
+    """
+    Compares `hash_join` with the nested loops it replaces, on a synthetic
+    sheet of *row_count* rows with *columns* key columns each:
+
+    - a scan of the whole sheet per key (like scrip turn-ins did), and
+    - a pass over the rows checking each column against a dict (like the
+      recipe scanner), reading columns through the same row interface.
+
+    Returns (nested seconds, per-row seconds, join seconds).
+    """
+    import random
+
+    rng = random.Random(1234)
+    names = ['Item%u' % n for n in range(columns)]
+    rows = [PlainRow(n, dict((name, rng.randrange(key_count * 20)) for name in names))
+            for n in range(row_count)]
+    keys = set(rng.sample(range(key_count * 20), key_count))
+    spec = JoinSpec('Synthetic', names)
+
+    def nested():
+        found = {}
+        for key in sorted(keys):
+            for row in rows:
+                if any(row.get_raw(name) == key for name in names):
+                    found.setdefault(key, []).append(row.key)
+        return found
+
+    def per_row():
+        found = {}
+        for row in rows:
+            for name in names:
+                value = row.get_raw(name)
+                if value in keys:
+                    found.setdefault(value, []).append(row.key)
+        return found
+
+    expected = dict((k, sorted(v)) for k, v in per_row().items())
+    if dict((k, sorted(v)) for k, v in hash_join(rows, spec, keys).items()) != expected:
+        raise AssertionError('hash_join disagrees with the nested loops')
+
+    nested_time = timeit.timeit(nested, number=1)
+    per_row_time = min(timeit.repeat(per_row, number=1, repeat=number))
+    join_time = min(timeit.repeat(lambda: hash_join(rows, spec, keys), number=1, repeat=number))
+    return nested_time, per_row_time, join_time
+
+
+if __name__ == '__main__':
+    import sys
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    nested_time, per_row_time, join_time = benchmark()
+    logging.info('Nested scan per key: %.3fs; column loop per row: %.3fs; hash join: %.3fs (%.0fx, %.1fx)',
+                 nested_time, per_row_time, join_time,
+                 nested_time / join_time, per_row_time / join_time)
@@ -0,0 +1,45 @@
+from collections import OrderedDict
+import json
+
+import pytest
+
+from columnar import decode_bitmap, decode_table, encode_bitmap, encode_table
+
+
+@pytest.mark.parametrize('bits', [[], [True], [False] * 9, [n % 3 == 0 for n in range(37)]])
+def test_bitmap_round_trip(bits):
+    assert decode_bitmap(encode_bitmap(bits), len(bits)) == bits
+
+
+def _table():
+    table = OrderedDict()
+    for n in range(40):
+        table[str(1000 + n)] = OrderedDict([
+            ('_id', 1000 + n),
+            ('name', 'Fish %u' % n),
+            ('bigFish', n % 10 == 0),
+            ('weatherSet', [1, 2] if n % 4 == 0 else []),
+            ('hookset', None if n % 3 else 'Powerful'),
+            ('patch', 2.0 if n < 30 else 6.1),
+            ('dataMissing', 0 if n % 5 else False),
+        ])
+    return table
+
+
+def test_table_round_trip():
+    table = _table()
+    encoded = encode_table(table)
+    # Must survive JSON, which is how it's shipped.
+    decoded = decode_table(json.loads(json.dumps(encoded)))
+    assert json.dumps(decoded) == json.dumps(table)
+
+
+def test_decoded_defaults_are_not_shared():
+    decoded = decode_table(encode_table(_table()))
+    decoded['1001']['weatherSet'].append(9)
+    assert decoded['1002']['weatherSet'] == []
+
+
+def test_mismatched_fields():
+    with pytest.raises(ValueError):
+        encode_table(OrderedDict([('1', {'a': 1}), ('2', {'b': 1})]))
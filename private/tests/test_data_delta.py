@@ -0,0 +1,48 @@
+from collections import OrderedDict
+
+import pytest
+
+from data_delta import apply_delta, make_delta
+from js_data import FOLDABLE, format_js_tables
+
+
+def _data_js(tables, newline='\n'):
+    return format_js_tables('DATA', tables.items(), FOLDABLE).replace('\n', newline)
+
+
+def _tables():
+    return OrderedDict([
+        ('FISH', OrderedDict((str(n), {'_id': n, 'name': 'Fish %u' % n}) for n in range(10))),
+        ('ZONES', OrderedDict([('1', {'name_en': 'Limsa'}), ('2', {'name_en': 'Gridania'})])),
+        ('VERSION', 1),
+    ])
+
+
+def _edited():
+    tables = _tables()
+    del tables['FISH']['3']
+    tables['FISH']['4']['name'] = 'Renamed'
+    tables['FISH']['42'] = {'_id': 42, 'name': 'New'}
+    tables['ZONES'] = OrderedDict(reversed(list(tables['ZONES'].items())))
+    tables['VERSION'] = 2
+    tables['UPTIME'] = OrderedDict([('1', {'uptime': 0.5})])
+    return tables
+
+
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+def test_round_trip(newline):
+    old, new = _data_js(_tables(), newline), _data_js(_edited(), newline)
+    delta = make_delta(old, new)
+    assert set(delta['tables']) == {'FISH', 'ZONES', 'VERSION', 'UPTIME'}
+    assert apply_delta(old, delta) == new
+
+
+def test_unchanged_tables_are_left_out():
+    old = _data_js(_tables())
+    assert make_delta(old, old)['tables'] == OrderedDict()
+
+
+def test_wrong_base():
+    old, new = _data_js(_tables()), _data_js(_edited())
+    with pytest.raises(ValueError):
+        apply_delta(new, make_delta(old, new))
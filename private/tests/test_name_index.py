@@ -0,0 +1,60 @@
+import pytest
+
+from name_index import NameIndex, NameMatcher, NameNotFoundError
+
+
+@pytest.fixture
+def names():
+    return NameIndex([('Mahi-mahi', 1), ('Gura Fish', 2), ('Sea Bo', 3), ('sea bo', 4)])
+
+
+def test_exact_wins_over_looser_tiers(names):
+    assert names.find('Sea Bo') == (3, 'exact')
+    assert names.find('sea bo') == (4, 'exact')
+
+
+@pytest.mark.parametrize('name, value, tier', [
+    ('Mahi-mahi ', 1, 'stripped'),
+    ('MAHI-MAHI', 1, 'folded'),
+    ('GuraFish', 2, 'collapsed'),
+    ('gura  fish', 2, 'collapsed'),
+])
+def test_looser_tiers(names, name, value, tier):
+    assert names.find(name) == (value, tier)
+
+
+def test_missing(names):
+    assert names.find('Coelacanth') == (None, None)
+    assert names.stats['missing'] == 1
+
+
+def test_first_name_added_wins():
+    names = NameIndex([('Fish', 1), ('FISH', 2)])
+    assert names.find('fish') == (1, 'folded')
+    assert names.name_of(1) == 'Fish'
+
+
+def test_lookup_suggests_near_misses(names):
+    with pytest.raises(NameNotFoundError) as e:
+        names.lookup('Mahi-mahj')
+    assert isinstance(e.value, KeyError)
+    assert e.value.suggestions[0] == ('Mahi-mahi', 1)
+    assert 'did you mean "Mahi-mahi"' in str(e.value)
+
+
+def test_suggest_each_value_once():
+    names = NameIndex([('Grass Carp', 1), ('the grass carp', 1), ('Glass Carp', 2)])
+    assert [value for _, value in names.suggest('Grass Crap', cutoff=0.3)] == [1, 2]
+
+
+def test_suggest_cutoff():
+    assert NameIndex([('Mahi-mahi', 1)]).suggest('Coelacanth') == []
+
+
+def test_matcher_remembers_tightest_tier():
+    matcher = NameMatcher(['Gura Fish', 'Sea Bo'])
+    assert matcher.match('GuraFish') == 'collapsed'
+    assert matcher.match('Gura Fish') == 'exact'
+    assert matcher.match('Coelacanth') is None
+    assert matcher.resolved_tier('Gura Fish') == 'exact'
+    assert matcher.unresolved() == ['Sea Bo']
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from sheet_index import JoinSpec, PlainRow, SheetIndex, extract_rows, hash_join
+
+COLUMNS = ['Item[%u]' % n for n in range(4)]
+
+
+def _rows(count=500, seed=1):
+    rng = random.Random(seed)
+    return [PlainRow(n, dict((column, rng.randrange(200)) for column in COLUMNS))
+            for n in range(count)]
+
+
+def _nested(rows, keys, columns):
+    found = {}
+    for key in keys:
+        for row in rows:
+            for slot, column in enumerate(columns):
+                if row.get_raw(column) == key:
+                    found.setdefault(key, []).append((row.key, slot))
+    return found
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_hash_join_matches_nested_loops(seed):
+    rows = _rows(seed=seed)
+    keys = set(random.Random(seed).sample(range(200), 30))
+    spec = JoinSpec('Synthetic', COLUMNS, lambda row, slot: (row.key, slot))
+    joined = hash_join(rows, spec, keys)
+    # Same matches, and each key's matches in sheet order.
+    assert dict(joined) == dict((k, sorted(v)) for k, v in _nested(rows, keys, COLUMNS).items())
+
+
+def test_hash_join_with_callable_columns_and_where():
+    rows = _rows()
+    keys = set(range(0, 200, 7))
+    spec = JoinSpec('Synthetic', lambda row: [(row['Item[1]'], 1)],
+                    where=lambda row: row.key % 2 == 0)
+    expected = dict((k, [key for key, _ in v])
+                    for k, v in _nested([r for r in rows if r.key % 2 == 0], keys, COLUMNS).items()
+                    for v in [[m for m in v if m[1] == 1]] if v)
+    assert dict(hash_join(rows, spec, keys)) == expected
+
+
+def test_sheet_index_first_is_first_in_sheet_order():
+    rows = _rows()
+    index = SheetIndex(rows, key='Item[0]')
+    for key in index.keys():
+        assert index.first(key) is next(row for row in rows if row.get_raw('Item[0]') == key)
+    assert index.first(-1) is None
+    assert index.get_all(-1) == []
+
+
+def test_extract_rows():
+    rows = _rows(20)
+    plain = extract_rows(rows, {'a': 'Item[0]', 'b': lambda row: row['Item[1]'] * 2},
+                         where=lambda row: row.key > 10)
+    assert [row.key for row in plain] == list(range(11, 20))
+    for row in plain:
+        source = rows[row.key]
+        assert row['a'] == source['Item[0]']
+        assert row.get_raw('b') == source['Item[1]'] * 2
@@ -0,0 +1,106 @@
+import random
+
+import numpy as np
+import pytest
+
+import catch_windows
+from catch_windows import FishConditions
+from weather_forecast import PERIOD_MS, WeatherTable
+from window_index import WindowIndex, brute_force_up_at
+
+HOUR_MS = catch_windows.HOUR_MS
+
+WEATHER_RATES = {
+    '1': {'weather_rates': [[1, 30], [2, 60], [3, 100]]},
+    '2': {'weather_rates': [[4, 50], [5, 100]]},
+}
+
+FISHES = [
+    FishConditions(1, 1, [1], [], 0, 24, False, []),
+    FishConditions(2, 1, [2, 3], [1], 8, 16, False, []),
+    FishConditions(3, 2, [], [], 22, 3, False, []),
+    FishConditions(4, 2, [5], [4], 0, 24, True, []),
+    FishConditions(5, 1, [], [], 0, 24, False, []),
+    FishConditions(6, 2, [4], [], 4.5, 12, False, []),
+]
+
+START = 1234567 * PERIOD_MS + 3 * HOUR_MS
+END = START + 300 * PERIOD_MS
+
+
+@pytest.fixture(scope='module')
+def table():
+    return WeatherTable(WEATHER_RATES)
+
+
+@pytest.fixture(scope='module')
+def windows(table):
+    return catch_windows.windows_between(FISHES, table, START, END)
+
+
+def _times(count=300, seed=1):
+    rng = random.Random(seed)
+    return [rng.randrange(START, END) for _ in range(count)]
+
+
+def _opening(windows, start, end):
+    # Windows open at START were already open before it.
+    return sorted((fish_id, s) for fish_id, (starts, _) in windows.items()
+                  for s in starts.tolist() if start <= s < end and s > START)
+
+
+def test_up_at_matches_brute_force(table, windows):
+    index = WindowIndex(FISHES, table, START, END)
+    for t in _times():
+        assert sorted(set(w.fish for w in index.up_at(t))) == sorted(brute_force_up_at(windows, t))
+
+
+def test_opening_between_matches_brute_force(table, windows):
+    index = WindowIndex(FISHES, table, START, END)
+    for t in _times(100) + [START]:
+        end = min(t + 2 * PERIOD_MS, END)
+        assert sorted((w.fish, w.start) for w in index.opening_between(t, end)) == \
+            _opening(windows, t, end)
+
+
+def test_extend_in_steps_matches_one_build(table):
+    whole = WindowIndex(FISHES, table, START, END)
+    stepped = WindowIndex(FISHES, table, START)
+    rng = random.Random(2)
+    t = START
+    while t < END:
+        t = min(END, t + rng.randrange(1, 40) * PERIOD_MS + rng.randrange(PERIOD_MS))
+        stepped.extend(t)
+    assert len(stepped) == len(whole)
+    for t in _times(100, seed=3):
+        end = min(t + 10 * HOUR_MS, END)
+        assert stepped.up_between(t, end) == whole.up_between(t, end)
+        assert stepped.opening_between(t, end) == whole.opening_between(t, end)
+
+
+def test_advance_keeps_answers(table, windows):
+    index = WindowIndex(FISHES, table, START)
+    step = 25 * PERIOD_MS
+    for n in range(1, 12):
+        index.extend(START + (n + 1) * step)
+        index.advance(START + n * step)
+        for t in _times(20, seed=n):
+            if index.start <= t < index.end:
+                assert sorted(set(w.fish for w in index.up_at(t))) == \
+                    sorted(brute_force_up_at(windows, t))
+    # Old windows are really dropped.
+    assert len(index) < len(WindowIndex(FISHES, table, START, index.end))
+
+
+def test_span_is_checked(table):
+    index = WindowIndex(FISHES, table, START, END)
+    with pytest.raises(ValueError):
+        index.up_at(START - 1)
+    with pytest.raises(ValueError):
+        index.up_between(START, END + 1)
+
+
+def test_always_up_fish_has_one_window(table):
+    index = WindowIndex(FISHES, table, START, END)
+    assert [(w.start, w.end) for w in index.up_at(START) if w.fish == 5] == [(START, END)]
+    assert np.all([w.fish != 5 for w in index.opening_between(START, END)])
@@ -1,11 +1,12 @@
-from datetime import datetime
-from datetime import timezone
 from pathlib import Path
 from argparse import ArgumentParser
+from collections import OrderedDict
 import logging
 import sys
 import re
-import tempfile
+
+from asset_manifest import MANIFEST_PATH, update_assets, asset_key, digest_token
+from js_data import atomic_open
 
 logging.basicConfig(level=logging.INFO, stream=sys.stderr)
 
@@ -14,45 +15,72 @@ PAGES = [Path('./index.html'),
          Path('./trainpass/index.html')]
 
 
-def _update_cache_busters(assets=[], patch=None, all=False, timestamp=None):
+JS_ASSET_PAT = re.compile(r'<script type="text/javascript" src="/?([^?]+)\?([^"]+)"></script>')
+CSS_ASSET_PAT = re.compile(r'<link rel="stylesheet" href="/?([^?]+)\?([^"]+)"\s*/>')
+
+
+def _referenced_assets():
+    # Every local asset the pages reference with a cache buster.
+    assets = OrderedDict()
+    for page in PAGES:
+        text = page.read_text(encoding='utf-8')
+        for pat in (JS_ASSET_PAT, CSS_ASSET_PAT):
+            for m in pat.finditer(text):
+                if Path(m.group(1)).exists():
+                    assets[m.group(1)] = None
+    return list(assets)
+
+
+def _update_cache_busters(assets=[], patch=None, all=False, timestamp=None, manifest=MANIFEST_PATH):
+    if all:
+        assets = _referenced_assets()
     assets = list(filter(lambda x: x.endswith('.js') or x.endswith('.css') or x == 'sprite.png', assets))
     logging.info("Assets to update: %r", assets)
 
     if timestamp is None:
-        timestamp = datetime.now(timezone.utc).strftime('%Y%m%d_%H%M')
+        # Use the content digest, so assets that did not change keep their URL
+        # (and stay in the browser cache).
+        asset_manifest, changed = update_assets(assets, manifest)
+        busters = dict((asset, digest_token(asset_manifest['assets'][asset_key(asset)]))
+                       for asset in assets)
+        logging.info("Assets with new digests: %r", changed)
+    else:
+        busters = dict((asset, timestamp) for asset in assets)
 
-    JS_ASSET_PAT = re.compile(r'<script type="text/javascript" src="/?([^?]+)\?([^"]+)"></script>')
-    CSS_ASSET_PAT = re.compile(r'<link rel="stylesheet" href="/?([^?]+)\?([^"]+)"\s*/>')
+    def update_asset_buster(m: re.Match) -> str:
+        asset = m.group(1)
+        if asset not in busters:
+            return m.group(0)
+        buster = busters[asset]
+        if patch is not None and (asset.endswith('/data.js') or asset.endswith('/fish_info_data.js')):
+            buster = f'{patch}_{buster}'
+        return m.string[m.start():m.start(2)] + buster + m.string[m.end(2):m.end()]
 
     for page in PAGES:
+        original = page.read_text(encoding='utf-8')
         output = ''
-        with page.open('rt', encoding='utf-8') as fin:
-            for line in fin:
-                def update_asset_timestamp(m: re.Match) -> str:
-                    if m.group(1) in assets:
-                        asset = m.group(1)
-                        new_line = m.string[m.start():m.start(2)]
-                        if patch is not None and (asset.endswith('/data.js') or asset.endswith('/fish_info_data.js')):
-                            new_line += f'{patch}_'
-                        new_line += timestamp
-                        new_line += m.string[m.end(2):m.end()]
-                        return new_line
-                    else:
-                        return m.string[m.start():m.end()]
-                line = JS_ASSET_PAT.sub(update_asset_timestamp, line)
-                line = CSS_ASSET_PAT.sub(update_asset_timestamp, line)
-                output += line
-
-        # with page.with_suffix(page.suffix + '.new').open('wt', encoding='utf-8') as fout:
-        with page.open('wt', encoding='utf-8') as fout:
+        for line in original.splitlines(keepends=True):
+            line = JS_ASSET_PAT.sub(update_asset_buster, line)
+            line = CSS_ASSET_PAT.sub(update_asset_buster, line)
+            output += line
+
+        # Leave the page alone unless one of its cache busters changed.
+        if output == original:
+            logging.info("%s is up-to-date", page)
+            continue
+        with atomic_open(str(page)) as fout:
             fout.write(output)
+        logging.info("Updated %s", page)
 
 
 if __name__ == '__main__':
     parser = ArgumentParser()
     parser.add_argument('-p', '--patch', type=str, help='Current patch version (used for specific cache busters)')
     parser.add_argument('--all', action='store_true', help='Update all cache busters')
-    parser.add_argument('--timestamp', type=str, help='Override the timestamp used for cache buster')
+    parser.add_argument('--timestamp', type=str,
+                        help='Use this timestamp for the cache buster instead of the content digest')
+    parser.add_argument('--manifest', type=str, default=MANIFEST_PATH,
+                        help='Asset digest manifest (default: %(default)s)')
     parser.add_argument('assets', metavar='asset', nargs='*', type=str, help='Assets that were updated')
     args = parser.parse_args()
 
@@ -0,0 +1,108 @@
+"""
+Long-run uptime and rarity statistics for every fish.
+
+Fish.uptime() (js/app/fish.js) estimates a fish's uptime from the handful
+of windows the tracker has computed, and sortByOverallRarity orders fish
+by it. This works out the real figures instead: every window of every fish
+over a long horizon (a year, by default) is found with catch_windows, then
+summarised:
+
+- `uptime`: fraction of the horizon the fish is up;
+- `windows`: number of windows;
+- `meanGap`/`maxGap`: time between windows;
+- `meanLength` and `lengths` (min, 10th, 50th and 90th percentile, max):
+  how long windows last.
+
+Durations are in Earth seconds. Fish with Fish Eyes get the same figures
+with it applied under `fishEyes`. Fish that need intuition are left out,
+since catch_windows doesn't model predators; the tracker keeps estimating
+those itself.
+"""
+from collections import OrderedDict
+import logging
+import time
+
+import numpy as np
+
+import catch_windows
+from weather_forecast import EORZEA_TO_EARTH, PERIOD_MS, WeatherTable, period_of, to_eorzea
+
+UPTIME_FORMAT = 1
+EARTH_DAY_MS = 24 * 60 * 60 * 1000
+# One Earth year of weather periods.
+DEFAULT_PERIODS = int(365 * 24 * 60 * 60 * 1000 / (PERIOD_MS * EORZEA_TO_EARTH))
+
+PERCENTILES = (0, 10, 50, 90, 100)
+
+
+def default_start(now=None):
+    """
+    Where the horizon starts by default: the weather period containing the
+    start of the current (UTC) Earth day. It follows the build, so the
+    figures describe the coming year, but rebuilds on the same day still
+    agree with each other.
+    """
+    now = time.time() * 1000 if now is None else now
+    return int(period_of(to_eorzea(now // EARTH_DAY_MS * EARTH_DAY_MS))) * PERIOD_MS
+
+
+def _seconds(eorzea_ms):
+    return round(float(eorzea_ms) * EORZEA_TO_EARTH / 1000, 1)
+
+
+def window_stats(starts, ends, start, end):
+    """Summarises one fish's windows over [start, end)."""
+    lengths = ends - starts
+    stats = OrderedDict([('uptime', round(float(lengths.sum()) / (end - start), 6)),
+                         ('windows', len(starts))])
+    if len(starts) > 1:
+        gaps = starts[1:] - ends[:-1]
+        stats['meanGap'] = _seconds(gaps.mean())
+        stats['maxGap'] = _seconds(gaps.max())
+    # Windows cut off by either end of the horizon would skew the lengths.
+    whole = (starts > start) & (ends < end)
+    if whole.any():
+        stats['meanLength'] = _seconds(lengths[whole].mean())
+        stats['lengths'] = [_seconds(x) for x in np.percentile(lengths[whole], PERCENTILES)]
+    return stats
+
+
+def uptime_stats(fishes, table, start=None, periods=DEFAULT_PERIODS):
+    """
+    Returns an OrderedDict mapping fish id -> stats for all of *fishes*
+    (FishConditions) over *periods* weather periods from *start* (default:
+    `default_start()`).
+    """
+    if not isinstance(table, WeatherTable):
+        table = WeatherTable(table)
+    if start is None:
+        start = default_start()
+    fishes = [fish for fish in fishes if len(fish.predators) == 0]
+    end = start + periods * PERIOD_MS
+
+    windows = catch_windows.windows_between(fishes, table, start, end)
+    fish_eyes_windows = catch_windows.windows_between(
+        [fish for fish in fishes if fish.fish_eyes], table, start, end, fish_eyes=True)
+
+    results = OrderedDict()
+    for fish in fishes:
+        stats = window_stats(*windows[fish.id], start, end)
+        if fish.fish_eyes:
+            stats['fishEyes'] = window_stats(*fish_eyes_windows[fish.id], start, end)
+        results[fish.id] = stats
+    return results
+
+
+def uptime_table(tables, start=None, periods=DEFAULT_PERIODS):
+    """
+    Builds the UPTIME table from the FISH, FISHING_SPOTS,
+    SPEARFISHING_SPOTS and WEATHER_RATES tables (as built by rebuild, or
+    read back from data.js).
+    """
+    fishes = [catch_windows.fish_conditions(fish, tables['FISHING_SPOTS'], tables['SPEARFISHING_SPOTS'])
+              for fish in tables['FISH'].values()]
+    stats = uptime_stats(fishes, WeatherTable(tables['WEATHER_RATES']), start, periods)
+    never = [fish_id for fish_id, entry in stats.items() if entry['windows'] == 0]
+    if len(never) != 0:
+        logging.warning('%u fish are never up: %s', len(never), ', '.join(map(str, never)))
+    return stats
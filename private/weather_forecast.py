@@ -0,0 +1,254 @@
+"""
+Eorzea weather forecasting, vectorized with NumPy.
+
+This is a port of js/app/weather.js (calculateForecastTarget, weatherForArea
+and startOfPeriod, plus toEorzea/toEarth from js/app/time.js). It works on
+whole arrays of times or period indices at once. Every step uses the same
+float64 operations and 32-bit integer coercions as the JavaScript, so the
+results match the site exactly (see weather_golden.json).
+
+A period is one 8-bell weather window. Period N starts at Eorzea time
+N * PERIOD_MS.
+"""
+from collections import OrderedDict
+import json
+import logging
+import os
+
+import numpy as np
+
+EARTH_TO_EORZEA = 3600 / 175
+EORZEA_TO_EARTH = 1 / EARTH_TO_EORZEA
+# Length of a weather period (8 bells), in Eorzea milliseconds.
+PERIOD_MS = 8 * 60 * 60 * 1000
+
+_SCRIPT_PATH = os.path.abspath(os.path.dirname(__file__))
+GOLDEN_FILE = os.path.join(_SCRIPT_PATH, 'weather_golden.json')
+DATA_JS = os.path.join(_SCRIPT_PATH, '..', 'js', 'app', 'data.js')
+
+_UINT32 = 0xFFFFFFFF
+
+
+def _to_uint32(x):
+    # ToInt32/ToUint32: truncate, then wrap to 32 bits. The bit patterns are
+    # the same either way; the final `>>> 0` reads them as unsigned.
+    return np.trunc(x).astype(np.int64) & _UINT32
+
+
+def to_eorzea(earth_ms):
+    return np.asarray(earth_ms, dtype=np.float64) * EARTH_TO_EORZEA
+
+
+def to_earth(eorzea_ms):
+    return np.ceil(np.asarray(eorzea_ms, dtype=np.float64) * EORZEA_TO_EARTH)
+
+
+def start_of_period(eorzea_ms):
+    """
+    Start of the weather period containing each Eorzea time. (Dates only
+    hold whole milliseconds, hence the truncation.)
+    """
+    eorzea_ms = np.trunc(np.asarray(eorzea_ms, dtype=np.float64))
+    return np.floor(eorzea_ms / PERIOD_MS) * PERIOD_MS
+
+
+def period_of(eorzea_ms):
+    return (start_of_period(eorzea_ms) // PERIOD_MS).astype(np.int64)
+
+
+def period_start(periods):
+    """Eorzea time (ms) at which each period starts."""
+    return np.asarray(periods, dtype=np.int64).astype(np.float64) * PERIOD_MS
+
+
+def calculate_forecast_target(earth_ms):
+    """
+    Weather forecast target (0-99) for each Earth time (ms).
+    """
+    # Based on Rougeadyn's SaintCoinach library.
+    unix_time = np.trunc(np.asarray(earth_ms, dtype=np.float64) / 1000)
+    # Get the Eorzea hour for weather start.
+    bell = unix_time / 175
+    # Magic needed for calculations:
+    # 16:00 = 0, 00:00 = 8, 08:00 = 16 . . .
+    inc = np.fmod(bell + 8 - np.fmod(bell, 8), 24)
+    # Take the Eorzea days since Unix Epoch.
+    total_days = _to_uint32(unix_time / 4200)
+
+    # Make the calculations.
+    calc_base = _to_uint32(total_days.astype(np.float64) * 100 + inc)
+    step1 = ((calc_base << 11) ^ calc_base) & _UINT32
+    step2 = ((step1 >> 8) ^ step1) & _UINT32
+
+    return (step2 % 100).astype(np.int32)
+
+
+def forecast_targets(periods):
+    """
+    Forecast target for each period index, computed the way the site does:
+    from the Earth time of the period's (Eorzea) start.
+    """
+    return calculate_forecast_target(to_earth(period_start(periods)))
+
+
+class WeatherTable(object):
+    """
+    Maps forecast targets to weather for every territory at once.
+
+    *weather_rates* is the WEATHER_RATES table, either as `initialize_data`
+    builds it (int keys) or as read back from data.js (string keys). Each
+    territory's cumulative rates are expanded into a 100-entry lookup row,
+    so mapping targets to weather is a single indexing operation. Targets
+    past the end of an area's rates (where weatherForArea would fail) map
+    to weather 0.
+    """
+
+    def __init__(self, weather_rates):
+        self.areas = sorted(int(area) for area in weather_rates)
+        self.rows = dict((area, row) for row, area in enumerate(self.areas))
+        self.lookup = np.zeros((len(self.areas), 100), dtype=np.int32)
+        self.coverage = {}
+        for area, entry in weather_rates.items():
+            row = self.lookup[self.rows[int(area)]]
+            lower = 0
+            for weather, rate in entry['weather_rates']:
+                row[lower:rate] = weather
+                lower = max(lower, rate)
+            self.coverage[int(area)] = lower
+            if lower < 100:
+                logging.warning('Weather rates for %s only cover targets below %u', area, lower)
+
+    def weather_for_area(self, area, targets):
+        """Weather for each target in *area* (0 if the area is unknown)."""
+        targets = np.asarray(targets)
+        row = self.rows.get(int(area))
+        if row is None:
+            return np.zeros(targets.shape, dtype=np.int32)
+        return self.lookup[row][targets]
+
+    def possible_weather(self, area):
+        """The set of weather *area* can ever have (empty if it's unknown)."""
+        row = self.rows.get(int(area))
+        if row is None:
+            return set()
+        return set(np.unique(self.lookup[row][:self.coverage[int(area)]]).tolist())
+
+    def forecast(self, periods, areas=None):
+        """
+        Returns an array of weather with one row per area (default: all of
+        them, in `self.areas` order) and one column per period.
+        """
+        targets = forecast_targets(periods)
+        if areas is None:
+            return self.lookup[:, targets]
+        return np.stack([self.weather_for_area(area, targets) for area in areas])
+
+
+def load_weather_table(js_file=DATA_JS):
+    from js_data import read_js_data
+    _, tables = read_js_data(js_file)
+    return WeatherTable(tables['WEATHER_RATES'])
+
+
+def golden_inputs(seed=1234):
+    """Times used for the golden vectors; both aligned and arbitrary."""
+    rng = np.random.default_rng(seed)
+    # 2010 through 2040, in Earth ms.
+    earth_ms = np.concatenate([
+        np.array([0, 1, 999, 1000, 1399999, 1400000, 1400001, 4199999, 4200000, 4200001,
+                  1262304000000, 1700000000000, 2147483647000, 2208988800000]),
+        rng.integers(1262304000000, 2240524800000, 300)]).astype(np.float64)
+    periods = np.concatenate([np.arange(0, 6),
+                              rng.integers(901000, 1600000, 300)]).astype(np.int64)
+    return OrderedDict([('earth_ms', [int(x) for x in earth_ms]),
+                        ('periods', [int(x) for x in periods])])
+
+
+def compute_golden(table, inputs):
+    """The same vectors as weather_golden.js, computed in Python."""
+    earth_ms = np.asarray(inputs['earth_ms'], dtype=np.float64)
+    periods = np.asarray(inputs['periods'], dtype=np.int64)
+    targets = forecast_targets(periods)
+    return OrderedDict([
+        ('targets', calculate_forecast_target(earth_ms).tolist()),
+        ('period_starts', start_of_period(to_eorzea(earth_ms)).astype(np.int64).tolist()),
+        ('period_targets', targets.tolist()),
+        ('weather', OrderedDict((str(area), [w if t < table.coverage[area] else None
+                                             for t, w in zip(targets.tolist(),
+                                                             table.weather_for_area(area, targets).tolist())])
+                                for area in table.areas))])
+
+
+def run_golden_js(inputs, js_file=DATA_JS):
+    import subprocess
+    script = os.path.join(_SCRIPT_PATH, 'weather_golden.js')
+    output = subprocess.run(['node', script, os.path.abspath(js_file)],
+                            input=json.dumps(inputs), capture_output=True, check=True,
+                            encoding='utf-8').stdout
+    return json.loads(output, object_pairs_hook=OrderedDict)
+
+
+def verify_golden(table, golden_file=GOLDEN_FILE):
+    with open(golden_file, 'r', encoding='utf-8') as f:
+        golden = json.load(f, object_pairs_hook=OrderedDict)
+    actual = compute_golden(table, golden['inputs'])
+    mismatched = [name for name, expected in golden['outputs'].items()
+                  if actual[name] != expected]
+    for name in mismatched:
+        logging.error('%s does not match the golden vectors', name)
+    return len(mismatched) == 0
+
+
+def benchmark(table, count=1000000, number=3):
+    """
+    Returns (targets/s, area-periods/s): how fast forecast targets can be
+    computed, and how fast weather for every area can be forecast.
+    """
+    import timeit
+    periods = np.arange(901000, 901000 + count, dtype=np.int64)
+    target_time = min(timeit.repeat(lambda: forecast_targets(periods), number=1, repeat=number))
+    forecast_time = min(timeit.repeat(lambda: table.forecast(periods), number=1, repeat=number))
+    return count / target_time, count * len(table.areas) / forecast_time
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    sys.path.insert(0, _SCRIPT_PATH)
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    parser = argparse.ArgumentParser(description='Eorzea weather forecast tools')
+    parser.add_argument('--data', type=str, default=DATA_JS, dest='js_file',
+                        help='data.js to read WEATHER_RATES from (default: %(default)s)')
+    subparsers = parser.add_subparsers(dest='command')
+    parser_verify = subparsers.add_parser('verify', help='Check against the golden vectors')
+    parser_verify.add_argument('--node', action='store_true', default=False,
+                               help='Also compare against weather.js, run with node')
+    subparsers.add_parser('golden', help='Regenerate the golden vectors using weather.js (needs node)')
+    parser_bench = subparsers.add_parser('bench', help='Benchmark forecasting')
+    parser_bench.add_argument('-n', '--periods', type=int, default=1000000,
+                              help='Number of periods to forecast (default: %(default)s)')
+    args = parser.parse_args()
+
+    table = load_weather_table(args.js_file)
+    if args.command == 'golden':
+        inputs = golden_inputs()
+        outputs = run_golden_js(inputs, args.js_file)
+        if outputs != compute_golden(table, inputs):
+            logging.error('weather.js and weather_forecast.py disagree!')
+            sys.exit(1)
+        with open(GOLDEN_FILE, 'w', encoding='utf-8') as f:
+            json.dump(OrderedDict([('inputs', inputs), ('outputs', outputs)]), f)
+        logging.info('Wrote %s', GOLDEN_FILE)
+    elif args.command == 'bench':
+        targets_per_second, forecasts_per_second = benchmark(table, args.periods)
+        logging.info('%.2fM periods/s (targets), %.2fM area-periods/s (%u areas)',
+                     targets_per_second / 1e6, forecasts_per_second / 1e6, len(table.areas))
+    else:
+        ok = verify_golden(table)
+        if ok and getattr(args, 'node', False):
+            inputs = golden_inputs()
+            ok = run_golden_js(inputs, args.js_file) == compute_golden(table, inputs)
+        logging.info('Golden vectors %s', 'match' if ok else 'DO NOT match')
+        sys.exit(0 if ok else 1)
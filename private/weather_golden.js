@@ -0,0 +1,52 @@
+// Computes golden weather vectors using the site's own weather.js/time.js.
+// Usage: node weather_golden.js path/to/data.js < inputs.json > outputs.json
+// (weather_forecast.py golden runs this for you.)
+const fs = require('fs');
+const path = require('path');
+const vm = require('vm');
+
+const appPath = path.join(__dirname, '..', 'js', 'app');
+const dataPath = process.argv[2] || path.join(appPath, 'data.js');
+
+// Just enough of the browser libraries for weather.js and time.js to load.
+const noop = () => {};
+const context = vm.createContext({
+  console: { log: noop, info: noop, debug: noop, error: console.error, time: noop, timeEnd: noop },
+  _: (list) => ({
+    find: (pred) => Object.values(list).find(pred),
+    contains: (x) => list.includes(x),
+  }),
+  rxjs: { interval: () => ({ pipe: () => ({}) }), operators: new Proxy({}, { get: () => noop }) },
+  dateFns: {
+    utc: {
+      getHours: (d) => new Date(+d).getUTCHours(),
+      setHours: (d, h) => { let x = new Date(+d); x.setUTCHours(h); return x; },
+      startOfHour: (d) => { let x = new Date(+d); x.setUTCMinutes(0, 0, 0); return x; },
+    },
+  },
+});
+
+for (let file of [dataPath, path.join(appPath, 'time.js'), path.join(appPath, 'weather.js')]) {
+  vm.runInContext(fs.readFileSync(file, 'utf8'), context, { filename: file });
+}
+
+const inputs = JSON.parse(fs.readFileSync(0, 'utf8'));
+const outputs = vm.runInContext(`(function(inputs) {
+  const PERIOD_MS = 8 * 60 * 60 * 1000;
+  let periodTargets = inputs.periods.map(
+    (p) => weatherService.calculateForecastTarget(eorzeaTime.toEarth(p * PERIOD_MS)));
+  // weatherForArea throws if an area's rates don't add up to 100.
+  const weatherOrNull = (area, t) => { try { return weatherForArea(area, t); } catch (e) { return null; } };
+  let weather = {};
+  for (let area of Object.keys(DATA.WEATHER_RATES).map(Number).sort((a, b) => a - b)) {
+    weather[area] = periodTargets.map((t) => weatherOrNull(area, t));
+  }
+  return {
+    targets: inputs.earth_ms.map((m) => weatherService.calculateForecastTarget(m)),
+    period_starts: inputs.earth_ms.map((m) => +startOfPeriod(eorzeaTime.toEorzea(m))),
+    period_targets: periodTargets,
+    weather: weather,
+  };
+})`, context)(inputs);
+
+process.stdout.write(JSON.stringify(outputs));
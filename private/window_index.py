@@ -0,0 +1,337 @@
+"""
+"What's up now?" queries over precomputed catch windows.
+
+The tracker answers isFishUpNow/isUpVerySoon (js/app/sorters.js) by asking
+every fish for its next window. `WindowIndex` precomputes every window over
+a horizon instead (see catch_windows.py), so these questions take
+logarithmic time:
+
+- `up_at(t)`: the fish that are up at Eorzea time *t*;
+- `up_between(a, b)`: the fish that are up at any point in [a, b);
+- `opening_between(a, b)`: the windows that open in [a, b).
+
+The index grows with `extend` as time advances, and `advance` drops what's
+no longer needed. Each extension is a segment with its own interval tree. A
+window that runs across segments is indexed in each of them, but it's still
+one window. Window ids stay valid across `advance`: the window arrays are
+trimmed from the front, and ids are offset by the number of windows dropped.
+"""
+import bisect
+from collections import namedtuple
+import logging
+
+import numpy as np
+
+import catch_windows
+from weather_forecast import EARTH_TO_EORZEA, PERIOD_MS, WeatherTable
+
+Window = namedtuple('Window', 'fish start end')
+
+
+class _IntervalTree(object):
+    """
+    A centered interval tree over half-open [start, end) intervals. Each
+    node keeps the intervals containing its center twice: sorted by start,
+    and by end (descending). A query walks one path down the tree (two in
+    places for range queries), so it costs O(log n + k).
+    """
+
+    def __init__(self, starts, ends, ids):
+        self.root = self._build(np.asarray(starts, dtype=np.int64),
+                                np.asarray(ends, dtype=np.int64),
+                                np.asarray(ids, dtype=np.int64))
+
+    @classmethod
+    def _build(cls, starts, ends, ids):
+        if len(starts) == 0:
+            return None
+        # Centered on the median interval, so every node holds at least one.
+        median = np.argsort(starts + (ends - starts) // 2, kind='stable')[len(starts) // 2]
+        center = int(starts[median] + (ends[median] - starts[median]) // 2)
+        left = ends <= center
+        right = starts > center
+        here = ~(left | right)
+
+        by_start = np.argsort(starts[here], kind='stable')
+        by_end = np.argsort(-ends[here], kind='stable')
+        return (center,
+                starts[here][by_start].tolist(), ids[here][by_start].tolist(),
+                ends[here][by_end].tolist(), ids[here][by_end].tolist(),
+                cls._build(starts[left], ends[left], ids[left]),
+                cls._build(starts[right], ends[right], ids[right]))
+
+    def overlapping(self, start, end):
+        """Ids of the intervals overlapping [start, end)."""
+        found = []
+        nodes = [self.root]
+        while nodes:
+            node = nodes.pop()
+            if node is None:
+                continue
+            center, starts, start_ids, ends, end_ids, left, right = node
+            if end <= center:
+                # Everything here ends after *center*; check the starts.
+                for n, node_start in enumerate(starts):
+                    if node_start >= end:
+                        break
+                    found.append(start_ids[n])
+                nodes.append(left)
+            elif start > center:
+                # Everything here starts at or before *center*; check the ends.
+                for n, node_end in enumerate(ends):
+                    if node_end <= start:
+                        break
+                    found.append(end_ids[n])
+                nodes.append(right)
+            else:
+                found.extend(start_ids)
+                nodes.append(left)
+                nodes.append(right)
+        return found
+
+    def stab(self, t):
+        """Ids of the intervals containing *t*."""
+        return self.overlapping(t, t + 1)
+
+
+class WindowIndex(object):
+    """
+    Every catch window from *start* onwards, for all of *fishes*
+    (FishConditions). Fish that are always up have one long window. As in
+    catch_windows, intuition requirements aren't applied.
+
+    All times are Eorzea milliseconds. Windows that were already open at
+    *start* (or at the start of the remaining segments, after `advance`) are
+    clipped to it, and don't count as opening there.
+    """
+
+    def __init__(self, fishes, table, start, end=None, fish_eyes=False):
+        if not isinstance(table, WeatherTable):
+            table = WeatherTable(table)
+        self.fishes = list(fishes)
+        self.table = table
+        self.fish_eyes = fish_eyes
+        self.start = self.end = int(start)
+
+        # Every window starting at or after `self.start`, sorted by start (then
+        # fish). Window id n is at index n - `self._base`.
+        self.window_fish = []
+        self.window_starts = []
+        self.window_ends = []
+        self._base = 0
+        # Windows that started before `self.start` but are still open, by id.
+        self._carried = {}
+        # Ids of the windows clipped to the original start; they don't really
+        # open there.
+        self._clipped = set()
+        self._extended = False
+        # Windows still open at `self.end`, by fish id.
+        self._open = {}
+        self._segment_starts = []
+        self._segments = []
+
+        if end is not None:
+            self.extend(end)
+
+    def __len__(self):
+        return len(self.window_fish) + len(self._carried)
+
+    def _window(self, window_id):
+        if window_id < self._base:
+            return Window(*self._carried[window_id])
+        n = window_id - self._base
+        return Window(self.window_fish[n], self.window_starts[n], self.window_ends[n])
+
+    def _set_end(self, window_id, end):
+        if window_id < self._base:
+            self._carried[window_id][2] = end
+        else:
+            self.window_ends[window_id - self._base] = end
+
+    def extend(self, end):
+        """Indexes every window up to *end*."""
+        end = int(end)
+        if end <= self.end:
+            return
+        # The first time around, start 1ms early, to tell the windows already
+        # open at the start from those that really open there.
+        first = not self._extended
+        windows = catch_windows.windows_between(self.fishes, self.table,
+                                                self.end - 1 if first else self.end, end,
+                                                self.fish_eyes)
+        self._extended = True
+
+        segment = ([], [], [])
+        new_windows = []
+        clipped = set()
+        still_open = {}
+        for fish_id, (starts, ends) in windows.items():
+            for window_start, window_end in zip(starts.tolist(), ends.tolist()):
+                if window_end <= self.end:
+                    continue
+                if window_start < self.end:
+                    window_start = self.end
+                    clipped.add(fish_id)
+                window_id = self._open.get(fish_id) if window_start == self.end else None
+                if window_id is not None:
+                    # Picks up where the last segment left off.
+                    self._set_end(window_id, window_end)
+                    segment[0].append(window_start)
+                    segment[1].append(window_end)
+                    segment[2].append(window_id)
+                else:
+                    new_windows.append((window_start, fish_id, window_end))
+                if window_end == end:
+                    still_open[fish_id] = window_id
+
+        new_windows.sort()
+        for window_start, fish_id, window_end in new_windows:
+            window_id = self._base + len(self.window_fish)
+            if window_start == self.end and fish_id in clipped:
+                self._clipped.add(window_id)
+            self.window_fish.append(fish_id)
+            self.window_starts.append(window_start)
+            self.window_ends.append(window_end)
+            segment[0].append(window_start)
+            segment[1].append(window_end)
+            segment[2].append(window_id)
+            if window_end == end:
+                still_open[fish_id] = window_id
+
+        self._segment_starts.append(self.end)
+        self._segments.append((end, _IntervalTree(*segment)))
+        self._open = still_open
+        self.end = end
+
+    def advance(self, t):
+        """
+        Forgets the segments that end at or before *t*, along with the
+        windows that ended by then.
+        """
+        start = self.start
+        while self._segments and self._segments[0][0] <= t:
+            self.start = self._segments[0][0]
+            del self._segment_starts[0]
+            del self._segments[0]
+        if self.start == start:
+            return
+
+        # Windows that started earlier but are still open are carried over
+        # (they're still in the remaining segments' trees).
+        self._carried = dict((window_id, window) for window_id, window in self._carried.items()
+                             if window[2] > self.start)
+        cut = bisect.bisect_left(self.window_starts, self.start)
+        for n in range(cut):
+            if self.window_ends[n] > self.start:
+                self._carried[self._base + n] = [self.window_fish[n], self.window_starts[n],
+                                                 self.window_ends[n]]
+        del self.window_fish[:cut]
+        del self.window_starts[:cut]
+        del self.window_ends[:cut]
+        self._base += cut
+        self._clipped = set(window_id for window_id in self._clipped if window_id >= self._base)
+
+    def _check_span(self, start, end):
+        if start < self.start or end > self.end:
+            raise ValueError('[%d, %d) is outside the indexed span [%d, %d)' %
+                             (start, end, self.start, self.end))
+
+    def up_between(self, start, end):
+        """The windows overlapping [start, end), sorted by start."""
+        self._check_span(start, end)
+        first = max(bisect.bisect_right(self._segment_starts, start) - 1, 0)
+        last = bisect.bisect_left(self._segment_starts, end)
+        found = set()
+        for _, tree in self._segments[first:last]:
+            found.update(tree.overlapping(start, end))
+        return [self._window(window_id) for window_id in sorted(found)]
+
+    def up_at(self, t):
+        """The windows open at *t*."""
+        return self.up_between(t, t + 1)
+
+    def opening_between(self, start, end):
+        """The windows that open in [start, end), sorted by start."""
+        self._check_span(start, end)
+        first = bisect.bisect_left(self.window_starts, start)
+        last = bisect.bisect_left(self.window_starts, end)
+        return [self._window(self._base + n) for n in range(first, last)
+                if self._base + n not in self._clipped]
+
+    def opening_soon(self, t, minutes=15):
+        """
+        The windows opening within *minutes* Earth minutes of *t*, like
+        isUpVerySoon.
+        """
+        return self.opening_between(t, min(t + int(minutes * 60 * 1000 * EARTH_TO_EORZEA),
+                                           self.end))
+
+
+def brute_force_up_at(windows, t):
+    """
+    What the tracker does: check every fish's windows (as returned by
+    catch_windows.windows_between). Returns the ids of the fish that are up.
+    """
+    return [fish_id for fish_id, (starts, ends) in windows.items()
+            if np.any((starts <= t) & (ends > t))]
+
+
+def benchmark(fishes, table, start, periods, queries=2000, seed=1234):
+    """
+    Builds an index over *periods* weather periods and times *queries*
+    random point queries against it and against a brute-force scan.
+    Returns (build seconds, index µs/query, brute force µs/query, windows).
+    """
+    import timeit
+    end = start + periods * PERIOD_MS
+
+    build_start = timeit.default_timer()
+    index = WindowIndex(fishes, table, start, end)
+    build_time = timeit.default_timer() - build_start
+
+    windows = catch_windows.windows_between(fishes, table, start, end)
+    times = np.random.default_rng(seed).integers(start, end, queries).tolist()
+    for t in times[:50]:
+        if sorted(set(w.fish for w in index.up_at(t))) != sorted(brute_force_up_at(windows, t)):
+            raise AssertionError('Index and brute force disagree at %d' % t)
+
+    index_time = timeit.timeit(lambda: [index.up_at(t) for t in times], number=1)
+    brute_time = timeit.timeit(lambda: [brute_force_up_at(windows, t) for t in times], number=1)
+    return build_time, index_time / queries * 1e6, brute_time / queries * 1e6, len(index)
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+    import sys
+    import time
+
+    _SCRIPT_PATH = os.path.abspath(os.path.dirname(__file__))
+    sys.path.insert(0, _SCRIPT_PATH)
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    from js_data import read_js_data
+    from weather_forecast import to_eorzea
+
+    parser = argparse.ArgumentParser(description='Catch window index benchmark')
+    parser.add_argument('--data', type=str,
+                        default=os.path.join(_SCRIPT_PATH, '..', 'js', 'app', 'data.js'),
+                        dest='js_file',
+                        help='data.js to read the fish and weather rates from')
+    parser.add_argument('--days', type=float, default=28,
+                        help='Horizon to index, in Earth days (default: %(default)s)')
+    parser.add_argument('-q', '--queries', type=int, default=500,
+                        help='Number of point queries to time (default: %(default)s)')
+    args = parser.parse_args()
+
+    _, tables = read_js_data(args.js_file)
+    fishes = [catch_windows.fish_conditions(fish, tables['FISHING_SPOTS'], tables['SPEARFISHING_SPOTS'])
+              for fish in tables['FISH'].values()]
+    table = WeatherTable(tables['WEATHER_RATES'])
+    periods = int(args.days * 24 * 60 * 60 * 1000 * EARTH_TO_EORZEA) // PERIOD_MS
+    start = int(to_eorzea(time.time() * 1000))
+
+    build_time, index_us, brute_us, count = benchmark(fishes, table, start, periods, args.queries)
+    logging.info('Indexed %u windows (%u fish, %u periods) in %.3fs', count, len(fishes), periods, build_time)
+    logging.info('up_at: %.1fµs/query; brute force: %.1fµs/query (%.0fx)',
+                 index_us, brute_us, brute_us / index_us)